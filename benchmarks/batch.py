@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+
+'''
+Benchmark for building an ISO with many files, with and without batching the
+modifications.  The files are added in a shuffled order, so that most of
+them land in the middle of their directory.
+
+Usage: python benchmarks/batch.py [max_files]
+'''
+
+from __future__ import print_function
+
+import os
+import random
+import sys
+import time
+try:
+    from cStringIO import StringIO as BytesIO
+except ImportError:
+    from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pycdlib
+
+
+def build(num_files, batch, always_consistent):
+    '''
+    Build an ISO with num_files files spread over a handful of directories,
+    and return how long it took.
+    '''
+    names = ["/DIR%d/F%06d.;1" % (i % 4, i) for i in range(num_files)]
+    random.Random(num_files).shuffle(names)
+
+    iso = pycdlib.PyCdlib(always_consistent=always_consistent)
+    iso.new()
+    for i in range(4):
+        iso.add_directory("/DIR%d" % (i))
+
+    start = time.time()
+    if batch:
+        iso.begin_batch()
+    for name in names:
+        iso.add_fp(BytesIO(b"x"), 1, name)
+    if batch:
+        iso.commit_batch()
+    elapsed = time.time() - start
+
+    iso.close()
+    return elapsed
+
+
+def main():
+    max_files = 32000
+    if len(sys.argv) > 1:
+        max_files = int(sys.argv[1])
+
+    print("%8s %12s %12s %20s" % ("files", "unbatched", "batched", "consistent+batched"))
+    num_files = 2000
+    while num_files <= max_files:
+        print("%8d %11.2fs %11.2fs %19.2fs" % (num_files,
+                                               build(num_files, False, False),
+                                               build(num_files, True, False),
+                                               build(num_files, True, True)))
+        num_files *= 2
+
+
+if __name__ == "__main__":
+    main()
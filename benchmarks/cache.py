@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+
+'''
+Benchmark for mastering an ISO and extracting a file from it with each of
+the I/O policies, measuring the throughput, the peak RSS of the process, and
+how much the page cache grew (from the "Cached" line of /proc/meminfo, so
+other activity on the machine shows up as noise).
+
+Usage: python benchmarks/cache.py [num_files] [file_size_mb]
+'''
+
+from __future__ import print_function
+
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pycdlib
+
+
+def cached_kb():
+    '''
+    Return the size of the page cache in kB, or 0 if it can't be found.
+    '''
+    try:
+        with open('/proc/meminfo') as infp:
+            for line in infp:
+                if line.startswith('Cached:'):
+                    return int(line.split()[1])
+    except IOError:
+        pass
+    return 0
+
+
+def measure(name, func, total):
+    '''
+    Run func, then print the throughput and the growth of the page cache.
+    '''
+    before = cached_kb()
+    start = time.time()
+    func()
+    elapsed = time.time() - start
+    grew = cached_kb() - before
+    print("%-24s %8.1f MB/s %10d kB cached" % (name, total / elapsed / 1e6, grew))
+
+
+def main():
+    num_files = 16
+    file_size = 64 * 1024 * 1024
+    if len(sys.argv) > 1:
+        num_files = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        file_size = int(sys.argv[2]) * 1024 * 1024
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        iso = pycdlib.PyCdlib()
+        iso.new()
+        for i in range(num_files):
+            src = os.path.join(tmpdir, "src%d" % (i))
+            with open(src, 'wb') as outfp:
+                outfp.write(os.urandom(file_size))
+            iso.add_file(src, "/F%06d.;1" % (i))
+
+        total = num_files * file_size
+        outname = os.path.join(tmpdir, "out.iso")
+        extracted = os.path.join(tmpdir, "extracted")
+        for policy in (None, 'preallocate', 'nocache', 'all'):
+            measure("write %s" % (policy), lambda: iso.write(outname, io_policy=policy), total)
+
+            def extract():
+                with open(extracted, 'wb') as outfp:
+                    iso.get_file_from_iso_fp(outfp, iso_path="/F000000.;1", io_policy=policy)
+            measure("extract %s" % (policy), extract, file_size)
+
+        iso.close()
+    finally:
+        shutil.rmtree(tmpdir)
+
+    print("peak RSS: %d kB" % (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+
+'''
+Benchmark for writing out an ISO whose cost is dominated by metadata: many
+directories full of empty files, so that the path tables and directory
+records make up nearly all of the output.
+
+Usage: python benchmarks/metadata.py [num_files]
+'''
+
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+try:
+    from cStringIO import StringIO as BytesIO
+except ImportError:
+    from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pycdlib
+
+
+def main():
+    num_files = 100000
+    if len(sys.argv) > 1:
+        num_files = int(sys.argv[1])
+    num_dirs = max(num_files // 100, 1)
+
+    iso = pycdlib.PyCdlib()
+    iso.new(rock_ridge="1.09")
+    with iso.batch():
+        for i in range(num_dirs):
+            iso.add_directory("/D%05d" % (i), rr_name="d%05d" % (i))
+        for i in range(num_files):
+            iso.add_fp(BytesIO(b""), 0, "/D%05d/F%06d.;1" % (i % num_dirs, i),
+                       rr_name="f%06d" % (i))
+    iso.force_consistency()
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        outname = os.path.join(tmpdir, "out.iso")
+        best = None
+        for i_unused in range(3):
+            start = time.time()
+            iso.write(outname)
+            elapsed = time.time() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        print("%d directories, %d files: %.2fs" % (num_dirs, num_files, best))
+    finally:
+        shutil.rmtree(tmpdir)
+
+    iso.close()
+
+
+if __name__ == "__main__":
+    main()
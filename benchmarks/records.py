@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+
+'''
+Microbenchmark for the per-record parse and serialize cost of the on-disk
+record classes (directory records, path table records, Rock Ridge entries,
+volume descriptors and directory record dates).
+
+Usage: python benchmarks/records.py [iterations]
+'''
+
+from __future__ import print_function
+
+import os
+import sys
+import timeit
+try:
+    from cStringIO import StringIO as BytesIO
+except ImportError:
+    from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pycdlib
+import pycdlib.dates
+import pycdlib.dr
+import pycdlib.headervd
+import pycdlib.path_table_record
+
+
+def build_iso():
+    '''
+    Build a small Rock Ridge ISO in memory and re-open it, so that the sample
+    records come from the parser.
+    '''
+    iso = pycdlib.PyCdlib()
+    iso.new(rock_ridge="1.09")
+    iso.add_directory("/DIR1", rr_name="dir1")
+    foostr = b"foo\n"
+    iso.add_fp(BytesIO(foostr), len(foostr), "/DIR1/FOO.;1", rr_name="foo")
+    out = BytesIO()
+    iso.write_fp(out)
+    iso.close()
+
+    iso = pycdlib.PyCdlib()
+    iso.open_fp(out)
+    return iso
+
+
+def bench(name, func, iterations):
+    '''
+    Run func iterations times and print the per-call cost.
+    '''
+    elapsed = min(timeit.repeat(func, number=iterations, repeat=5))
+    print("%-28s %8.0f ns/record" % (name, elapsed / iterations * 1e9))
+
+
+def main():
+    iterations = 20000
+    if len(sys.argv) > 1:
+        iterations = int(sys.argv[1])
+
+    iso = build_iso()
+    pvd = iso.pvd
+    root = pvd.root_directory_record()
+    dir1 = iso.get_record(iso_path="/DIR1")
+    foo = iso.get_record(iso_path="/DIR1/FOO.;1")
+
+    dr_data = foo.record()
+    rr_data = dr_data[33 + foo.len_fi + ((33 + foo.len_fi) % 2):]
+    ptr_data = dir1.ptr.record_little_endian()
+    pvd_data = pvd.record()
+    date_data = foo.date.record()
+
+    def parse_dr():
+        pycdlib.dr.DirectoryRecord().parse(pvd, dr_data, None, dir1)
+
+    def parse_rr():
+        rec = pycdlib.rockridge.RockRidge()
+        rec.parse(rr_data, False, 0, False)
+
+    def parse_ptr():
+        pycdlib.path_table_record.PathTableRecord().parse(ptr_data)
+
+    def parse_pvd():
+        pycdlib.headervd.PrimaryVolumeDescriptor().parse(pvd_data, None, 16)
+
+    def parse_date():
+        pycdlib.dates.DirectoryRecordDate().parse(date_data)
+
+    print("Parse:")
+    bench("DirectoryRecord", parse_dr, iterations)
+    bench("RockRidge (SUSP area)", parse_rr, iterations)
+    bench("PathTableRecord", parse_ptr, iterations)
+    bench("PrimaryVolumeDescriptor", parse_pvd, iterations // 10)
+    bench("DirectoryRecordDate", parse_date, iterations)
+
+    print("Serialize:")
+    bench("DirectoryRecord", foo.record, iterations)
+    bench("RockRidge (SUSP area)", foo.rock_ridge.record_dr_entries, iterations)
+    bench("PathTableRecord", dir1.ptr.record_little_endian, iterations)
+    bench("PrimaryVolumeDescriptor", pvd.record, iterations // 10)
+    bench("DirectoryRecordDate", root.date.record, iterations)
+
+    iso.close()
+
+
+if __name__ == "__main__":
+    main()
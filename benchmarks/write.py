@@ -0,0 +1,59 @@
+#!/usr/bin/python3
+
+'''
+Benchmark for mastering an ISO from many source files on disk, copying the
+file data with different numbers of worker threads.
+
+Usage: python benchmarks/write.py [num_files] [file_size_kb]
+'''
+
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pycdlib
+
+
+def main():
+    num_files = 256
+    file_size = 1024 * 1024
+    if len(sys.argv) > 1:
+        num_files = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        file_size = int(sys.argv[2]) * 1024
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        iso = pycdlib.PyCdlib()
+        iso.new()
+        for i in range(num_files):
+            src = os.path.join(tmpdir, "src%d" % (i))
+            with open(src, 'wb') as outfp:
+                outfp.write(os.urandom(file_size))
+            iso.add_file(src, "/F%06d.;1" % (i))
+
+        outname = os.path.join(tmpdir, "out.iso")
+        print("%8s %10s" % ("workers", "time"))
+        for workers in (1, 2, 4, 8):
+            best = None
+            for i_unused in range(3):
+                start = time.time()
+                iso.write(outname, workers=workers)
+                elapsed = time.time() - start
+                if best is None or elapsed < best:
+                    best = elapsed
+            print("%8d %9.2fs" % (workers, best))
+
+        iso.close()
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -82,6 +82,7 @@ class DirectoryRecordDate(InterfaceISODate):
     tm structure (the new() method).
     '''
     FMT = "=BBBBBBb"
+    STRUCT = struct.Struct(FMT)
 
     __slots__ = ['_initialized', 'years_since_1900', 'month', 'day_of_month', 'hour', 'minute', 'second', 'gmtoffset']
 
@@ -102,7 +103,7 @@ class DirectoryRecordDate(InterfaceISODate):
 
         (self.years_since_1900, self.month, self.day_of_month, self.hour,
          self.minute, self.second,
-         self.gmtoffset) = struct.unpack_from(self.FMT, datestr, 0)
+         self.gmtoffset) = self.STRUCT.unpack_from(datestr, 0)
 
         self._initialized = True
 
@@ -145,9 +146,9 @@ class DirectoryRecordDate(InterfaceISODate):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInternalError("Directory Record Date not initialized")
 
-        return struct.pack(self.FMT, self.years_since_1900, self.month,
-                           self.day_of_month, self.hour, self.minute,
-                           self.second, self.gmtoffset)
+        return self.STRUCT.pack(self.years_since_1900, self.month,
+                                self.day_of_month, self.hour, self.minute,
+                                self.second, self.gmtoffset)
 
     def __ne__(self, other):
         return self.years_since_1900 != other.years_since_1900 or self.month != other.month or self.day_of_month != other.day_of_month or self.hour != other.hour or self.minute != other.minute or self.second != other.second or self.gmtoffset != other.gmtoffset
@@ -166,6 +167,7 @@ class VolumeDescriptorDate(InterfaceISODate):
     '''
 
     TIME_FMT = "%Y%m%d%H%M%S"
+    GMTOFFSET_STRUCT = struct.Struct("=b")
     EMPTY_STRING = b'0' * 16 + b'\x00'
 
     __slots__ = ['_initialized', 'year', 'month', 'dayofmonth', 'hour', 'minute', 'second', 'hundredthsofsecond', 'gmtoffset', 'date_str']
@@ -189,6 +191,10 @@ class VolumeDescriptorDate(InterfaceISODate):
         if len(datestr) != 17:
             raise pycdlibexception.PyCdlibInvalidISO("Invalid ISO9660 date string")
 
+        # The string may be a memoryview slice of the ISO; make a copy, since
+        # we need to decode it and keep it around.
+        datestr = bytes(datestr)
+
         try:
             timestruct = time.strptime(datestr[:-3].decode('utf-8'), self.TIME_FMT)
             self.year = timestruct.tm_year
@@ -198,7 +204,7 @@ class VolumeDescriptorDate(InterfaceISODate):
             self.minute = timestruct.tm_min
             self.second = timestruct.tm_sec
             self.hundredthsofsecond = int(datestr[14:15])
-            self.gmtoffset, = struct.unpack_from("=b", datestr, 16)
+            self.gmtoffset, = self.GMTOFFSET_STRUCT.unpack_from(datestr, 16)
             self.date_str = datestr
         except ValueError:
             # Ecma-119, 8.4.26.1 specifies that if the string was all the digit
@@ -260,7 +266,7 @@ class VolumeDescriptorDate(InterfaceISODate):
             self.second = local.tm_sec
             self.hundredthsofsecond = 0
             self.gmtoffset = utils.gmtoffset_from_tm(tm, local)
-            self.date_str = time.strftime(self.TIME_FMT, local).encode('utf-8') + "{:0<2}".format(self.hundredthsofsecond).encode('utf-8') + struct.pack("=b", self.gmtoffset)
+            self.date_str = time.strftime(self.TIME_FMT, local).encode('utf-8') + "{:0<2}".format(self.hundredthsofsecond).encode('utf-8') + self.GMTOFFSET_STRUCT.pack(self.gmtoffset)
         else:
             self.year = 0
             self.month = 0
@@ -37,6 +37,7 @@ class XARecord(object):
     __slots__ = ['_initialized', '_group_id', '_user_id', '_attributes', '_filenum']
 
     FMT = "=HHH2sB5s"
+    STRUCT = struct.Struct(FMT)
 
     def __init__(self):
         self._initialized = False
@@ -54,7 +55,7 @@ class XARecord(object):
             raise pycdlibexception.PyCdlibInternalError("This XARecord is already initialized!")
 
         (self._group_id, self._user_id, self._attributes, signature, self._filenum,
-         unused) = struct.unpack_from(self.FMT, xastr, 0)
+         unused) = self.STRUCT.unpack_from(xastr, 0)
 
         if signature != b"XA":
             raise pycdlibexception.PyCdlibInvalidISO("Invalid signature on the XARecord!")
@@ -95,7 +96,7 @@ class XARecord(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInternalError("This XARecord is not yet initialized!")
 
-        return struct.pack(self.FMT, self._group_id, self._user_id, self._attributes, b'XA', self._filenum, b'\x00' * 5)
+        return self.STRUCT.pack(self._group_id, self._user_id, self._attributes, b'XA', self._filenum, b'\x00' * 5)
 
     @staticmethod
     def length():
@@ -122,6 +123,7 @@ class DirectoryRecord(object):
     DATA_IN_EXTERNAL_FP = 2
 
     FMT = "=BBLLLL7sBBBHHB"
+    STRUCT = struct.Struct(FMT)
 
     def __init__(self):
         self._initialized = False
@@ -165,7 +167,7 @@ class DirectoryRecord(object):
         (self.dr_len, self.xattr_len, extent_location_le, extent_location_be,
          data_length_le, data_length_be_unused, dr_date, self.file_flags,
          self.file_unit_size, self.interleave_gap_size, seqnum_le, seqnum_be,
-         self.len_fi) = struct.unpack_from(self.FMT, record[:33], 0)
+         self.len_fi) = self.STRUCT.unpack_from(record, 0)
 
         # In theory we should have a check here that checks to make sure that
         # the length of the record we were passed in matches the data record
@@ -222,7 +224,7 @@ class DirectoryRecord(object):
             self.isdir = True
         else:
             record_offset = 33
-            self.file_ident = record[record_offset:record_offset + self.len_fi]
+            self.file_ident = bytes(record[record_offset:record_offset + self.len_fi])
             record_offset += self.len_fi
             if self.file_flags & (1 << self.FILE_FLAG_DIRECTORY_BIT):
                 self.isdir = True
@@ -383,7 +385,7 @@ class DirectoryRecord(object):
         # so we leave it at None.
         self.orig_extent_loc = None
         self.len_fi = len(self.file_ident)
-        self.dr_len = struct.calcsize(self.FMT) + self.len_fi
+        self.dr_len = self.STRUCT.size + self.len_fi
 
         # From Ecma-119, 9.1.6, the file flag bits are:
         #
@@ -768,6 +770,34 @@ class DirectoryRecord(object):
          True if adding this child caused the directory to overflow into another
          extent, False otherwise.
         '''
+        index = self._insert_child(child, allow_duplicate)
+
+        # We now have to check if we need to add another logical block.
+        # We have to iterate over the entire list again, because where we
+        # placed this last entry may rearrange the empty spaces in the blocks
+        # that we've already allocated.
+        num_extents, dirrecord_unused = self._recalculate_extents_and_offsets(index,
+                                                                              logical_block_size)
+
+        overflowed = False
+        if check_overflow and (num_extents * logical_block_size > self.data_length):
+            overflowed = True
+            # When we overflow our data length, we always add a full block.
+            self._set_data_length(self.data_length + logical_block_size)
+
+        return overflowed
+
+    def _insert_child(self, child, allow_duplicate):
+        '''
+        An internal method to insert a child into the sorted lists of children
+        of this object, without recalculating the offsets of the children.
+
+        Parameters:
+         child - The child directory record object to insert.
+         allow_duplicate - Whether to allow duplicate names, as there are situations where duplicate children are allowed.
+        Returns:
+         The index that the child was inserted at.
+        '''
         if not self.isdir:
             raise pycdlibexception.PyCdlibInvalidInput("Trying to add a child to a record that is not a directory")
 
@@ -800,35 +830,34 @@ class DirectoryRecord(object):
 
             self.rr_children.insert(rr_index, child)
 
-        # We now have to check if we need to add another logical block.
-        # We have to iterate over the entire list again, because where we
-        # placed this last entry may rearrange the empty spaces in the blocks
-        # that we've already allocated.
-        num_extents, dirrecord_unused = self._recalculate_extents_and_offsets(index,
-                                                                              logical_block_size)
+        return index
 
-        overflowed = False
-        if check_overflow and (num_extents * logical_block_size > self.data_length):
-            overflowed = True
-            # When we overflow our data length, we always add a full block.
-            self.data_length += logical_block_size
-            # We also have to make sure to update the length of the dot child,
-            # as that should always reflect the length.
-            self.children[0].data_length = self.data_length
-            # We also have to update all of the dotdot entries.  If this is
-            # the root directory record (no parent), we first update the root
-            # dotdot entry.  In all cases, we update the dotdot entry of all
-            # children that are directories.
-            if self.parent is None:
-                self.children[1].data_length = self.data_length
-
-            for c in self.children:
-                if not c.is_dir():
-                    continue
-                if len(c.children) > 1:
-                    c.children[1].data_length = self.data_length
+    def _set_data_length(self, data_length):
+        '''
+        An internal method to change the length of this directory, keeping the
+        dot and dotdot entries that refer to it in sync.
 
-        return overflowed
+        Parameters:
+         data_length - The new length of this directory.
+        Returns:
+         Nothing.
+        '''
+        self.data_length = data_length
+        # We also have to make sure to update the length of the dot child,
+        # as that should always reflect the length.
+        self.children[0].data_length = self.data_length
+        # We also have to update all of the dotdot entries.  If this is
+        # the root directory record (no parent), we first update the root
+        # dotdot entry.  In all cases, we update the dotdot entry of all
+        # children that are directories.
+        if self.parent is None:
+            self.children[1].data_length = self.data_length
+
+        for c in self.children:
+            if not c.is_dir():
+                continue
+            if len(c.children) > 1:
+                c.children[1].data_length = self.data_length
 
     def add_child(self, child, logical_block_size, allow_duplicate=False):
         '''
@@ -877,6 +906,34 @@ class DirectoryRecord(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInternalError("Directory Record not yet initialized")
 
+        self._delete_child(child, index)
+
+        # We now have to check if we need to remove a logical block.
+        # We have to iterate over the entire list again, because where we
+        # removed this last entry may rearrange the empty spaces in the blocks
+        # that we've already allocated.
+        num_extents, dirrecord_offset = self._recalculate_extents_and_offsets(index,
+                                                                              logical_block_size)
+
+        underflow = False
+        total_size = (num_extents - 1) * logical_block_size + dirrecord_offset
+        if (self.data_length - total_size) > logical_block_size:
+            self._set_data_length(self.data_length - logical_block_size)
+            underflow = True
+
+        return underflow
+
+    def _delete_child(self, child, index):
+        '''
+        An internal method to delete a child from the list of children of this
+        object, without recalculating the offsets of the children.
+
+        Parameters:
+         child - The child DirectoryRecord object to delete.
+         index - The index of the child into this DirectoryRecord children list.
+        Returns:
+         Nothing.
+        '''
         # Unfortunately, Rock Ridge specifies that a CL "directory" is replaced
         # by a *file*, not another directory.  Thus, we can't just depend on
         # whether this child is marked as a directory by the file flags during
@@ -894,35 +951,71 @@ class DirectoryRecord(object):
 
         del self.children[index]
 
-        # We now have to check if we need to remove a logical block.
-        # We have to iterate over the entire list again, because where we
-        # removed this last entry may rearrange the empty spaces in the blocks
-        # that we've already allocated.
-        num_extents, dirrecord_offset = self._recalculate_extents_and_offsets(index,
+    def add_child_deferred(self, child, allow_duplicate=False):
+        '''
+        A method to add a new child to this directory record without laying
+        out the directory again.  The caller must call update_layout() before
+        the layout of this directory is relied upon.
+
+        Parameters:
+         child - The child directory record object to add.
+         allow_duplicate - Whether to allow duplicate names, as there are situations where duplicate children are allowed.
+        Returns:
+         Nothing.
+        '''
+        if not self._initialized:
+            raise pycdlibexception.PyCdlibInternalError("Directory Record not yet initialized")
+
+        self._insert_child(child, allow_duplicate)
+
+    def remove_child_deferred(self, child):
+        '''
+        A method to remove a child from this directory record without laying
+        out the directory again.  Since the index of each child is only kept
+        up-to-date by a layout, the child is looked up by identity.  The caller
+        must call update_layout() before the layout of this directory is
+        relied upon.
+
+        Parameters:
+         child - The child DirectoryRecord object to remove.
+        Returns:
+         Nothing.
+        '''
+        if not self._initialized:
+            raise pycdlibexception.PyCdlibInternalError("Directory Record not yet initialized")
+
+        index = bisect.bisect_left(self.children, child)
+        while index < len(self.children) and self.children[index] is not child:
+            index += 1
+        if index == len(self.children):
+            raise pycdlibexception.PyCdlibInternalError("Could not find child in parent!")
+
+        self._delete_child(child, index)
+
+    def update_layout(self, logical_block_size):
+        '''
+        A method to lay out all of the children of this directory record, and
+        grow or shrink the directory to fit them.  This is the deferred
+        counterpart of the work done by add_child() and remove_child().
+
+        Parameters:
+         logical_block_size - The size of a logical block on this volume descriptor.
+        Returns:
+         The number of extents the directory grew by; this is negative if the
+         directory shrank.
+        '''
+        if not self._initialized:
+            raise pycdlibexception.PyCdlibInternalError("Directory Record not yet initialized")
+
+        num_extents, dirrecord_offset = self._recalculate_extents_and_offsets(0,
                                                                               logical_block_size)
 
-        underflow = False
+        old_data_length = self.data_length
         total_size = (num_extents - 1) * logical_block_size + dirrecord_offset
-        if (self.data_length - total_size) > logical_block_size:
-            self.data_length -= logical_block_size
-            # We also have to make sure to update the length of the dot child,
-            # as that should always reflect the length.
-            self.children[0].data_length = self.data_length
-            # We also have to update all of the dotdot entries.  If this is
-            # the root directory record (no parent), we first update the root
-            # dotdot entry.  In all cases, we update the dotdot entry of all
-            # children that are directories.
-            if self.parent is None:
-                self.children[1].data_length = self.data_length
-
-            for c in self.children:
-                if not c.is_dir():
-                    continue
-                if len(c.children) > 1:
-                    c.children[1].data_length = self.data_length
-            underflow = True
+        if num_extents * logical_block_size > self.data_length or (self.data_length - total_size) > logical_block_size:
+            self._set_data_length(num_extents * logical_block_size)
 
-        return underflow
+        return utils.ceiling_div(self.data_length, logical_block_size) - utils.ceiling_div(old_data_length, logical_block_size)
 
     def is_dir(self):
         '''
@@ -1063,7 +1156,7 @@ class DirectoryRecord(object):
         self.date = dates.DirectoryRecordDate()
         self.date.new()
 
-        padlen = struct.calcsize(self.FMT) + self.len_fi
+        padlen = self.STRUCT.size + self.len_fi
         padstr = b'\x00' * (padlen % 2)
 
         extent_loc = self._extent_location()
@@ -1075,13 +1168,13 @@ class DirectoryRecord(object):
         if self.rock_ridge is not None:
             rr_rec = self.rock_ridge.record_dr_entries()
 
-        outlist = [struct.pack(self.FMT, self.dr_len, self.xattr_len,
-                               extent_loc, utils.swab_32bit(extent_loc),
-                               self.data_length, utils.swab_32bit(self.data_length),
-                               self.date.record(), self.file_flags,
-                               self.file_unit_size, self.interleave_gap_size,
-                               self.seqnum, utils.swab_16bit(self.seqnum),
-                               self.len_fi) + self.file_ident + padstr + xa_rec + rr_rec]
+        outlist = [self.STRUCT.pack(self.dr_len, self.xattr_len,
+                                    extent_loc, utils.swab_32bit(extent_loc),
+                                    self.data_length, utils.swab_32bit(self.data_length),
+                                    self.date.record(), self.file_flags,
+                                    self.file_unit_size, self.interleave_gap_size,
+                                    self.seqnum, utils.swab_16bit(self.seqnum),
+                                    self.len_fi) + self.file_ident + padstr + xa_rec + rr_rec]
 
         outlist.append(b'\x00' * (len(outlist[0]) % 2))
 
@@ -1197,16 +1290,30 @@ class DROpenData(object):
             # actually contains the filename, not the fp.  Use that to
             # our advantage here.
             self.data_fp = open(self.drobj.data_fp, 'rb')
+            self.data_fp.seek(self.data_offset())
         else:
-            self.data_fp = self.drobj.data_fp
-
-        if self.drobj.original_data_location == self.drobj.DATA_ON_ORIGINAL_ISO:
-            self.data_fp.seek(self.drobj.orig_extent_loc * self.logical_block_size)
-        else:
-            self.data_fp.seek(self.drobj.fp_offset)
+            # The file object may be shared (with the ISO being read, or
+            # with other files), so read it through a reader with its own
+            # position; that way, several threads can read at once.
+            self.data_fp = utils.PositionalReader(self.drobj.data_fp,
+                                                  self.data_offset())
 
         return self.data_fp, self.drobj.data_length
 
     def __exit__(self, *args):
         if self.drobj.manage_fp:
             self.data_fp.close()
+
+    def data_offset(self):
+        '''
+        A method to get the offset of the data within the data file object,
+        without touching the file object itself.
+
+        Parameters:
+         None.
+        Returns:
+         The offset of the data within the data file object.
+        '''
+        if self.drobj.original_data_location == self.drobj.DATA_ON_ORIGINAL_ISO:
+            return self.drobj.orig_extent_loc * self.logical_block_size
+        return self.drobj.fp_offset
@@ -36,6 +36,9 @@ class EltoritoBootInfoTable(object):
     '''
     __slots__ = ['_initialized', 'pvd_extent', 'orig_len', 'csum', 'vd', 'dirrecord']
 
+    FMT = "=LLLL"
+    STRUCT = struct.Struct(FMT)
+
     def __init__(self):
         self._initialized = False
 
@@ -52,7 +55,7 @@ class EltoritoBootInfoTable(object):
         if self._initialized:
             raise pycdlibexception.PyCdlibInternalError("This Eltorito Boot Info Table is already initialized")
         (self.pvd_extent, rec_extent_unused, self.orig_len,
-         self.csum) = struct.unpack_from("=LLLL", datastr, 0)
+         self.csum) = self.STRUCT.unpack_from(datastr, 0)
 
         self.vd = vd
         self.dirrecord = dirrecord
@@ -121,7 +124,7 @@ class EltoritoBootInfoTable(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInternalError("This Eltorito Boot Info Table not yet initialized")
 
-        return struct.pack("=LLLL", self.vd.extent_location(), self.dirrecord.extent_location(), self.orig_len, self.csum) + b'\x00' * 40
+        return self.STRUCT.pack(self.vd.extent_location(), self.dirrecord.extent_location(), self.orig_len, self.csum) + b'\x00' * 40
 
     @staticmethod
     def header_length():
@@ -153,6 +156,7 @@ class EltoritoValidationEntry(object):
     # Offset 0x1e:      Key byte 0x55
     # Offset 0x1f:      Key byte 0xaa
     FMT = "=BBH24sHBB"
+    STRUCT = struct.Struct(FMT)
 
     def __init__(self):
         self._initialized = False
@@ -200,7 +204,7 @@ class EltoritoValidationEntry(object):
 
         (header_id, self.platform_id, reserved_unused, self.id_string,
          self.checksum, keybyte1,
-         keybyte2) = struct.unpack_from(self.FMT, valstr, 0)
+         keybyte2) = self.STRUCT.unpack_from(valstr, 0)
 
         if header_id != 1:
             raise pycdlibexception.PyCdlibInvalidISO("El Torito Validation entry header ID not 1")
@@ -248,8 +252,8 @@ class EltoritoValidationEntry(object):
         Returns:
          String representing this El Torito Validation Entry.
         '''
-        return struct.pack(self.FMT, 1, self.platform_id, 0, self.id_string,
-                           self.checksum, 0x55, 0xaa)
+        return self.STRUCT.pack(1, self.platform_id, 0, self.id_string,
+                                self.checksum, 0x55, 0xaa)
 
     def record(self):
         '''
@@ -292,6 +296,7 @@ class EltoritoEntry(object):
     # Offset 0xc:      Selection criteria type
     # Offset 0xd-0x1f: Selection critera
     FMT = "=BBHBBHLB19s"
+    STRUCT = struct.Struct(FMT)
     MEDIA_NO_EMUL = 0
     MEDIA_12FLOPPY = 1
     MEDIA_144FLOPPY = 2
@@ -317,7 +322,7 @@ class EltoritoEntry(object):
         (self.boot_indicator, self.boot_media_type, self.load_segment,
          self.system_type, unused1, self.sector_count, self.load_rba,
          self.selection_criteria_type,
-         self.selection_criteria) = struct.unpack_from(self.FMT, valstr, 0)
+         self.selection_criteria) = self.STRUCT.unpack_from(valstr, 0)
 
         if self.boot_indicator not in [0x88, 0x00]:
             raise pycdlibexception.PyCdlibInvalidISO("Invalid eltorito initial entry boot indicator")
@@ -445,11 +450,11 @@ class EltoritoEntry(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInternalError("El Torito Entry not yet initialized")
 
-        return struct.pack(self.FMT, self.boot_indicator, self.boot_media_type,
-                           self.load_segment, self.system_type, 0,
-                           self.sector_count, self.load_rba,
-                           self.selection_criteria_type,
-                           self.selection_criteria)
+        return self.STRUCT.pack(self.boot_indicator, self.boot_media_type,
+                                self.load_segment, self.system_type, 0,
+                                self.sector_count, self.load_rba,
+                                self.selection_criteria_type,
+                                self.selection_criteria)
 
     def length(self):
         '''
@@ -474,6 +479,7 @@ class EltoritoSectionHeader(object):
     __slots__ = ['_initialized', 'header_indicator', 'platform_id', 'num_section_entries', 'id_string', 'section_entries']
 
     FMT = "=BBH28s"
+    STRUCT = struct.Struct(FMT)
 
     def __init__(self):
         self._initialized = False
@@ -492,7 +498,7 @@ class EltoritoSectionHeader(object):
             raise pycdlibexception.PyCdlibInternalError("El Torito Section Header already initialized")
 
         (self.header_indicator, self.platform_id, self.num_section_entries,
-         self.id_string) = struct.unpack_from(self.FMT, valstr, 0)
+         self.id_string) = self.STRUCT.unpack_from(valstr, 0)
 
         self._initialized = True
 
@@ -580,9 +586,9 @@ class EltoritoSectionHeader(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInternalError("El Torito Section Header not yet initialized")
 
-        outlist = [struct.pack(self.FMT, self.header_indicator,
-                               self.platform_id, self.num_section_entries,
-                               self.id_string)]
+        outlist = [self.STRUCT.pack(self.header_indicator,
+                                    self.platform_id, self.num_section_entries,
+                                    self.id_string)]
 
         for entry in self.section_entries:
             outlist.append(entry.record())
@@ -42,7 +42,7 @@ class HeaderVolumeDescriptor(object):
     types of descriptors share much of the same functionality, so this is the
     parent class that both classes derive from.
     '''
-    __slots__ = ['_initialized', 'space_size', 'log_block_size', 'root_dir_record', 'path_tbl_size', 'path_table_num_extents', 'seqnum', 'new_extent_loc', 'orig_extent_loc']
+    __slots__ = ['_initialized', 'space_size', 'log_block_size', 'root_dir_record', 'path_tbl_size', 'path_table_num_extents', 'seqnum', 'new_extent_loc', 'orig_extent_loc', 'extent_to_dr']
 
     def __init__(self):
         self._initialized = False
@@ -54,6 +54,7 @@ class HeaderVolumeDescriptor(object):
         self.seqnum = None
         self.new_extent_loc = None
         self.orig_extent_loc = None
+        self.extent_to_dr = {}
 
     def parse(self, vd, data_fp, extent_loc):
         '''
@@ -270,6 +271,63 @@ class HeaderVolumeDescriptor(object):
         self.path_tbl_size = othervd.path_tbl_size
         self.path_table_num_extents = othervd.path_table_num_extents
 
+    def track_dirrecord(self, rec):
+        '''
+        A method to add a directory record to the extent index of this Volume
+        Descriptor.  Only records that actually own the data at their extent
+        are tracked; that excludes the dot and dotdot entries, zero-length
+        files, Rock Ridge symlinks, and Rock Ridge child link placeholders.
+        If more than one record owns the same extent (hard links), the first
+        one tracked wins.
+
+        Parameters:
+         rec - The directory record to track.
+        Returns:
+         Nothing.
+        '''
+        if rec.isdir:
+            if rec.file_ident in (b'\x00', b'\x01') and not rec.is_root:
+                return
+        elif rec.data_length == 0:
+            return
+
+        if rec.rock_ridge is not None and (rec.rock_ridge.child_link_record_exists() or rec.rock_ridge.is_symlink()):
+            return
+
+        extent = rec.extent_location()
+        if extent not in self.extent_to_dr:
+            self.extent_to_dr[extent] = rec
+
+    def clear_dirrecord_index(self):
+        '''
+        A method to forget all of the directory records in the extent index of
+        this Volume Descriptor.  This is used when extents are being
+        reassigned.
+
+        Parameters:
+         None.
+        Returns:
+         Nothing.
+        '''
+        self.extent_to_dr = {}
+
+    def find_dirrecord_by_extent(self, extent):
+        '''
+        A method to find the directory record that owns the data at an extent.
+
+        Parameters:
+         extent - The extent to look up.
+        Returns:
+         The directory record that owns the extent.
+        '''
+        if not self._initialized:
+            raise pycdlibexception.PyCdlibInternalError("This Volume Descriptor is not yet initialized")
+
+        try:
+            return self.extent_to_dr[extent]
+        except KeyError:
+            raise pycdlibexception.PyCdlibInvalidInput("Could not find file with specified extent!")
+
     def extent_location(self):
         '''
         A method to get this Volume Descriptor's extent location.
@@ -374,6 +432,7 @@ class PrimaryVolumeDescriptor(HeaderVolumeDescriptor):
     __slots__ = ['rr_ce_blocks', 'system_identifier', 'volume_identifier', 'path_table_location_le', 'optional_path_table_location_le', 'path_table_location_be', 'optional_path_table_location_be', 'volume_set_identifier', 'copyright_file_identifier', 'abstract_file_identifier', 'bibliographic_file_identifier', 'file_structure_version', 'application_use', 'set_size', 'publisher_identifier', 'preparer_identifier', 'application_identifier', 'volume_creation_date', 'volume_modification_date', 'volume_expiration_date', 'volume_effective_date']
 
     FMT = "=B5sBB32s32sQLL32sHHHHHHLLLLLL34s128s128s128s128s37s37s37s17s17s17s17sBB512s653s"
+    STRUCT = struct.Struct(FMT)
 
     def __init__(self):
         HeaderVolumeDescriptor.__init__(self)
@@ -424,7 +483,7 @@ class PrimaryVolumeDescriptor(HeaderVolumeDescriptor):
          self.abstract_file_identifier, self.bibliographic_file_identifier,
          vol_create_date_str, vol_mod_date_str, vol_expire_date_str,
          vol_effective_date_str, self.file_structure_version, unused4,
-         self.application_use, zero5_unused) = struct.unpack_from(self.FMT, vd, 0)
+         self.application_use, zero5_unused) = self.STRUCT.unpack_from(vd, 0)
 
         # According to Ecma-119, 8.4.1, the primary volume descriptor type
         # should be 1.
@@ -703,32 +762,32 @@ class PrimaryVolumeDescriptor(HeaderVolumeDescriptor):
         vol_mod_date = dates.VolumeDescriptorDate()
         vol_mod_date.new(time.time())
 
-        return struct.pack(self.FMT, VOLUME_DESCRIPTOR_TYPE_PRIMARY,
-                           b'CD001', 1, 0, self.system_identifier,
-                           self.volume_identifier, 0, self.space_size,
-                           utils.swab_32bit(self.space_size), b'\x00' * 32,
-                           self.set_size, utils.swab_16bit(self.set_size),
-                           self.seqnum, utils.swab_16bit(self.seqnum),
-                           self.log_block_size, utils.swab_16bit(self.log_block_size),
-                           self.path_tbl_size, utils.swab_32bit(self.path_tbl_size),
-                           self.path_table_location_le,
-                           self.optional_path_table_location_le,
-                           utils.swab_32bit(self.path_table_location_be),
-                           self.optional_path_table_location_be,
-                           self.root_dir_record.record(),
-                           self.volume_set_identifier,
-                           self.publisher_identifier.record(),
-                           self.preparer_identifier.record(),
-                           self.application_identifier.record(),
-                           self.copyright_file_identifier,
-                           self.abstract_file_identifier,
-                           self.bibliographic_file_identifier,
-                           self.volume_creation_date.record(),
-                           vol_mod_date.record(),
-                           self.volume_expiration_date.record(),
-                           self.volume_effective_date.record(),
-                           self.file_structure_version, 0, self.application_use,
-                           b"\x00" * 653)
+        return self.STRUCT.pack(VOLUME_DESCRIPTOR_TYPE_PRIMARY,
+                                b'CD001', 1, 0, self.system_identifier,
+                                self.volume_identifier, 0, self.space_size,
+                                utils.swab_32bit(self.space_size), b'\x00' * 32,
+                                self.set_size, utils.swab_16bit(self.set_size),
+                                self.seqnum, utils.swab_16bit(self.seqnum),
+                                self.log_block_size, utils.swab_16bit(self.log_block_size),
+                                self.path_tbl_size, utils.swab_32bit(self.path_tbl_size),
+                                self.path_table_location_le,
+                                self.optional_path_table_location_le,
+                                utils.swab_32bit(self.path_table_location_be),
+                                self.optional_path_table_location_be,
+                                self.root_dir_record.record(),
+                                self.volume_set_identifier,
+                                self.publisher_identifier.record(),
+                                self.preparer_identifier.record(),
+                                self.application_identifier.record(),
+                                self.copyright_file_identifier,
+                                self.abstract_file_identifier,
+                                self.bibliographic_file_identifier,
+                                self.volume_creation_date.record(),
+                                vol_mod_date.record(),
+                                self.volume_expiration_date.record(),
+                                self.volume_effective_date.record(),
+                                self.file_structure_version, 0, self.application_use,
+                                b"\x00" * 653)
 
     def track_rr_ce_entry(self, extent, offset, length):
         '''
@@ -824,6 +883,7 @@ class VolumeDescriptorSetTerminator(object):
     __slots__ = ['_initialized', 'orig_extent_loc', 'new_extent_loc']
 
     FMT = "=B5sB2041s"
+    STRUCT = struct.Struct(FMT)
 
     def __init__(self):
         self._initialized = False
@@ -842,7 +902,7 @@ class VolumeDescriptorSetTerminator(object):
             raise pycdlibexception.PyCdlibInternalError("Volume Descriptor Set Terminator already initialized")
 
         (descriptor_type, identifier, version,
-         zero_unused) = struct.unpack_from(self.FMT, vd, 0)
+         zero_unused) = self.STRUCT.unpack_from(vd, 0)
 
         # According to Ecma-119, 8.3.1, the volume descriptor set terminator
         # type should be 255
@@ -893,8 +953,8 @@ class VolumeDescriptorSetTerminator(object):
         '''
         if not self._initialized:
             raise pycdlibexception.PyCdlibInternalError("Volume Descriptor Set Terminator not yet initialized")
-        return struct.pack(self.FMT, VOLUME_DESCRIPTOR_TYPE_SET_TERMINATOR,
-                           b'CD001', 1, b"\x00" * 2041)
+        return self.STRUCT.pack(VOLUME_DESCRIPTOR_TYPE_SET_TERMINATOR,
+                                b'CD001', 1, b"\x00" * 2041)
 
     def extent_location(self):
         '''
@@ -920,6 +980,7 @@ class BootRecord(object):
     __slots__ = ['_initialized', 'boot_system_identifier', 'boot_identifier', 'boot_system_use', 'orig_extent_loc', 'new_extent_loc']
 
     FMT = "=B5sB32s32s1977s"
+    STRUCT = struct.Struct(FMT)
 
     def __init__(self):
         self._initialized = False
@@ -939,7 +1000,7 @@ class BootRecord(object):
 
         (descriptor_type, identifier, version,
          self.boot_system_identifier, self.boot_identifier,
-         self.boot_system_use) = struct.unpack_from(self.FMT, vd, 0)
+         self.boot_system_use) = self.STRUCT.unpack_from(vd, 0)
 
         # According to Ecma-119, 8.2.1, the boot record type should be 0
         if descriptor_type != VOLUME_DESCRIPTOR_TYPE_BOOT_RECORD:
@@ -991,9 +1052,9 @@ class BootRecord(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInternalError("Boot Record not yet initialized")
 
-        return struct.pack(self.FMT, VOLUME_DESCRIPTOR_TYPE_BOOT_RECORD,
-                           b'CD001', 1, self.boot_system_identifier,
-                           self.boot_identifier, self.boot_system_use)
+        return self.STRUCT.pack(VOLUME_DESCRIPTOR_TYPE_BOOT_RECORD,
+                                b'CD001', 1, self.boot_system_identifier,
+                                self.boot_identifier, self.boot_system_use)
 
     def update_boot_system_use(self, boot_sys_use):
         '''
@@ -1034,6 +1095,7 @@ class SupplementaryVolumeDescriptor(HeaderVolumeDescriptor):
     __slots__ = ['version', 'flags', 'system_identifier', 'volume_identifier', 'escape_sequences', 'path_table_location_le', 'optional_path_table_location_le', 'path_table_location_be', 'optional_path_table_location_be', 'volume_set_identifier', 'copyright_file_identifier', 'abstract_file_identifier', 'bibliographic_file_identifier', 'file_structure_version', 'application_use', 'set_size', 'publisher_identifier', 'preparer_identifier', 'application_identifier', 'volume_creation_date', 'volume_modification_date', 'volume_expiration_date', 'volume_effective_date']
 
     FMT = "=B5sBB32s32sQLL32sHHHHHHLLLLLL34s128s128s128s128s37s37s37s17s17s17s17sBB512s653s"
+    STRUCT = struct.Struct(FMT)
 
     def __init__(self):
         HeaderVolumeDescriptor.__init__(self)
@@ -1064,7 +1126,7 @@ class SupplementaryVolumeDescriptor(HeaderVolumeDescriptor):
          self.abstract_file_identifier, self.bibliographic_file_identifier,
          vol_create_date_str, vol_mod_date_str, vol_expire_date_str,
          vol_effective_date_str, self.file_structure_version, unused2,
-         self.application_use, unused3) = struct.unpack_from(self.FMT, vd, 0)
+         self.application_use, unused3) = self.STRUCT.unpack_from(vd, 0)
 
         # According to Ecma-119, 8.5.1, the supplementary volume descriptor type
         # should be 2.
@@ -1279,31 +1341,31 @@ class SupplementaryVolumeDescriptor(HeaderVolumeDescriptor):
         vol_mod_date = dates.VolumeDescriptorDate()
         vol_mod_date.new(time.time())
 
-        return struct.pack(self.FMT, VOLUME_DESCRIPTOR_TYPE_SUPPLEMENTARY,
-                           b'CD001', self.version, self.flags, self.system_identifier,
-                           self.volume_identifier, 0, self.space_size,
-                           utils.swab_32bit(self.space_size), self.escape_sequences,
-                           self.set_size, utils.swab_16bit(self.set_size),
-                           self.seqnum, utils.swab_16bit(self.seqnum),
-                           self.log_block_size, utils.swab_16bit(self.log_block_size),
-                           self.path_tbl_size, utils.swab_32bit(self.path_tbl_size),
-                           self.path_table_location_le, self.optional_path_table_location_le,
-                           utils.swab_32bit(self.path_table_location_be),
-                           self.optional_path_table_location_be,
-                           self.root_dir_record.record(),
-                           self.volume_set_identifier,
-                           self.publisher_identifier.record(),
-                           self.preparer_identifier.record(),
-                           self.application_identifier.record(),
-                           self.copyright_file_identifier,
-                           self.abstract_file_identifier,
-                           self.bibliographic_file_identifier,
-                           self.volume_creation_date.record(),
-                           vol_mod_date.record(),
-                           self.volume_expiration_date.record(),
-                           self.volume_effective_date.record(),
-                           self.file_structure_version, 0,
-                           self.application_use, b'\x00' * 653)
+        return self.STRUCT.pack(VOLUME_DESCRIPTOR_TYPE_SUPPLEMENTARY,
+                                b'CD001', self.version, self.flags, self.system_identifier,
+                                self.volume_identifier, 0, self.space_size,
+                                utils.swab_32bit(self.space_size), self.escape_sequences,
+                                self.set_size, utils.swab_16bit(self.set_size),
+                                self.seqnum, utils.swab_16bit(self.seqnum),
+                                self.log_block_size, utils.swab_16bit(self.log_block_size),
+                                self.path_tbl_size, utils.swab_32bit(self.path_tbl_size),
+                                self.path_table_location_le, self.optional_path_table_location_le,
+                                utils.swab_32bit(self.path_table_location_be),
+                                self.optional_path_table_location_be,
+                                self.root_dir_record.record(),
+                                self.volume_set_identifier,
+                                self.publisher_identifier.record(),
+                                self.preparer_identifier.record(),
+                                self.application_identifier.record(),
+                                self.copyright_file_identifier,
+                                self.abstract_file_identifier,
+                                self.bibliographic_file_identifier,
+                                self.volume_creation_date.record(),
+                                vol_mod_date.record(),
+                                self.volume_expiration_date.record(),
+                                self.volume_effective_date.record(),
+                                self.file_structure_version, 0,
+                                self.application_use, b'\x00' * 653)
 
 
 class VersionVolumeDescriptor(object):
@@ -33,6 +33,7 @@ class PathTableRecord(object):
     __slots__ = ['_initialized', 'len_di', 'xattr_length', 'extent_location', 'parent_directory_num', 'directory_identifier', 'dirrecord']
 
     FMT = "=BBLH"
+    STRUCT = struct.Struct(FMT)
 
     def __init__(self):
         self._initialized = False
@@ -47,12 +48,12 @@ class PathTableRecord(object):
          Nothing.
         '''
         (self.len_di, self.xattr_length, self.extent_location,
-         self.parent_directory_num) = struct.unpack_from(self.FMT, data[:8], 0)
+         self.parent_directory_num) = self.STRUCT.unpack_from(data, 0)
 
         if self.len_di % 2 != 0:
-            self.directory_identifier = data[8:-1]
+            self.directory_identifier = bytes(data[8:-1])
         else:
-            self.directory_identifier = data[8:]
+            self.directory_identifier = bytes(data[8:])
         self.dirrecord = None
         self._initialized = True
 
@@ -67,8 +68,8 @@ class PathTableRecord(object):
         Returns:
          A string representing this Path Table Record.
         '''
-        return struct.pack(self.FMT, self.len_di, self.xattr_length,
-                           ext_loc, parent_dir_num) + self.directory_identifier + b'\x00' * (self.len_di % 2)
+        return self.STRUCT.pack(self.len_di, self.xattr_length, ext_loc,
+                                parent_dir_num) + self.directory_identifier + b'\x00' * (self.len_di % 2)
 
     def record_little_endian(self):
         '''
@@ -111,7 +112,7 @@ class PathTableRecord(object):
         Returns:
          The total length that a Path Directory Record with this name would occupy.
         '''
-        return struct.calcsize(cls.FMT) + len_di + (len_di % 2)
+        return cls.STRUCT.size + len_di + (len_di % 2)
 
     def _new(self, name, parent_dir_num):
         '''
@@ -21,22 +21,29 @@ Main PyCdlib class and support classes and utilities.
 from __future__ import absolute_import
 
 import bisect
+import calendar
 import collections
+import gc
+import hashlib
 import inspect
 import io
+import mmap
+import multiprocessing.pool
 import os
+import pickle
+import stat
 import struct
-try:
-    from functools import lru_cache
-except ImportError:
-    from pycdlib.backport_functools import lru_cache
+import threading
+import zlib
 
+import pycdlib.dates as dates
 import pycdlib.dr as dr
 import pycdlib.eltorito as eltorito
 import pycdlib.headervd as headervd
 import pycdlib.isohybrid as isohybrid
 import pycdlib.path_table_record as path_table_record
 import pycdlib.pycdlibexception as pycdlibexception
+import pycdlib.rockridge as rockridge
 import pycdlib.utils as utils
 
 # There are a number of specific ways that numerical data is stored in the
@@ -290,29 +297,234 @@ def _interchange_level_from_name(name, is_dir):
     return _interchange_level_from_filename(name)
 
 
-def _find_record_by_extent(vd, extent):
+def _is_joliet_svd(svd):
     '''
-    A function to find a directory record given an extent.
+    An internal function to determine whether a Supplementary Volume
+    Descriptor is a Joliet one.
 
     Parameters:
-     vd - The volume descriptor to look for the record in.
-     extent - The extent to find the record for.
+     svd - The Supplementary Volume Descriptor to check.
     Returns:
-     The directory record entry representing the entry on the ISO.
+     True if the Supplementary Volume Descriptor is a Joliet one, False
+     otherwise.
     '''
-    # Search through the filesystem, looking for the file that matches the
-    # extent that the boot catalog lives at.
-    dirs = [vd.root_directory_record()]
-    while dirs:
-        curr = dirs.pop(0)
-        # Skip the dot and dotdot entries
-        for child in curr.children[2:]:
-            if child.extent_location() == extent:
-                return child
-            if child.is_dir():
-                dirs.append(child)
+    return (svd.flags & 0x1) == 0 and svd.escape_sequences[:3] in [b'%/@', b'%/C', b'%/E']
+
+
+def _mmap_view(fp):
+    '''
+    An internal function to memory map the file underlying a file object, so
+    that the metadata of the ISO can be parsed without copying it.
+
+    Parameters:
+     fp - The file object to map.
+    Returns:
+     A read-only memoryview over the whole file, or None if the file object is
+     not backed by a file that can be mapped.
+    '''
+    fileno = utils.file_fileno(fp)
+    if fileno is None:
+        return None
+
+    try:
+        mapped = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    except (EnvironmentError, ValueError):
+        return None
+
+    try:
+        return memoryview(mapped)
+    except TypeError:
+        # On Python 2, mmap objects do not support the new buffer protocol,
+        # so there is no way to slice them without copying.
+        mapped.close()
+        return None
+
+
+def _check_offset_options(offset, workers, sparse, io_policy):
+    '''
+    An internal function to make sure that none of the write options that
+    need the ISO to be at the start of the output are combined with an
+    offset.  Writing at an offset writes every byte of the ISO in order,
+    so there is no way to do them.
+
+    Parameters:
+     offset - The offset the ISO is to be written at.
+     workers - The number of threads to copy file data with.
+     sparse - Whether to leave holes in the output.
+     io_policy - The I/O policy to write with.
+    Returns:
+     Nothing.
+    '''
+    if offset > 0 and (workers > 1 or sparse or io_policy is not None):
+        raise pycdlibexception.PyCdlibInvalidInput("The workers, sparse and io_policy options cannot be used when writing at an offset")
+
+
+def _is_seekable(fp):
+    '''
+    An internal function to determine whether a file object can be seeked.
+
+    Parameters:
+     fp - The file object to check.
+    Returns:
+     True if the file object can be seeked, False otherwise.
+    '''
+    try:
+        return fp.seekable()
+    except AttributeError:
+        # Older file-like objects don't have seekable(); assume that they
+        # can be seeked if they have a seek method.
+        return hasattr(fp, 'seek')
+
+
+def _is_regular_file(fp):
+    '''
+    An internal function to determine whether a file object is backed by a
+    regular file, which can have holes in it.
+
+    Parameters:
+     fp - The file object to check.
+    Returns:
+     True if the file object is a regular file, False otherwise.
+    '''
+    fileno = utils.file_fileno(fp)
+    if fileno is None:
+        return False
+    try:
+        return stat.S_ISREG(os.fstat(fileno).st_mode)
+    except OSError:
+        return False
+
+
+def _nonzero_runs(data, granularity):
+    '''
+    An internal function to find the parts of some data that are not all
+    zero, in units of granularity bytes.
+
+    Parameters:
+     data - The data to look through.
+     granularity - The size of the blocks to check for zeros.
+    Returns:
+     A list of (start, end) tuples of the runs of blocks that are not all
+     zero.
+    '''
+    zeros = b'\x00' * granularity
+    if data.find(zeros) == -1:
+        # No whole block of zeros anywhere, so this has to be written out
+        # as is.  This is the common case for file data.
+        if data.count(b'\x00') == len(data):
+            return []
+        return [(0, len(data))]
+
+    runs = []
+    start = None
+    for offset in range(0, len(data), granularity):
+        block = data[offset:offset + granularity]
+        if block.count(b'\x00') == len(block):
+            if start is not None:
+                runs.append((start, offset))
+                start = None
+        elif start is None:
+            start = offset
+    if start is not None:
+        runs.append((start, len(data)))
+    return runs
+
+
+def _date_to_epoch(date):
+    '''
+    An internal function to convert a Directory Record date or a Volume
+    Descriptor date (as used in Rock Ridge TF records) to seconds since the
+    epoch.
+
+    Parameters:
+     date - The date to convert.
+    Returns:
+     The number of seconds since the epoch, or None if the date is not
+     specified.
+    '''
+    if date is None:
+        return None
+    if hasattr(date, 'years_since_1900'):
+        year = date.years_since_1900 + 1900
+        day = date.day_of_month
+    else:
+        year = date.year
+        day = date.dayofmonth
+    if year == 0 or date.month == 0 or day == 0:
+        return None
+    # The date is local time, with the offset from GMT in 15 minute units.
+    return calendar.timegm((year, date.month, day, date.hour, date.minute,
+                            date.second, 0, 0, 0)) - date.gmtoffset * 15 * 60
+
+
+def _extract_name(rec, namespace):
+    '''
+    An internal function to get the name to extract a directory record to in
+    a local directory.
+
+    Parameters:
+     rec - The directory record.
+     namespace - The namespace being extracted; one of 'iso', 'rr', or
+                 'joliet'.
+    Returns:
+     The name to extract the record to.
+    '''
+    if namespace == 'joliet':
+        name = rec.file_identifier().decode('utf-16_be')
+    elif namespace == 'rr' and rec.rock_ridge is not None:
+        name = rec.rock_ridge.name().decode('utf-8')
+    else:
+        name = rec.file_identifier()
+        if not rec.is_dir():
+            # Drop the version, and the dot of an empty extension.
+            name = name.split(b';')[0]
+            if name.endswith(b'.'):
+                name = name[:-1]
+        name = name.decode('utf-8')
+
+    # The names come from the ISO, so make sure they can't escape from the
+    # directory they are being extracted into.
+    if name in ('', '.', '..') or '/' in name or os.sep in name:
+        raise pycdlibexception.PyCdlibInvalidISO("Cannot extract an entry named %s" % (name))
+    return name
+
+
+def _set_extracted_metadata(rec, path, namespace):
+    '''
+    An internal function to set the mode and times of a file or directory
+    that was extracted from the ISO.  The mode and times come from the Rock
+    Ridge entry when extracting the Rock Ridge namespace; otherwise, only the
+    modification time is set, from the date in the directory record.
 
-    raise pycdlibexception.PyCdlibInvalidInput("Could not find file with specified extent!")
+    Parameters:
+     rec - The directory record that was extracted.
+     path - The local path it was extracted to.
+     namespace - The namespace being extracted.
+    Returns:
+     Nothing.
+    '''
+    mtime = _date_to_epoch(rec.date)
+    atime = mtime
+    if namespace == 'rr' and rec.rock_ridge is not None:
+        try:
+            os.chmod(path, stat.S_IMODE(rec.rock_ridge.get_file_mode()))
+        except pycdlibexception.PyCdlibInvalidInput:
+            # No PX record, so no mode to set.
+            pass
+        tf_record = rec.rock_ridge.dr_entries.tf_record
+        if tf_record is None:
+            tf_record = rec.rock_ridge.ce_entries.tf_record
+        if tf_record is not None:
+            rr_mtime = _date_to_epoch(tf_record.modification_time)
+            if rr_mtime is not None:
+                mtime = rr_mtime
+                atime = rr_mtime
+            rr_atime = _date_to_epoch(tf_record.access_time)
+            if rr_atime is not None:
+                atime = rr_atime
+
+    if mtime is not None:
+        os.utime(path, (atime, mtime))
 
 
 def _reassign_vd_dirrecord_extents(vd, current_extent):
@@ -327,17 +539,25 @@ def _reassign_vd_dirrecord_extents(vd, current_extent):
      current_extent - The current extent before assigning extents to the
                       volume descriptor directory records.
     Returns:
-     The current extent after assigning extents to the volume descriptor
-     directory records.
+     A tuple of the current extent after assigning extents to the volume
+     descriptor directory records, the list of file records found, and the
+     number of directories whose extent changed.
     '''
 
     if isinstance(vd, headervd.PrimaryVolumeDescriptor):
         vd.clear_rr_ce_entries()
 
     # Here we re-walk the entire tree, re-assigning extents as necessary.
+    # The extent index is rebuilt along the way; directories are added here,
+    # and the caller adds the files once their extents have been assigned.
+    vd.clear_dirrecord_index()
     root_dir_record = vd.root_directory_record()
+    moved = 0
+    if root_dir_record.extent_location() not in (None, current_extent):
+        moved += 1
     root_dir_record.new_extent_loc = current_extent
     root_dir_record.ptr.update_extent_location(current_extent)
+    vd.track_dirrecord(root_dir_record)
     log_block_size = vd.log_block_size
     # Equivalent to utils.ceiling_div(root_dir_record.data_length, log_block_size), but faster
     current_extent += -(-root_dir_record.data_length // log_block_size)
@@ -394,8 +614,11 @@ def _reassign_vd_dirrecord_extents(vd, current_extent):
             if dir_record_rock_ridge is not None and dir_record_rock_ridge.cl_to_moved_dr is not None:
                 child_link_recs.append(dir_record)
             if dir_record_isdir:
+                if dir_record.extent_location() not in (None, current_extent):
+                    moved += 1
                 dir_record.new_extent_loc = current_extent
                 dir_record.ptr.update_extent_location(dir_record.new_extent_loc)
+                vd.track_dirrecord(dir_record)
                 for child in dir_record.children:
                     if child.ptr is not None:
                         child.ptr.update_parent_directory_number(ptr_index)
@@ -425,7 +648,7 @@ def _reassign_vd_dirrecord_extents(vd, current_extent):
     for p in parent_link_recs:
         p.rock_ridge.parent_link_update_from_dirrecord()
 
-    return current_extent, file_list
+    return current_extent, file_list, moved
 
 
 def _split_path(iso_path):
@@ -683,216 +906,1067 @@ def _create_ptr(vd):
     vd.root_directory_record().set_ptr(ptr)
 
 
-class PyCdlib(object):
+class _DirectoryWalk(object):
     '''
-    The main class for manipulating ISOs.
+    An internal class to hold the state accumulated while walking the
+    directory records of a single Volume Descriptor.  When an ISO is opened
+    lazily, this object is kept around so that directories can be parsed on
+    demand later.
     '''
+    __slots__ = ['vd', 'ptrs', 'extent_to_ptr', 'extent_to_dr',
+                 'check_interchange', 'iso_file_length', 'link_records',
+                 'interchange_level', 'lastbyte', 'parent_links',
+                 'child_links', 'cache']
+
+    def __init__(self, vd, ptrs, extent_to_ptr, extent_to_dr,
+                 check_interchange, iso_file_length, link_records):
+        self.vd = vd
+        self.ptrs = ptrs
+        self.extent_to_ptr = extent_to_ptr
+        self.extent_to_dr = extent_to_dr
+        self.check_interchange = check_interchange
+        self.iso_file_length = iso_file_length
+        self.link_records = link_records
+        self.interchange_level = 1
+        self.lastbyte = 0
+        self.parent_links = []
+        self.child_links = []
+        self.cache = None
 
-    __slots__ = ['_initialized', 'cdfp', 'pvds', 'svds', 'vdsts', 'brs', 'pvd', 'tmpdr', 'rock_ridge', '_always_consistent', 'eltorito_boot_catalog', 'isohybrid_mbr', 'xa', '_managing_fp', '_needs_reshuffle', '_rr_moved_record', '_rr_moved_name', '_rr_moved_rr_name', 'enhanced_vd', 'joliet_vd', 'version_vd', 'interchange_level']
 
-    def _parse_volume_descriptors(self):
+class _BlockCache(object):
+    '''
+    An internal class to cache the blocks of an ISO that is not memory mapped
+    while its directories are walked.  The directory extents are read up front
+    in the order they are on the ISO, coalescing nearby extents into one large
+    read, and any other block that is read (such as a Rock Ridge continuation
+    block) is kept so that reading it again costs nothing.
+    '''
+    __slots__ = ['_read_at', '_block_size', '_blocks']
+
+    # Extents that are at most this many blocks apart are read together, along
+    # with the blocks in between.
+    GAP_BLOCKS = 16
+    # The most blocks to read at once.
+    MAX_BLOCKS = 512
+
+    def __init__(self, read_at, block_size):
+        self._read_at = read_at
+        self._block_size = block_size
+        self._blocks = {}
+
+    def _read_blocks(self, first, count):
         '''
-        An internal method to parse the volume descriptors on an ISO.
+        An internal method to read a run of blocks off of the ISO into the
+        cache.
 
         Parameters:
-         None.
+         first - The first block to read.
+         count - The number of blocks to read.
         Returns:
          Nothing.
         '''
-        # Ecma-119 says that the Volume Descriptor set is a sequence of volume
-        # descriptors recorded in consecutively numbered Logical Sectors
-        # starting with Logical Sector Number 16.  Since sectors are 2048 bytes
-        # in length, we start at sector 16 * 2048
-
-        # Ecma-119, 6.2.1 says that the Volume Space is divided into a System
-        # Area and a Data Area, where the System Area is in logical sectors 0
-        # to 15, and whose contents is not specified by the standard.
-        self.cdfp.seek(16 * 2048)
-        while True:
-            # All volume descriptors are exactly 2048 bytes long
-            curr_extent = self.cdfp.tell() // 2048
-            vd = self.cdfp.read(2048)
-            if len(vd) != 2048:
-                raise pycdlibexception.PyCdlibInvalidISO("Failed to read entire volume descriptor")
-            (desc_type, ident) = struct.unpack_from("=B5s", vd, 0)
-            if desc_type not in [headervd.VOLUME_DESCRIPTOR_TYPE_PRIMARY,
-                                 headervd.VOLUME_DESCRIPTOR_TYPE_SET_TERMINATOR,
-                                 headervd.VOLUME_DESCRIPTOR_TYPE_BOOT_RECORD,
-                                 headervd.VOLUME_DESCRIPTOR_TYPE_SUPPLEMENTARY] or ident != b'CD001':
-                # We read the next extent, and it wasn't a descriptor.  Abort
-                # the loop, remembering to back up the input file descriptor.
-                self.cdfp.seek(-2048, 1)
-                break
-            if desc_type == headervd.VOLUME_DESCRIPTOR_TYPE_PRIMARY:
-                pvd = headervd.PrimaryVolumeDescriptor()
-                pvd.parse(vd, self.cdfp, curr_extent)
-                self.pvds.append(pvd)
-            elif desc_type == headervd.VOLUME_DESCRIPTOR_TYPE_SET_TERMINATOR:
-                vdst = headervd.VolumeDescriptorSetTerminator()
-                vdst.parse(vd, curr_extent)
-                self.vdsts.append(vdst)
-            elif desc_type == headervd.VOLUME_DESCRIPTOR_TYPE_BOOT_RECORD:
-                br = headervd.BootRecord()
-                br.parse(vd, curr_extent)
-                self.brs.append(br)
-            elif desc_type == headervd.VOLUME_DESCRIPTOR_TYPE_SUPPLEMENTARY:
-                svd = headervd.SupplementaryVolumeDescriptor()
-                svd.parse(vd, self.cdfp, curr_extent)
-                self.svds.append(svd)
-            # Since we checked for the valid descriptors above, it is impossible
-            # to see an invalid desc_type here, so no check necessary.
-
-        # The language in Ecma-119, p.8, Section 6.7.1 says:
-        #
-        # The sequence shall contain one Primary Volume Descriptor (see 8.4) recorded at least once.
-        #
-        # The important bit there is "at least one", which means that we have
-        # to accept ISOs with more than one PVD.
-        if len(self.pvds) < 1:
-            raise pycdlibexception.PyCdlibInvalidISO("Valid ISO9660 filesystems must have at least one PVD")
-
-        self.pvd = self.pvds[0]
-
-        # Make sure any other PVDs agree with the first one.
-        for pvd in self.pvds[1:]:
-            if pvd != self.pvd:
-                raise pycdlibexception.PyCdlibInvalidISO("Multiple occurrences of PVD did not agree!")
+        data = bytes(self._read_at(first * self._block_size,
+                                   count * self._block_size))
+        for i in range(count):
+            self._blocks[first + i] = data[i * self._block_size:(i + 1) * self._block_size]
 
-            pvd.root_dir_record = self.pvd.root_dir_record
-
-        if len(self.vdsts) < 1:
-            raise pycdlibexception.PyCdlibInvalidISO("Valid ISO9660 filesystems must have at least one Volume Descriptor Set Terminator")
-
-    def _seek_to_extent(self, extent):
+    def prefetch(self, extents):
         '''
-        An internal method to seek to a particular extent on the input ISO.
+        A method to read the given extents into the cache, sorted by their
+        location and coalesced into as few reads as possible.
 
         Parameters:
-         extent - The extent to seek to.
+         extents - An iterable of the extents to read.
         Returns:
          Nothing.
         '''
-        self.cdfp.seek(extent * self.pvd.logical_block_size())
+        first = None
+        last = None
+        for extent in sorted(extents):
+            if extent in self._blocks:
+                continue
+            if first is not None and extent - last <= self.GAP_BLOCKS and extent - first < self.MAX_BLOCKS:
+                last = extent
+                continue
+            if first is not None:
+                self._read_blocks(first, last - first + 1)
+            first = extent
+            last = extent
+
+        if first is not None:
+            self._read_blocks(first, last - first + 1)
 
-    def _find_record(self, **kwargs):
+    def read(self, location, length):
         '''
-        An internal method to find an directory record on the ISO given an ISO,
-        Rock Ridge, or Joliet path.  If the entry is found, it returns the
-        directory record object corresponding to that entry.  If the entry
-        could not be found, a pycdlibexception.PyCdlibInvalidInput is raised.
+        A method to read data from the ISO at an absolute byte location,
+        reading any blocks that are not yet cached.
 
         Parameters:
-         iso_path - Look the entry up as the regular ISO9660 path.
-         rr_path - Look the entry up as a Rock Ridge path.
-         joliet_path - Look the entry up as a Joliet path.
+         location - The byte location on the ISO to start reading at.
+         length - The number of bytes to read.
         Returns:
-         The directory record entry representing the entry on the ISO.
-        '''
-        def normal_lt(child, path):
-            '''
-            Internal method to see whether a directory record is less than the
-            path.
+         The data that was read, which may be shorter than length if the ISO
+         ends first.
+        '''
+        if length <= 0:
+            return b''
+
+        first = location // self._block_size
+        last = (location + length - 1) // self._block_size
+
+        missing = None
+        for block in range(first, last + 2):
+            if block <= last and block not in self._blocks:
+                if missing is None:
+                    missing = block
+            elif missing is not None:
+                self._read_blocks(missing, block - missing)
+                missing = None
+
+        offset = location - first * self._block_size
+        if first == last:
+            return self._blocks[first][offset:offset + length]
+
+        data = b''.join([self._blocks[block] for block in range(first, last + 1)])
+        return data[offset:offset + length]
+
+
+PathIndexInfo = collections.namedtuple("PathIndexInfo", ["hits", "misses", "currsize"])
+
+# One region of the layout returned by PyCdlib.layout().  The kind is one of
+# "zero", "metadata" (the bytes are in data) or "file" (the bytes come from
+# source, which is either a file object or a filename, at source_offset; the
+# DirectoryRecord the data belongs to is in record).
+LayoutRegion = collections.namedtuple("LayoutRegion", ["offset", "length", "kind", "data", "source", "source_offset", "record"])
+
+# The magic at the start of a metadata index written by PyCdlib.save_index(),
+# and the version of its format.  Changes to the attributes of the classes in
+# _INDEX_CLASSES are picked up by _index_layout() on their own; the version
+# only needs to be bumped if the meaning of an attribute changes.
+_INDEX_MAGIC = b'PYCDLIDX'
+_INDEX_VERSION = 2
+
+# The header of a metadata index, which ties it to the ISO it was saved from:
+# the magic, the version, the digest of the layout of the classes in the
+# index, the size of the image the ISO is in, the offset of the ISO within
+# the image, whether the modification time of the image is known, the
+# modification time, and the SHA-256 digest of the volume descriptors.
+_INDEX_HEADER = struct.Struct('<8sL32sQQBd32s')
+
+# The classes that may appear in a metadata index.  Loading an index never
+# creates an object of any other class.
+_INDEX_CLASSES = (dates.DirectoryRecordDate, dates.VolumeDescriptorDate,
+                  dr.DirectoryRecord, dr.XARecord,
+                  eltorito.EltoritoBootCatalog, eltorito.EltoritoBootInfoTable,
+                  eltorito.EltoritoEntry, eltorito.EltoritoSectionHeader,
+                  eltorito.EltoritoValidationEntry,
+                  headervd.BootRecord, headervd.FileOrTextIdentifier,
+                  headervd.PrimaryVolumeDescriptor,
+                  headervd.SupplementaryVolumeDescriptor,
+                  headervd.VersionVolumeDescriptor,
+                  headervd.VolumeDescriptorSetTerminator,
+                  isohybrid.IsoHybrid, path_table_record.PathTableRecord,
+                  rockridge.RockRidge, rockridge.RockRidgeContinuationBlock,
+                  rockridge.RockRidgeContinuationEntry,
+                  rockridge.RockRidgeEntries, rockridge.RRCERecord,
+                  rockridge.RRCLRecord, rockridge.RRERRecord,
+                  rockridge.RRESRecord, rockridge.RRNMRecord,
+                  rockridge.RRPLRecord, rockridge.RRPNRecord,
+                  rockridge.RRPXRecord, rockridge.RRRawRecord,
+                  rockridge.RRRERecord, rockridge.RRRRRecord,
+                  rockridge.RRSFRecord, rockridge.RRSLRecord,
+                  rockridge.RRSLRecord.Component, rockridge.RRSPRecord,
+                  rockridge.RRTFRecord)
+
+# The built-in types that may appear in a metadata index.  Pickle has opcodes
+# of its own for all of these, so loading them never looks up a class.
+_INDEX_PLAIN_TYPES = [type(None), bool, int, float, bytes, str, tuple, list,
+                      dict]
+try:
+    # Python 2 has separate long and unicode types.
+    _INDEX_PLAIN_TYPES.extend([long, unicode])  # pylint: disable=undefined-variable
+except NameError:
+    pass
+_INDEX_PLAIN_TYPES = frozenset(_INDEX_PLAIN_TYPES)
+
+# The attributes of a PyCdlib object that are filled in by parsing an ISO, and
+# so are saved in a metadata index.
+_INDEX_ATTRS = ['pvds', 'svds', 'vdsts', 'brs', 'pvd', 'rock_ridge',
+                'eltorito_boot_catalog', 'isohybrid_mbr', 'xa',
+                '_rr_moved_record', '_rr_moved_name', '_rr_moved_rr_name',
+                'enhanced_vd', 'joliet_vd', 'version_vd', 'interchange_level',
+                '_layout_end']
+
+
+def _index_class_name(cls):
+    '''
+    An internal function to get the name that pickle saves a class under.
 
-            Parameters:
-             child - The directory record to check.
-             path - The path to check.
-            Returns:
-             -1 if the directory record is less than the path, 0 if they are
-             equal, and 1 if the directory record is greater than the path.
-            '''
-            self.tmpdr.file_ident = path
-            return child < self.tmpdr
+    Parameters:
+     cls - The class.
+    Returns:
+     A tuple of the module and the (qualified) name of the class.
+    '''
+    return (cls.__module__, getattr(cls, '__qualname__', cls.__name__))
 
-        def normal_eq(child, path):
-            '''
-            Internal method to see whether a directory record equals the path.
 
-            Parameters:
-             child - The directory record to check.
-             path - The path to check.
-            Returns:
-             True if the directory record name equals the path, False otherwise.
-            '''
-            return child.file_ident == path
+def _index_layout():
+    '''
+    An internal function to compute a digest of the names and attributes of
+    the classes that may appear in a metadata index, so that indices saved by
+    a version of PyCdlib whose classes differ are ignored.
 
-        def rr_lt(child, path):
-            '''
-            Internal method to see whether a Rock Ridge directory record
-            is less than the path.
+    Parameters:
+     None.
+    Returns:
+     The SHA-256 digest of the layout of the classes.
+    '''
+    csum = hashlib.sha256()
+    for cls in _INDEX_CLASSES:
+        slots = []
+        for klass in cls.__mro__:
+            slots.extend(klass.__dict__.get('__slots__', []))
+        (module, name) = _index_class_name(cls)
+        csum.update(('%s.%s:%s;' % (module, name, ','.join(sorted(slots)))).encode('ascii'))
+    return csum.digest()
 
-            Parameters:
-             child - The directory record to check.
-             path - The path to check.
-            Returns:
-             -1 if the directory record is less than the path, 0 if they
-             are equal, and 1 if the directory record is greater than the
-             path.
-            '''
-            return child.rock_ridge.name() < path
 
-        def rr_eq(child, path):
-            '''
-            Internal method to see whether a Rock Ridge directory record
-            equals the path.
+_INDEX_CLASS_NAMES = dict((_index_class_name(cls), cls) for cls in _INDEX_CLASSES)
+_INDEX_LAYOUT = _index_layout()
 
-            Parameters:
-             child - The directory record to check.
-             path - The path to check.
-            Returns:
-             True if the directory record name equals the path, False otherwise.
-            '''
-            return child.rock_ridge.name() == path
 
-        path = None
-        num_paths = 0
-        encoding = 'ascii'
-        self.tmpdr = dr.DirectoryRecord()
-        lt_func = normal_lt
-        eq_func = normal_eq
-        start_offset = 2
-        child_list = "children"
-        vd = self.pvd
-        for key in kwargs:
-            if key == "iso_path" and kwargs[key] is not None:
-                path = utils.normpath(kwargs[key])
-                num_paths += 1
-            elif key == "rr_path" and kwargs[key] is not None:
-                path = utils.normpath(kwargs[key])
-                lt_func = rr_lt
-                eq_func = rr_eq
-                start_offset = 0
-                child_list = "rr_children"
-                num_paths += 1
-            elif key == "joliet_path" and kwargs[key] is not None:
-                path = utils.normpath(kwargs[key])
-                encoding = 'utf-16_be'
-                vd = self.joliet_vd
-                num_paths += 1
-            else:
-                raise pycdlibexception.PyCdlibInvalidInput("Unknown keyword %s" % (key))
+class _IndexPickler(pickle.Pickler):
+    '''
+    An internal class to pickle the parsed metadata of an ISO for a metadata
+    index.  The file object the ISO was opened from is saved as a reference,
+    to be replaced by the file object the ISO is reopened from.  Only the
+    classes in _INDEX_CLASSES and plain built-in values may be saved.
+    '''
+    def __init__(self, fp, cdfp):
+        pickle.Pickler.__init__(self, fp, pickle.HIGHEST_PROTOCOL)
+        self.cdfp = cdfp
 
-        if num_paths != 1:
-            raise pycdlibexception.PyCdlibInvalidInput("Exactly one of iso_path, rr_path, or joliet_path must be passed")
+    def persistent_id(self, obj):  # pylint: disable=method-hidden
+        cls = type(obj)
+        if cls in _INDEX_PLAIN_TYPES:
+            return None
+        if obj is self.cdfp:
+            return 'cdfp'
+        if isinstance(obj, (io.IOBase, utils.FileWindow)) or (cls is dr.DirectoryRecord and obj.manage_fp):
+            raise pycdlibexception.PyCdlibInvalidInput("Cannot save an index of an ISO that has data from outside of it")
+        if cls is type:
+            # The classes of the objects are saved along with them.
+            cls = obj
+        if _INDEX_CLASS_NAMES.get(_index_class_name(cls)) is not cls:
+            raise pycdlibexception.PyCdlibInvalidInput("Cannot save an index of an ISO that has an object of type %s" % (cls.__name__))
+        return None
+
+
+class _IndexUnpickler(pickle.Unpickler):
+    '''
+    An internal class to unpickle the parsed metadata of an ISO from a
+    metadata index, attaching it to the file object the ISO was reopened
+    from.  Only the classes in _INDEX_CLASSES can be loaded, so an index
+    cannot make loading it call anything else.
+    '''
+    def __init__(self, fp, cdfp):
+        pickle.Unpickler.__init__(self, fp)
+        self.cdfp = cdfp
 
-        if bytes(bytearray([path[0]])) != b'/':
-            raise pycdlibexception.PyCdlibInvalidInput("Must be a path starting with /")
+    def find_class(self, module, name):
+        cls = _INDEX_CLASS_NAMES.get((module, name))
+        if cls is None:
+            raise pycdlibexception.PyCdlibInvalidInput("Invalid class %s.%s in the index" % (module, name))
+        return cls
 
-        # If the path is just the slash, we just want the root directory, so
-        # get the child there and quit.
-        if path == b'/':
-            return vd.root_directory_record()
+    def persistent_load(self, pid):  # pylint: disable=method-hidden
+        if pid != 'cdfp':
+            raise pycdlibexception.PyCdlibInvalidInput("Invalid reference %s in the index" % (pid))
+        return self.cdfp
 
-        # Split the path along the slashes
-        splitpath = path.split(b'/')[1:]
 
-        currpath = splitpath.pop(0).decode('utf-8').encode(encoding)
+class _PathIndex(object):
+    '''
+    An internal class to hold the full path to directory record index for a
+    single namespace (ISO9660, Rock Ridge, or Joliet), along with the hit and
+    miss counters for it.
+    '''
+    __slots__ = ['records', 'hits', 'misses']
 
-        entry = vd.root_directory_record()
+    def __init__(self):
+        self.records = {}
+        self.hits = 0
+        self.misses = 0
 
-        while True:
-            child = None
+    def info(self):
+        '''
+        A method to get the statistics for this index.
 
-            thelist = getattr(entry, child_list)
+        Parameters:
+         None.
+        Returns:
+         A PathIndexInfo namedtuple with the hits, misses, and current size.
+        '''
+        return PathIndexInfo(self.hits, self.misses, len(self.records))
+
+
+class _Batch(object):
+    '''
+    A class to be a contextmanager for batching modifications to a PyCdlib
+    object.
+    '''
+    __slots__ = ['iso']
+
+    def __init__(self, iso):
+        self.iso = iso
+
+    def __enter__(self):
+        self.iso.begin_batch()
+        return self.iso
+
+    def __exit__(self, *args):
+        self.iso.commit_batch()
+
+
+class _Progress(object):
+    '''
+    A class to keep track of, and report, the progress of writing out an ISO.
+    '''
+    __slots__ = ['done', 'total', 'progress_cb', 'progress_opaque']
+
+    def __init__(self, total, progress_cb, progress_opaque):
+        self.done = 0
+        self.total = total
+        self.progress_cb = progress_cb
+        self.progress_opaque = progress_opaque
+
+    def call(self, length):
+        '''
+        Add the length to done, then call progress_cb if it is not None.
+
+        Parameters:
+         length - The number of bytes that were just written.
+        Returns:
+         Nothing.
+        '''
+        self.done += length
+        if self.done > self.total:
+            self.done = self.total
+        if self.progress_cb is not None:
+            if len(inspect.getargspec(self.progress_cb).args) == 2:  # pylint: disable=W1505
+                self.progress_cb(self.done, self.total)
+            else:
+                self.progress_cb(self.done, self.total, self.progress_opaque)
+
+    def finish(self):
+        '''
+        If the progress_cb is not None, call progress_cb with the final total.
+
+        Parameters:
+         None.
+        Returns:
+         Nothing.
+        '''
+        # In almost all cases, this will cause self.done to wildly overflow
+        # the total size.  However, with the hard cap in call, this works
+        # just fine.
+        self.call(self.total)
+
+
+class _BoundedWriter(object):
+    '''
+    A class to write data out to given offsets of an output file object,
+    making sure that nothing is written past the end of the ISO.  The
+    position of the file object is tracked here, so that writes that follow
+    on from the previous one do not need a seek, and so that the bounds can
+    be checked without asking the file object where it is.
+    '''
+    __slots__ = ['outfp', 'end', 'pos', 'copy_policy']
+
+    def __init__(self, outfp, end, copy_policy=None):
+        self.outfp = outfp
+        self.end = end
+        self.pos = None
+        self.copy_policy = copy_policy
+
+    def _check(self, offset, length):
+        '''
+        An internal method to make sure that length bytes at offset are
+        within the ISO, and to move the file object to offset.
+
+        Parameters:
+         offset - The offset the data will be written at.
+         length - The length of the data.
+        Returns:
+         Nothing.
+        '''
+        if offset + length > self.end:
+            raise pycdlibexception.PyCdlibInternalError("Wrote past the end of the ISO! (%d > %d)" % (offset + length, self.end))
+        if offset != self.pos:
+            self.outfp.seek(offset)
+
+    def write_at(self, offset, data):
+        '''
+        A method to write data out at the given offset.
+
+        Parameters:
+         offset - The offset to write the data at.
+         data - The data to write.
+        Returns:
+         Nothing.
+        '''
+        self._check(offset, len(data))
+        self.outfp.write(data)
+        self.pos = offset + len(data)
+
+    def copy_at(self, offset, data_len, blocksize, data_fp):
+        '''
+        A method to copy data from a file object out at the given offset.
+
+        Parameters:
+         offset - The offset to write the data at.
+         data_len - The length of the data to copy.
+         blocksize - The blocksize to use when copying the data.
+         data_fp - The file object to copy the data from.
+        Returns:
+         Nothing.
+        '''
+        # copy_data may write to the file descriptor underneath the file
+        # object, so always seek here to flush anything that is buffered.
+        self.pos = None
+        self._check(offset, data_len)
+        utils.copy_data(data_len, blocksize, data_fp, self.outfp,
+                        self.copy_policy)
+        # A source that is shorter than it claims leaves the file object
+        # short of offset + data_len, so don't trust the position after this.
+        self.pos = None
+
+
+class _SparseWriter(_BoundedWriter):
+    '''
+    A _BoundedWriter for regular files that skips over blocks of zeros
+    instead of writing them, so that they end up as holes in the file.  The
+    file must be empty to start with, and must be truncated up to the size
+    of the ISO once everything has been written.
+    '''
+    __slots__ = ['granularity', 'sparse_data']
+
+    def __init__(self, outfp, end, granularity, sparse_data, copy_policy=None):
+        _BoundedWriter.__init__(self, outfp, end, copy_policy)
+        self.granularity = granularity
+        self.sparse_data = sparse_data
+
+    def write_at(self, offset, data):
+        '''
+        A method to write the blocks of data that are not all zero out at
+        the given offset.
+
+        Parameters:
+         offset - The offset to write the data at.
+         data - The data to write.
+        Returns:
+         Nothing.
+        '''
+        if offset + len(data) > self.end:
+            raise pycdlibexception.PyCdlibInternalError("Wrote past the end of the ISO! (%d > %d)" % (offset + len(data), self.end))
+        for start, end in _nonzero_runs(data, self.granularity):
+            _BoundedWriter.write_at(self, offset + start, data[start:end])
+
+    def copy_at(self, offset, data_len, blocksize, data_fp):
+        '''
+        A method to copy data from a file object out at the given offset.
+        If sparse_data is set, the data is read in and only the blocks that
+        are not all zero are written out; otherwise it is copied as is.
+
+        Parameters:
+         offset - The offset to write the data at.
+         data_len - The length of the data to copy.
+         blocksize - The blocksize to use when copying the data.
+         data_fp - The file object to copy the data from.
+        Returns:
+         Nothing.
+        '''
+        if not self.sparse_data:
+            _BoundedWriter.copy_at(self, offset, data_len, blocksize, data_fp)
+            return
+
+        if offset + data_len > self.end:
+            raise pycdlibexception.PyCdlibInternalError("Wrote past the end of the ISO! (%d > %d)" % (offset + data_len, self.end))
+        # Read whole blocks, so that the zero blocks line up with the blocks
+        # of the ISO.
+        readsize = max(blocksize - blocksize % self.granularity, self.granularity)
+        left = data_len
+        while left > 0:
+            data = data_fp.read(min(left, readsize))
+            # As in utils.copy_data, a file that is shorter than it claims
+            # to be just ends the copy early.
+            if not data:
+                break
+            self.write_at(offset, data)
+            offset += len(data)
+            left -= len(data)
+
+
+class _ImageMapWriter(object):
+    '''
+    A class with the same write interface as _BoundedWriter, but that
+    records the pieces of data and where they go instead of writing them
+    out.  This is used to build up the metadata of a _VirtualImage.
+    '''
+    __slots__ = ['end', 'pieces']
+
+    def __init__(self, end):
+        self.end = end
+        self.pieces = []
+
+    def write_at(self, offset, data):
+        '''
+        A method to record data to be placed at the given offset.
+
+        Parameters:
+         offset - The offset of the data in the image.
+         data - The data.
+        Returns:
+         Nothing.
+        '''
+        if offset + len(data) > self.end:
+            raise pycdlibexception.PyCdlibInternalError("Wrote past the end of the ISO! (%d > %d)" % (offset + len(data), self.end))
+        self.pieces.append((offset, bytes(data)))
+
+
+class _SegmentedReader(io.RawIOBase):
+    '''
+    A base class for the read-only, seekable file objects that are made up
+    of segments of data read from their sources on demand.  Subclasses fill
+    in the segments and the size, and implement readinto().
+    '''
+    __slots__ = ['_segments', '_starts', '_patches', '_size', '_logical_block_size', '_pos']
+
+    def __init__(self, logical_block_size):
+        super(_SegmentedReader, self).__init__()
+        self._segments = []
+        self._starts = []
+        self._patches = []
+        self._size = 0
+        self._logical_block_size = logical_block_size
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+
+        return self._pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+
+        if whence == os.SEEK_SET:
+            pos = offset
+        elif whence == os.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == os.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError("invalid whence (%r, should be 0, 1 or 2)" % (whence))
+        if pos < 0:
+            raise ValueError("negative seek position %r" % (pos))
+        self._pos = pos
+        return self._pos
+
+
+class _VirtualImage(_SegmentedReader):
+    '''
+    A class that represents a read-only, seekable view of the image that
+    writing out a PyCdlib object would produce.  The metadata is generated
+    up front, while the file data is read from the source file objects on
+    demand, so the full image is never built.
+    '''
+    __slots__ = []
+
+    def __init__(self, pieces, data_records, size, logical_block_size):
+        super(_VirtualImage, self).__init__(logical_block_size)
+        # Each segment is (start, end, source), where the source is either
+        # a bytes object of metadata, or the DirectoryRecord whose data
+        # belongs there.  Anything not covered by a segment reads as zeros.
+        segments = [(offset, offset + len(data), data) for (offset, data) in pieces]
+        self._patches = []
+        for rec in data_records:
+            start = rec.extent_location() * logical_block_size
+            segments.append((start, start + rec.data_length, rec))
+            if rec.boot_info_table is not None:
+                self._patches.append((start + 8, rec.boot_info_table.record()))
+        segments.sort(key=lambda segment: segment[0])
+        self._segments = segments
+        self._starts = [segment[0] for segment in segments]
+        self._size = size
+
+    def _read_record(self, rec, offset, length):
+        '''
+        An internal method to read part of the data of a directory record.
+
+        Parameters:
+         rec - The DirectoryRecord to read the data of.
+         offset - The offset within the data to start reading at.
+         length - The number of bytes to read.
+        Returns:
+         The data that was read; this may be short if the source is.
+        '''
+        with dr.DROpenData(rec, self._logical_block_size) as (data_fp, data_len_unused):
+            data_fp.seek(offset, os.SEEK_CUR)
+            return data_fp.read(length)
+
+    def regions(self):
+        '''
+        A generator that describes the whole image, from start to end, as a
+        series of regions that do not overlap.
+
+        Parameters:
+         None.
+        Yields:
+         Tuples of (offset, length, source), where source is None for a
+         region of zeros, a bytes object for metadata, or a tuple of
+         (DirectoryRecord, offset within its data) for file data.
+        '''
+        pos = 0
+        for (start, stop, source) in self._segments + [(self._size, self._size, None)]:
+            if pos < start:
+                yield (pos, start - pos, None)
+                pos = start
+            if stop <= pos:
+                # Entirely covered by an earlier segment, as can happen with
+                # records that share data.
+                continue
+            if isinstance(source, bytes):
+                yield (pos, stop - pos, source[pos - start:])
+                pos = stop
+                continue
+            # Boot info tables are patched over the data of their file, so
+            # split the file data around them.
+            for (patch_start, patch) in self._patches:
+                patch_stop = patch_start + len(patch)
+                if patch_stop <= pos or patch_start >= stop:
+                    continue
+                if pos < patch_start:
+                    yield (pos, patch_start - pos, (source, pos - start))
+                    pos = patch_start
+                patch_stop = min(patch_stop, stop)
+                yield (pos, patch_stop - pos, patch[pos - patch_start:patch_stop - patch_start])
+                pos = patch_stop
+            if pos < stop:
+                yield (pos, stop - pos, (source, pos - start))
+                pos = stop
+
+    def chunks(self, blocksize):
+        '''
+        A generator that produces the whole image, from start to end, as a
+        series of chunks of data.  The data for each file is read from its
+        source in one sequential pass.
+
+        Parameters:
+         blocksize - The largest chunk of file data or zeros to produce.
+        Yields:
+         The chunks of the image, in order.
+        '''
+        zeros = bytes(bytearray(blocksize))
+        for (offset_unused, length, source) in self.regions():
+            if source is None:
+                while length > 0:
+                    yield zeros[:min(blocksize, length)]
+                    length -= blocksize
+            elif isinstance(source, bytes):
+                yield source
+            else:
+                (rec, data_offset) = source
+                with dr.DROpenData(rec, self._logical_block_size) as (data_fp, data_len_unused):
+                    data_fp.seek(data_offset, os.SEEK_CUR)
+                    while length > 0:
+                        data = data_fp.read(min(blocksize, length))
+                        if not data:
+                            # As in copy_data, a source that is shorter than
+                            # it claims to be reads as zeros for the rest.
+                            data = zeros[:min(blocksize, length)]
+                        yield data
+                        length -= len(data)
+
+    def readinto(self, b):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+
+        pos = self._pos
+        length = min(len(b), self._size - pos)
+        if length <= 0:
+            return 0
+        end = pos + length
+
+        out = memoryview(b)
+        out[:length] = bytearray(length)
+
+        index = max(bisect.bisect_right(self._starts, pos) - 1, 0)
+        while index < len(self._segments):
+            (start, stop, source) = self._segments[index]
+            if start >= end:
+                break
+            index += 1
+            lo = max(start, pos)
+            hi = min(stop, end)
+            if lo >= hi:
+                continue
+            if isinstance(source, bytes):
+                data = source[lo - start:hi - start]
+            else:
+                data = self._read_record(source, lo - start, hi - lo)
+            out[lo - pos:lo - pos + len(data)] = data
+
+        for (start, data) in self._patches:
+            lo = max(start, pos)
+            hi = min(start + len(data), end)
+            if lo < hi:
+                out[lo - pos:hi - pos] = data[lo - start:hi - start]
+
+        self._pos = end
+        return length
+
+
+class _ISOFile(_SegmentedReader):
+    '''
+    A class that represents a read-only, seekable view of the data of a
+    single file on an ISO.  The data is read from its source on demand, across
+    all of the extents of the file and with any boot info table patched in,
+    without moving the position of the file object it comes from.
+    '''
+    __slots__ = []
+
+    def __init__(self, rec, logical_block_size):
+        super(_ISOFile, self).__init__(logical_block_size)
+        # Each segment is (start, end, rec), one for each extent of the file,
+        # at the offsets they have in the file data.
+        size = 0
+        while rec is not None:
+            # As in DROpenData, the data of a hard link is that of its target.
+            data_rec = rec
+            while data_rec.target is not None:
+                data_rec = data_rec.target
+            data_len = data_rec.data_length
+            self._segments.append((size, size + data_len, rec))
+            if rec.boot_info_table is not None and data_len > 8:
+                # As in get_file_from_iso_fp, the boot info table overlays
+                # the data at offset 8, but never extends past the end of it.
+                table = rec.boot_info_table.record()[:data_len - 8]
+                self._patches.append((size + 8, table))
+            size += data_len
+            rec = rec.data_continuation
+        self._starts = [segment[0] for segment in self._segments]
+        self._size = size
+
+    def readinto(self, b):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+
+        pos = self._pos
+        length = min(len(b), self._size - pos)
+        if length <= 0:
+            return 0
+        end = pos + length
+
+        out = memoryview(b)
+        index = max(bisect.bisect_right(self._starts, pos) - 1, 0)
+        while index < len(self._segments):
+            (start, stop, rec) = self._segments[index]
+            if start >= end:
+                break
+            index += 1
+            lo = max(start, pos)
+            hi = min(stop, end)
+            if lo >= hi:
+                continue
+            with dr.DROpenData(rec, self._logical_block_size) as (data_fp, data_len_unused):
+                data_fp.seek(lo - start, os.SEEK_CUR)
+                data = data_fp.read(hi - lo)
+            out[lo - pos:lo - pos + len(data)] = data
+            if len(data) < hi - lo:
+                # As with the image, a source that is shorter than it claims
+                # to be reads as zeros for the rest.
+                out[lo - pos + len(data):hi - pos] = bytearray(hi - lo - len(data))
+
+        for (start, data) in self._patches:
+            lo = max(start, pos)
+            hi = min(start + len(data), end)
+            if lo < hi:
+                out[lo - pos:hi - pos] = data[lo - start:hi - start]
+
+        self._pos = end
+        return length
+
+
+class PyCdlib(object):
+    '''
+    The main class for manipulating ISOs.
+
+    Once an ISO is opened (or created) and consistent, the methods that only
+    read from it (get_file_from_iso, get_file_from_iso_fp, get_and_write,
+    get_and_write_fp, extract_tree, list_children, list_dir, get_entry,
+    get_record, get_record_by_extent, full_path_from_dirrecord, layout,
+    open_image, and open_file_from_iso) may be called from several threads at once.  File data
+    is read with positional reads that never move the position of the file
+    object the ISO was opened from, and directories that were deferred by a
+    lazy open are parsed under a lock.  Methods that modify the ISO, as well
+    as write, write_fp, and close, must not run at the same time as any other
+    method; after modifying the ISO, call force_consistency before sharing
+    the object between threads again.
+    '''
+
+    __slots__ = ['_initialized', 'cdfp', 'pvds', 'svds', 'vdsts', 'brs', 'pvd', 'rock_ridge', '_always_consistent', 'eltorito_boot_catalog', 'isohybrid_mbr', 'xa', '_managing_fp', '_needs_reshuffle', '_rr_moved_record', '_rr_moved_name', '_rr_moved_rr_name', 'enhanced_vd', 'joliet_vd', 'version_vd', 'interchange_level', '_deferred_dirs', '_deferred_walks', '_cdmap', '_cdview', '_iso_index', '_rr_index', '_joliet_index', '_index_keys', '_batch_depth', '_batch_dirty', '_batch_always_consistent', '_preserve_extents', '_layout_end', '_parse_lock', '_headers_only', '_skipped_joliet']
+
+    def _parse_volume_descriptors(self):
+        '''
+        An internal method to parse the volume descriptors on an ISO.
+
+        Parameters:
+         None.
+        Returns:
+         Nothing.
+        '''
+        # Ecma-119 says that the Volume Descriptor set is a sequence of volume
+        # descriptors recorded in consecutively numbered Logical Sectors
+        # starting with Logical Sector Number 16.  Since sectors are 2048 bytes
+        # in length, we start at sector 16 * 2048
+
+        # Ecma-119, 6.2.1 says that the Volume Space is divided into a System
+        # Area and a Data Area, where the System Area is in logical sectors 0
+        # to 15, and whose contents is not specified by the standard.
+        self.cdfp.seek(16 * 2048)
+        while True:
+            # All volume descriptors are exactly 2048 bytes long
+            curr_extent = self.cdfp.tell() // 2048
+            vd = self.cdfp.read(2048)
+            if len(vd) != 2048:
+                raise pycdlibexception.PyCdlibInvalidISO("Failed to read entire volume descriptor")
+            (desc_type, ident) = struct.unpack_from("=B5s", vd, 0)
+            if desc_type not in [headervd.VOLUME_DESCRIPTOR_TYPE_PRIMARY,
+                                 headervd.VOLUME_DESCRIPTOR_TYPE_SET_TERMINATOR,
+                                 headervd.VOLUME_DESCRIPTOR_TYPE_BOOT_RECORD,
+                                 headervd.VOLUME_DESCRIPTOR_TYPE_SUPPLEMENTARY] or ident != b'CD001':
+                # We read the next extent, and it wasn't a descriptor.  Abort
+                # the loop, remembering to back up the input file descriptor.
+                self.cdfp.seek(-2048, 1)
+                break
+            if desc_type == headervd.VOLUME_DESCRIPTOR_TYPE_PRIMARY:
+                pvd = headervd.PrimaryVolumeDescriptor()
+                pvd.parse(vd, self.cdfp, curr_extent)
+                self.pvds.append(pvd)
+            elif desc_type == headervd.VOLUME_DESCRIPTOR_TYPE_SET_TERMINATOR:
+                vdst = headervd.VolumeDescriptorSetTerminator()
+                vdst.parse(vd, curr_extent)
+                self.vdsts.append(vdst)
+            elif desc_type == headervd.VOLUME_DESCRIPTOR_TYPE_BOOT_RECORD:
+                br = headervd.BootRecord()
+                br.parse(vd, curr_extent)
+                self.brs.append(br)
+            elif desc_type == headervd.VOLUME_DESCRIPTOR_TYPE_SUPPLEMENTARY:
+                svd = headervd.SupplementaryVolumeDescriptor()
+                svd.parse(vd, self.cdfp, curr_extent)
+                self.svds.append(svd)
+            # Since we checked for the valid descriptors above, it is impossible
+            # to see an invalid desc_type here, so no check necessary.
+
+        # The language in Ecma-119, p.8, Section 6.7.1 says:
+        #
+        # The sequence shall contain one Primary Volume Descriptor (see 8.4) recorded at least once.
+        #
+        # The important bit there is "at least one", which means that we have
+        # to accept ISOs with more than one PVD.
+        if len(self.pvds) < 1:
+            raise pycdlibexception.PyCdlibInvalidISO("Valid ISO9660 filesystems must have at least one PVD")
+
+        self.pvd = self.pvds[0]
+
+        # Make sure any other PVDs agree with the first one.
+        for pvd in self.pvds[1:]:
+            if pvd != self.pvd:
+                raise pycdlibexception.PyCdlibInvalidISO("Multiple occurrences of PVD did not agree!")
+
+            pvd.root_dir_record = self.pvd.root_dir_record
+
+        if len(self.vdsts) < 1:
+            raise pycdlibexception.PyCdlibInvalidISO("Valid ISO9660 filesystems must have at least one Volume Descriptor Set Terminator")
+
+    def _read_at(self, location, length):
+        '''
+        An internal method to read data from the input ISO at an absolute
+        byte location.  If the input ISO is memory mapped, this returns a
+        zero-copy memoryview slice of the map; otherwise the data is read from
+        the file object, without moving its position.
+
+        Parameters:
+         location - The byte location on the ISO to start reading at.
+         length - The number of bytes to read.
+        Returns:
+         The data that was read, which may be shorter than length if the ISO
+         ends first.
+        '''
+        if self._cdview is not None:
+            return self._cdview[location:location + length]
+
+        return utils.PositionalReader(self.cdfp, location).read(length)
+
+    def _find_record(self, path_index, **kwargs):
+        '''
+        An internal method to find an directory record on the ISO given an ISO,
+        Rock Ridge, or Joliet path.  If the entry is found, it returns the
+        directory record object corresponding to that entry.  If the entry
+        could not be found, a pycdlibexception.PyCdlibInvalidInput is raised.
+        The path and every directory along the way are remembered in the
+        passed-in path index, so later lookups of the same path are a single hash
+        lookup, and lookups of its siblings only need to search the last
+        component.
+
+        Parameters:
+         path_index - The _PathIndex for the namespace the path is in.
+         iso_path - Look the entry up as the regular ISO9660 path.
+         rr_path - Look the entry up as a Rock Ridge path.
+         joliet_path - Look the entry up as a Joliet path.
+        Returns:
+         The directory record entry representing the entry on the ISO.
+        '''
+        self._check_tree_available()
+
+        # A directory record of our own to compare against, so that lookups
+        # from several threads don't trample each other.
+        tmpdr = dr.DirectoryRecord()
+
+        def normal_lt(child, path):
+            '''
+            Internal method to see whether a directory record is less than the
+            path.
+
+            Parameters:
+             child - The directory record to check.
+             path - The path to check.
+            Returns:
+             -1 if the directory record is less than the path, 0 if they are
+             equal, and 1 if the directory record is greater than the path.
+            '''
+            tmpdr.file_ident = path
+            return child < tmpdr
+
+        def normal_eq(child, path):
+            '''
+            Internal method to see whether a directory record equals the path.
+
+            Parameters:
+             child - The directory record to check.
+             path - The path to check.
+            Returns:
+             True if the directory record name equals the path, False otherwise.
+            '''
+            return child.file_ident == path
+
+        def rr_lt(child, path):
+            '''
+            Internal method to see whether a Rock Ridge directory record
+            is less than the path.
+
+            Parameters:
+             child - The directory record to check.
+             path - The path to check.
+            Returns:
+             -1 if the directory record is less than the path, 0 if they
+             are equal, and 1 if the directory record is greater than the
+             path.
+            '''
+            return child.rock_ridge.name() < path
+
+        def rr_eq(child, path):
+            '''
+            Internal method to see whether a Rock Ridge directory record
+            equals the path.
+
+            Parameters:
+             child - The directory record to check.
+             path - The path to check.
+            Returns:
+             True if the directory record name equals the path, False otherwise.
+            '''
+            return child.rock_ridge.name() == path
+
+        path = None
+        num_paths = 0
+        encoding = 'ascii'
+        lt_func = normal_lt
+        eq_func = normal_eq
+        start_offset = 2
+        child_list = "children"
+        vd = self.pvd
+        for key in kwargs:
+            if key == "iso_path" and kwargs[key] is not None:
+                path = utils.normpath(kwargs[key])
+                num_paths += 1
+            elif key == "rr_path" and kwargs[key] is not None:
+                path = utils.normpath(kwargs[key])
+                lt_func = rr_lt
+                eq_func = rr_eq
+                start_offset = 0
+                child_list = "rr_children"
+                num_paths += 1
+            elif key == "joliet_path" and kwargs[key] is not None:
+                path = utils.normpath(kwargs[key])
+                encoding = 'utf-16_be'
+                vd = self.joliet_vd
+                num_paths += 1
+            else:
+                raise pycdlibexception.PyCdlibInvalidInput("Unknown keyword %s" % (key))
+
+        if num_paths != 1:
+            raise pycdlibexception.PyCdlibInvalidInput("Exactly one of iso_path, rr_path, or joliet_path must be passed")
+
+        if bytes(bytearray([path[0]])) != b'/':
+            raise pycdlibexception.PyCdlibInvalidInput("Must be a path starting with /")
+
+        # If the path is just the slash, we just want the root directory, so
+        # get the child there and quit.
+        if path == b'/':
+            return vd.root_directory_record()
+
+        child = path_index.records.get(path)
+        if child is not None:
+            path_index.hits += 1
+            return child
+        path_index.misses += 1
+
+        # Split the path along the slashes
+        splitpath = path.split(b'/')[1:]
+
+        # Start from the deepest directory along the path that is already in
+        # the index, falling back to the root.
+        entry = vd.root_directory_record()
+        currprefix = b''
+        for i in range(len(splitpath) - 1, 0, -1):
+            prefix = b'/' + b'/'.join(splitpath[:i])
+            parent = path_index.records.get(prefix)
+            if parent is not None:
+                if not parent.is_dir():
+                    raise pycdlibexception.PyCdlibInvalidInput("Could not find path %s" % (path))
+                entry = parent
+                currprefix = prefix
+                splitpath = splitpath[i:]
+                break
+
+        currname = splitpath.pop(0)
+        currpath = currname.decode('utf-8').encode(encoding)
+
+        while True:
+            child = None
+
+            self._parse_deferred_directory(entry)
+            thelist = getattr(entry, child_list)
             lo = start_offset
             hi = len(thelist)
             while lo < hi:
@@ -915,19 +1989,55 @@ class PyCdlib(object):
                 # need to follow it.
                 child = child.rock_ridge.cl_to_moved_dr
 
+            currprefix += b'/' + currname
+
             # We found the child, and it is the last one we are looking for;
             # return it.
             if not splitpath:
+                self._index_record(path_index, currprefix, child)
                 return child
             else:
                 if not child.is_dir():
                     break
+                self._index_record(path_index, currprefix, child)
                 entry = child
-                currpath = splitpath.pop(0).decode('utf-8').encode(encoding)
+                currname = splitpath.pop(0)
+                currpath = currname.decode('utf-8').encode(encoding)
 
         raise pycdlibexception.PyCdlibInvalidInput("Could not find path %s" % (path))
 
-    @lru_cache(maxsize=256)
+    def _index_record(self, index, path, rec):
+        '''
+        An internal method to remember the directory record for a full path in
+        one of the path indices.
+
+        Parameters:
+         index - The _PathIndex to add the path to.
+         path - The normalized full path of the record.
+         rec - The directory record that the path resolves to.
+        Returns:
+         Nothing.
+        '''
+        if path in index.records:
+            return
+        index.records[path] = rec
+        self._index_keys.setdefault(id(rec), []).append((index, path))
+
+    def _unindex_record(self, rec):
+        '''
+        An internal method to drop every path that resolves to a directory
+        record from the path indices.  This must be called whenever a record
+        is removed from the ISO.
+
+        Parameters:
+         rec - The directory record that is going away.
+        Returns:
+         Nothing.
+        '''
+        for index, path in self._index_keys.pop(id(rec), []):
+            if index.records.get(path) is rec:
+                del index.records[path]
+
     def _find_iso_record(self, iso_path):
         '''
         An internal method to find an directory record on the ISO given an ISO
@@ -940,9 +2050,8 @@ class PyCdlib(object):
         Returns:
          The directory record entry representing the entry on the ISO.
         '''
-        return self._find_record(iso_path=iso_path)
+        return self._find_record(self._iso_index, iso_path=iso_path)
 
-    @lru_cache(maxsize=256)
     def _find_rr_record(self, rr_path):
         '''
         An internal method to find an directory record on the ISO given a Rock
@@ -955,9 +2064,8 @@ class PyCdlib(object):
         Returns:
          The directory record entry representing the entry on the ISO.
         '''
-        return self._find_record(rr_path=rr_path)
+        return self._find_record(self._rr_index, rr_path=rr_path)
 
-    @lru_cache(maxsize=256)
     def _find_joliet_record(self, joliet_path):
         '''
         An internal method to find an directory record on the ISO given a Joliet
@@ -970,7 +2078,10 @@ class PyCdlib(object):
         Returns:
          The directory record entry representing the entry on the ISO.
         '''
-        return self._find_record(joliet_path=joliet_path)
+        self._check_tree_available()
+        self._parse_skipped_joliet()
+
+        return self._find_record(self._joliet_index, joliet_path=joliet_path)
 
     def _name_and_parent_from_path(self, **kwargs):
         '''
@@ -1018,193 +2129,571 @@ class PyCdlib(object):
 
         return (name.decode('utf-8').encode(encoding), parent)
 
-    def _walk_directories(self, vd, extent_to_ptr, extent_to_dr, path_table_records,
-                          check_interchange):
+    def _parse_directory(self, walk, dir_record):
+        '''
+        An internal method to read and parse the directory records contained
+        in a single directory extent.  For each record found, a new
+        dr.DirectoryRecord object is created and tracked as a child of the
+        passed in directory record.
+
+        Parameters:
+         walk - The _DirectoryWalk object holding the state of the walk.
+         dir_record - The directory record whose extent should be parsed.
+        Returns:
+         A list of the subdirectories of dir_record that need to be descended
+         into.
+        '''
+        vd = walk.vd
+        block_size = vd.logical_block_size()
+        subdirs = []
+
+        if walk.cache is not None:
+            read_at = walk.cache.read
+        else:
+            read_at = self._read_at
+
+        length = dir_record.file_length()
+        offset = 0
+        last_record = None
+        data = read_at(dir_record.extent_location() * block_size, length)
+        while offset < length:
+            if offset > (len(data) - 1):
+                # The data we read off of the ISO was shorter than what we
+                # expected.  The ISO is corrupt, throw an error.
+                raise pycdlibexception.PyCdlibInvalidISO("Invalid directory record")
+            (lenbyte,) = struct.unpack_from("=B", data, offset)
+            if lenbyte == 0:
+                # If we saw a zero length, this is probably the padding for
+                # the end of this extent.  Move the offset to the start of
+                # the next extent.
+                padsize = block_size - (offset % block_size)
+                if data[offset:offset + padsize] != b'\x00' * padsize:
+                    # For now we are pedantic, and if the padding bytes
+                    # are not all zero we throw an Exception.  Depending
+                    # one what we see in the wild, we may have to loosen
+                    # this check.
+                    raise pycdlibexception.PyCdlibInvalidISO("Invalid padding on ISO")
+
+                offset = offset + padsize
+                continue
+
+            new_record = dr.DirectoryRecord()
+            rr = new_record.parse(vd, data[offset:offset + lenbyte],
+                                  self.cdfp, dir_record)
+            offset += lenbyte
+
+            # The parse method of dr.DirectoryRecord returns None if this
+            # record doesn't have Rock Ridge extensions, or the version of
+            # the extension (as detected for this directory record).
+            # Since we don't allow mixed Rock Ridge versions on the ISO,
+            # we apply some checking.  If the current version is None, we
+            # can upgrade it to whatever version we just saw, but once we
+            # have seen a particular version, we only allow records of that
+            # version or None.
+            if self.rock_ridge is None:
+                self.rock_ridge = rr
+            elif self.rock_ridge == "1.09":
+                if rr is not None and rr != "1.09":
+                    raise pycdlibexception.PyCdlibInvalidISO("Inconsistent Rock Ridge versions on the ISO!")
+            elif self.rock_ridge == "1.12":
+                if rr is not None and rr != "1.12":
+                    raise pycdlibexception.PyCdlibInvalidISO("Inconsistent Rock Ridge versions on the ISO!")
+
+            is_symlink = new_record.rock_ridge is not None and new_record.rock_ridge.is_symlink()
+
+            # ISO generation programs sometimes use random extent locations
+            # for zero-length files.  Thus, it is not valid for us to link
+            # zero-length files to other files, as the linkage will be
+            # essentially random.  Make sure we ignore zero-length files
+            # (which includes symlinks) for linkage.  Similarly, we don't
+            # do the lastbyte calculation on zero-length files for the same
+            # reason.
+            if not new_record.is_dir() and new_record.data_length > 0 and not is_symlink:
+                new_end = new_record.extent_location() * block_size + new_record.file_length()
+                if new_end > walk.iso_file_length:
+                    # In this case, the end of the file is beyond the size
+                    # of the file.  Since this can't possibly work, truncate
+                    # the file size.
+                    new_record.data_length = walk.iso_file_length - new_record.extent_location() * block_size
+                else:
+                    # In this case, the new end is still within the file
+                    # size, but the PVD size is wrong.  Set the lastbyte
+                    # appropriately, which will eventually be used to fix
+                    # the PVD size.
+                    walk.lastbyte = max(walk.lastbyte, new_end)
+
+            if new_record.rock_ridge is not None and new_record.rock_ridge.dr_entries.ce_record is not None:
+                ce_record = new_record.rock_ridge.dr_entries.ce_record
+                con_block = read_at(ce_record.bl_cont_area * self.pvd.logical_block_size() + ce_record.offset_cont_area,
+                                    ce_record.len_cont_area)
+                new_record.rock_ridge.parse(con_block, False, new_record.rock_ridge.bytes_to_skip, True)
+                block = self.pvd.track_rr_ce_entry(ce_record.bl_cont_area,
+                                                   ce_record.offset_cont_area,
+                                                   ce_record.len_cont_area)
+                new_record.rock_ridge.update_ce_block(block)
+
+            walk.vd.track_dirrecord(new_record)
+
+            if walk.link_records:
+                self._link_parsed_record(walk, new_record)
+
+            rr_cl = new_record.rock_ridge is not None and new_record.rock_ridge.child_link_record_exists()
+
+            if rr_cl:
+                walk.child_links.append(new_record)
+
+            if new_record.is_dir():
+                if new_record.rock_ridge is not None and new_record.rock_ridge.relocated_record():
+                    self._rr_moved_record = new_record
+
+                if new_record.is_dotdot() and new_record.rock_ridge is not None and new_record.rock_ridge.parent_link_record_exists():
+                    # If this is the dotdot record, and it has a parent
+                    # link record, make sure to link up the parent link
+                    # directory record.
+                    walk.parent_links.append(new_record)
+                dots = new_record.is_dot() or new_record.is_dotdot()
+                if not dots and not rr_cl:
+                    subdirs.append(new_record)
+                    new_record.set_ptr(walk.extent_to_ptr[new_record.extent_location()])
+
+            try_long_entry = False
+            try:
+                dir_record.track_child(new_record, block_size)
+            except pycdlibexception.PyCdlibInvalidInput:
+                # dir_record.track_child() may throw a PyCdlibInvalidInput if
+                # it saw a duplicate child.  However, we allow duplicate
+                # children iff the last child is the same; this means that
+                # we have a very long entry.  If that is the case, try again
+                # with the allow_duplicates flag set to True.
+                if not new_record.is_dir() and last_record is not None and last_record.file_identifier() == new_record.file_identifier():
+                    try_long_entry = True
+                else:
+                    raise
+
+            if try_long_entry:
+                dir_record.track_child(new_record, block_size, True)
+
+            if walk.check_interchange:
+                walk.interchange_level = max(walk.interchange_level, _interchange_level_from_name(new_record.file_identifier(), new_record.is_dir()))
+
+            last_record = new_record
+
+        return subdirs
+
+    def _link_parsed_record(self, walk, rec):
+        '''
+        An internal method to link a freshly parsed directory record to any
+        other records that share its extent (hard links, or the Joliet copy of
+        an ISO9660 file), and to the El Torito Boot Catalog if necessary.
+
+        Parameters:
+         walk - The _DirectoryWalk object holding the state of the walk.
+         rec - The directory record to link.
+        Returns:
+         Nothing.
+        '''
+        vd = walk.vd
+        is_symlink = rec.rock_ridge is not None and rec.rock_ridge.is_symlink()
+        is_pvd = isinstance(vd, headervd.PrimaryVolumeDescriptor)
+
+        # See _parse_directory() for why zero-length files and symlinks are
+        # never linked.
+        if not rec.is_dir() and rec.data_length > 0 and not is_symlink:
+            if is_pvd and not rec.extent_location() in walk.extent_to_dr:
+                walk.extent_to_dr[rec.extent_location()] = rec
+            else:
+                try:
+                    walk.extent_to_dr[rec.extent_location()].linked_records.append((rec, vd))
+                except KeyError:
+                    # There may be files that are hidden in the regular
+                    # ISO, but not in Joliet.  For those, there will be
+                    # a key error when trying to link it to the Primary
+                    # record, so we just pass through here.
+                    pass
+
+        # See the discussion about about symlinks for why we don't try
+        # to assign dirrecords for eltorito with symlinks.
+        if is_pvd and self.eltorito_boot_catalog is not None and not is_symlink:
+            self.eltorito_boot_catalog.set_dirrecord_if_necessary(rec)
+
+    def _resolve_rr_links(self, walk):
+        '''
+        An internal method to resolve the Rock Ridge parent and child links
+        found during a directory walk into their directory records.  This can
+        only be done once all of the directories of the walk have been parsed.
+
+        Parameters:
+         walk - The _DirectoryWalk object holding the state of the walk.
+        Returns:
+         Nothing.
+        '''
+        for pl in walk.parent_links:
+            pl.rock_ridge.parent_link = walk.vd.find_dirrecord_by_extent(pl.rock_ridge.parent_link_extent())
+
+        for cl in walk.child_links:
+            cl.rock_ridge.cl_to_moved_dr = walk.vd.find_dirrecord_by_extent(cl.rock_ridge.child_link_extent())
+            cl.rock_ridge.cl_to_moved_dr.rock_ridge.moved_to_cl_dr = cl
+
+        walk.parent_links = []
+        walk.child_links = []
+
+    def _walk_directories(self, walk, path_table_records, lazy):
         '''
         An internal method to walk the directory records in a volume descriptor,
         starting with the root.  For each child in the directory record,
         we create a new dr.DirectoryRecord object and append it to the parent.
+        If lazy is True, only the root directory is parsed; the rest of the
+        directories are parsed on demand by _parse_deferred_directory().
 
         Parameters:
-         vd - The volume descriptor to walk.
-         extent_to_ptr - A dictionary mapping extents to PTRs.
-         extent_to_dr - A dictionary mapping extents to directory records.
+         walk - The _DirectoryWalk object holding the state of the walk.
          path_table_records - The list of path table records.
-         check_interchange - Whether to bother checking the interchange level.
+         lazy - Whether to defer parsing of the directories below the root.
         Returns:
-         The interchange level that this ISO conforms to.
+         Nothing.
         '''
-        old_loc = self.cdfp.tell()
-        self.cdfp.seek(0, os.SEEK_END)
-        iso_file_length = self.cdfp.tell()
-        self.cdfp.seek(old_loc)
-
-        root_dir_record = vd.root_directory_record()
+        root_dir_record = walk.vd.root_directory_record()
         root_dir_record.set_ptr(path_table_records[0])
-        interchange_level = 1
-        dirs = collections.deque([vd.root_directory_record()])
-        block_size = vd.logical_block_size()
-        parent_links = []
-        child_links = []
-        lastbyte = 0
+        walk.vd.track_dirrecord(root_dir_record)
+
+        if lazy:
+            for subdir in self._parse_directory(walk, root_dir_record):
+                self._deferred_dirs[id(subdir)] = (subdir, walk)
+            return
+
+        self._start_block_cache(walk)
+        dirs = collections.deque([root_dir_record])
         while dirs:
-            dir_record = dirs.popleft()
-
-            self._seek_to_extent(dir_record.extent_location())
-            length = dir_record.file_length()
-            offset = 0
-            last_record = None
-            data = self.cdfp.read(length)
-            while offset < length:
-                if offset > (len(data) - 1):
-                    # The data we read off of the ISO was shorter than what we
-                    # expected.  The ISO is corrupt, throw an error.
-                    raise pycdlibexception.PyCdlibInvalidISO("Invalid directory record")
-                lenraw = bytes(bytearray([data[offset]]))
-                (lenbyte,) = struct.unpack_from("=B", lenraw, 0)
-                if lenbyte == 0:
-                    # If we saw a zero length, this is probably the padding for
-                    # the end of this extent.  Move the offset to the start of
-                    # the next extent.
-                    padsize = block_size - (offset % block_size)
-                    if data[offset:offset + padsize] != b'\x00' * padsize:
-                        # For now we are pedantic, and if the padding bytes
-                        # are not all zero we throw an Exception.  Depending
-                        # one what we see in the wild, we may have to loosen
-                        # this check.
-                        raise pycdlibexception.PyCdlibInvalidISO("Invalid padding on ISO")
-
-                    offset = offset + padsize
-                    continue
+            dirs.extend(self._parse_directory(walk, dirs.popleft()))
+        walk.cache = None
 
-                new_record = dr.DirectoryRecord()
-                rr = new_record.parse(vd, data[offset:offset + lenbyte],
-                                      self.cdfp, dir_record)
-                offset += lenbyte
-
-                # The parse method of dr.DirectoryRecord returns None if this
-                # record doesn't have Rock Ridge extensions, or the version of
-                # the extension (as detected for this directory record).
-                # Since we don't allow mixed Rock Ridge versions on the ISO,
-                # we apply some checking.  If the current version is None, we
-                # can upgrade it to whatever version we just saw, but once we
-                # have seen a particular version, we only allow records of that
-                # version or None.
-                if self.rock_ridge is None:
-                    self.rock_ridge = rr
-                elif self.rock_ridge == "1.09":
-                    if rr is not None and rr != "1.09":
-                        raise pycdlibexception.PyCdlibInvalidISO("Inconsistent Rock Ridge versions on the ISO!")
-                elif self.rock_ridge == "1.12":
-                    if rr is not None and rr != "1.12":
-                        raise pycdlibexception.PyCdlibInvalidISO("Inconsistent Rock Ridge versions on the ISO!")
-
-                is_symlink = new_record.rock_ridge is not None and new_record.rock_ridge.is_symlink()
-
-                is_pvd = isinstance(vd, headervd.PrimaryVolumeDescriptor)
-
-                # ISO generation programs sometimes use random extent locations
-                # for zero-length files.  Thus, it is not valid for us to link
-                # zero-length files to other files, as the linkage will be
-                # essentially random.  Make sure we ignore zero-length files
-                # (which includes symlinks) for linkage.  Similarly, we don't
-                # do the lastbyte calculation on zero-length files for the same
-                # reason.
-                if not new_record.is_dir() and new_record.data_length > 0 and not is_symlink:
-                    new_end = new_record.extent_location() * vd.logical_block_size() + new_record.file_length()
-                    if new_end > iso_file_length:
-                        # In this case, the end of the file is beyond the size
-                        # of the file.  Since this can't possibly work, truncate
-                        # the file size.
-                        new_record.data_length = iso_file_length - new_record.extent_location() * vd.logical_block_size()
-                    else:
-                        # In this case, the new end is still within the file
-                        # size, but the PVD size is wrong.  Set the lastbyte
-                        # appropriately, which will eventually be used to fix
-                        # the PVD size.
-                        lastbyte = max(lastbyte, new_end)
-
-                    if is_pvd and not new_record.extent_location() in extent_to_dr:
-                        extent_to_dr[new_record.extent_location()] = new_record
-                    else:
-                        try:
-                            extent_to_dr[new_record.extent_location()].linked_records.append((new_record, vd))
-                        except KeyError:
-                            # There may be files that are hidden in the regular
-                            # ISO, but not in Joliet.  For those, there will be
-                            # a key error when trying to link it to the Primary
-                            # record, so we just pass through here.
-                            pass
-
-                if new_record.rock_ridge is not None and new_record.rock_ridge.dr_entries.ce_record is not None:
-                    ce_record = new_record.rock_ridge.dr_entries.ce_record
-                    orig_pos = self.cdfp.tell()
-                    self._seek_to_extent(ce_record.bl_cont_area)
-                    self.cdfp.seek(ce_record.offset_cont_area, os.SEEK_CUR)
-                    con_block = self.cdfp.read(ce_record.len_cont_area)
-                    new_record.rock_ridge.parse(con_block, False, new_record.rock_ridge.bytes_to_skip, True)
-                    self.cdfp.seek(orig_pos)
-                    block = self.pvd.track_rr_ce_entry(ce_record.bl_cont_area,
-                                                       ce_record.offset_cont_area,
-                                                       ce_record.len_cont_area)
-                    new_record.rock_ridge.update_ce_block(block)
-
-                has_eltorito = self.eltorito_boot_catalog is not None
-
-                # See the discussion about about symlinks for why we don't try
-                # to assign dirrecords for eltorito with symlinks.
-                if is_pvd and has_eltorito and not is_symlink:
-                    self.eltorito_boot_catalog.set_dirrecord_if_necessary(new_record)
-
-                rr_cl = new_record.rock_ridge is not None and new_record.rock_ridge.child_link_record_exists()
-
-                if rr_cl:
-                    child_links.append(new_record)
-
-                if new_record.is_dir():
-                    if new_record.rock_ridge is not None and new_record.rock_ridge.relocated_record():
-                        self._rr_moved_record = new_record
-
-                    if new_record.is_dotdot() and new_record.rock_ridge is not None and new_record.rock_ridge.parent_link_record_exists():
-                        # If this is the dotdot record, and it has a parent
-                        # link record, make sure to link up the parent link
-                        # directory record.
-                        parent_links.append(new_record)
-                    dots = new_record.is_dot() or new_record.is_dotdot()
-                    if not dots and not rr_cl:
-                        dirs.append(new_record)
-                        new_record.set_ptr(extent_to_ptr[new_record.extent_location()])
-
-                try_long_entry = False
-                try:
-                    dir_record.track_child(new_record, vd.logical_block_size())
-                except pycdlibexception.PyCdlibInvalidInput:
-                    # dir_record.track_child() may throw a PyCdlibInvalidInput if
-                    # it saw a duplicate child.  However, we allow duplicate
-                    # children iff the last child is the same; this means that
-                    # we have a very long entry.  If that is the case, try again
-                    # with the allow_duplicates flag set to True.
-                    if not new_record.is_dir() and last_record is not None and last_record.file_identifier() == new_record.file_identifier():
-                        try_long_entry = True
-                    else:
-                        raise
+        self._resolve_rr_links(walk)
+
+    def _start_block_cache(self, walk):
+        '''
+        An internal method to set up the block cache for a walk that is about
+        to parse all of its directories, prefetching the directory extents
+        listed in the path table.  Memory mapped ISOs don't need the cache, as
+        reading from them never seeks.
+
+        Parameters:
+         walk - The _DirectoryWalk object to set up the cache for.
+        Returns:
+         Nothing.
+        '''
+        if self._cdview is not None:
+            return
+
+        walk.cache = _BlockCache(self._read_at, walk.vd.logical_block_size())
+        walk.cache.prefetch(walk.extent_to_ptr)
 
-                if try_long_entry:
-                    dir_record.track_child(new_record, vd.logical_block_size(), True)
+    def _parse_deferred_directory(self, dir_record):
+        '''
+        An internal method to parse the extent of a directory whose parsing
+        was deferred when the ISO was opened lazily.  If the directory has
+        already been parsed (or the ISO was not opened lazily), this is a
+        no-op.
 
-                if check_interchange:
-                    interchange_level = max(interchange_level, _interchange_level_from_name(new_record.file_identifier(), new_record.is_dir()))
+        Parameters:
+         dir_record - The directory record to ensure is parsed.
+        Returns:
+         Nothing.
+        '''
+        self._check_tree_available()
 
-                last_record = new_record
+        if id(dir_record) not in self._deferred_dirs:
+            return
 
-        for pl in parent_links:
-            pl.rock_ridge.parent_link = _find_record_by_extent(vd, pl.rock_ridge.parent_link_extent())
+        # The directory is only dropped from the deferred ones once it is
+        # completely parsed, so other threads either wait for the lock here
+        # or see the finished directory.
+        with self._parse_lock:
+            walk = self._parse_one_deferred_directory(dir_record)
+            if walk is not None:
+                self._resolve_deferred_rr_links(walk)
 
-        for cl in child_links:
-            cl.rock_ridge.cl_to_moved_dr = _find_record_by_extent(vd, cl.rock_ridge.child_link_extent())
-            cl.rock_ridge.cl_to_moved_dr.rock_ridge.moved_to_cl_dr = cl
+    def _parse_one_deferred_directory(self, dir_record):
+        '''
+        An internal method to parse a single deferred directory, and defer
+        the parsing of its subdirectories in turn.  The parse lock must be
+        held.
+
+        Parameters:
+         dir_record - The directory record to parse.
+        Returns:
+         The _DirectoryWalk the directory belongs to, or None if the
+         directory was already parsed.
+        '''
+        entry = self._deferred_dirs.get(id(dir_record))
+        if entry is None:
+            return None
+
+        walk = entry[1]
+        for subdir in self._parse_directory(walk, dir_record):
+            self._deferred_dirs[id(subdir)] = (subdir, walk)
+        del self._deferred_dirs[id(dir_record)]
+        return walk
+
+    def _find_deferred_dir_by_extent(self, walk, extent):
+        '''
+        An internal method to find the directory record of the directory at
+        an extent while the ISO is being parsed lazily.  If the directory has
+        not been seen yet, the directories above it are found in the path
+        table and parsed, starting from the nearest one that has been seen.
+        The parse lock must be held.
+
+        Parameters:
+         walk - The _DirectoryWalk the directory belongs to.
+         extent - The extent of the directory.
+        Returns:
+         The directory record, or None if it could not be found this way.
+        '''
+        missing = []
+        while True:
+            try:
+                rec = walk.vd.find_dirrecord_by_extent(extent)
+                break
+            except pycdlibexception.PyCdlibInvalidInput:
+                pass
+            ptr = walk.extent_to_ptr.get(extent)
+            if ptr is None or not 1 <= ptr.parent_directory_num <= len(walk.ptrs) or len(missing) > len(walk.ptrs):
+                return None
+            missing.append(extent)
+            extent = walk.ptrs[ptr.parent_directory_num - 1].extent_location
+
+        for extent in reversed(missing):
+            self._parse_one_deferred_directory(rec)
+            try:
+                rec = walk.vd.find_dirrecord_by_extent(extent)
+            except pycdlibexception.PyCdlibInvalidInput:
+                return None
+        return rec
+
+    def _resolve_deferred_rr_links(self, walk):
+        '''
+        An internal method to resolve the Rock Ridge parent and child links
+        found so far while parsing an ISO lazily.  Only the directories on
+        the way to the link targets are parsed; if a target can't be found
+        that way, the rest of the tree is parsed and the links are resolved
+        as usual.  The parse lock must be held.
+
+        Parameters:
+         walk - The _DirectoryWalk the links were found in.
+        Returns:
+         Nothing.
+        '''
+        # Finding a target may parse more directories, which may find more
+        # links in turn.
+        while walk.parent_links or walk.child_links:
+            if walk.parent_links:
+                pl = walk.parent_links.pop()
+                target = self._find_deferred_dir_by_extent(walk, pl.rock_ridge.parent_link_extent())
+                if target is None:
+                    walk.parent_links.append(pl)
+                    break
+                pl.rock_ridge.parent_link = target
+            else:
+                cl = walk.child_links.pop()
+                target = self._find_deferred_dir_by_extent(walk, cl.rock_ridge.child_link_extent())
+                if target is None:
+                    walk.child_links.append(cl)
+                    break
+                cl.rock_ridge.cl_to_moved_dr = target
+                target.rock_ridge.moved_to_cl_dr = cl
+
+        if walk.parent_links or walk.child_links:
+            self._parse_all_deferred_directories()
+
+    def _parse_all_deferred_directories(self):
+        '''
+        An internal method to finish parsing an ISO that was opened lazily.
+        All directories that have not yet been parsed are parsed, and then the
+        linking that requires the whole tree (hard links, Rock Ridge
+        relocation, El Torito) is done.  This must be called before any
+        operation that modifies the ISO.
+
+        Parameters:
+         None.
+        Returns:
+         Nothing.
+        '''
+        self._check_tree_available()
+
+        self._parse_skipped_joliet()
+
+        if not self._deferred_walks:
+            return
+
+        with self._parse_lock:
+            walks = self._deferred_walks
+            if not walks:
+                return
+
+            for walk in walks:
+                self._start_block_cache(walk)
+                dirs = collections.deque([walk.vd.root_directory_record()])
+                while dirs:
+                    dir_record = dirs.popleft()
+                    if id(dir_record) in self._deferred_dirs:
+                        for subdir in self._parse_directory(walk, dir_record):
+                            self._deferred_dirs[id(subdir)] = (subdir, walk)
+                        del self._deferred_dirs[id(dir_record)]
+                    for child in dir_record.children:
+                        self._link_parsed_record(walk, child)
+                        if child.is_dir() and not child.is_dot() and not child.is_dotdot():
+                            if child.rock_ridge is None or not child.rock_ridge.child_link_record_exists():
+                                dirs.append(child)
+                walk.cache = None
+
+                self._resolve_rr_links(walk)
+
+            self._deferred_dirs = {}
+
+            self._finish_walks(walks[0])
+
+            self._deferred_walks = []
 
-        return interchange_level, lastbyte
+    def _start_joliet_walk(self, extent_to_dr, iso_file_length, link_records):
+        '''
+        An internal method to parse the path tables of the Joliet Supplementary
+        Volume Descriptor and set up the walk of its directories.
+
+        Parameters:
+         extent_to_dr - The map of extents to the ISO9660 directory records.
+         iso_file_length - The length of the ISO file.
+         link_records - Whether to link records to each other as they are parsed.
+        Returns:
+         A tuple containing the _DirectoryWalk object for the Joliet walk and
+         the list of little-endian path table records.
+        '''
+        svd = self.joliet_vd
+
+        le_ptrs, joliet_extent_to_ptr = self._parse_path_table(svd.path_table_size(),
+                                                               svd.path_table_location_le)
+
+        tmp_be_ptrs, j_unused = self._parse_path_table(svd.path_table_size(),
+                                                       svd.path_table_location_be)
+
+        for index, ptr in enumerate(le_ptrs):
+            if not ptr.equal_to_be(tmp_be_ptrs[index]):
+                raise pycdlibexception.PyCdlibInvalidISO("Joliet Little-endian and big-endian path table records do not agree")
+
+        walk = _DirectoryWalk(svd, le_ptrs, joliet_extent_to_ptr, extent_to_dr,
+                              False, iso_file_length, link_records)
+
+        return walk, le_ptrs
+
+    def _parse_skipped_joliet(self):
+        '''
+        An internal method to walk the Joliet directory tree of an ISO that was
+        opened without the Joliet namespace.  If the ISO was opened lazily and
+        is not yet completely parsed, the Joliet tree is parsed lazily as well;
+        otherwise it is parsed completely.  If the Joliet tree was already
+        walked, this is a no-op.
+
+        Parameters:
+         None.
+        Returns:
+         Nothing.
+        '''
+        if self._skipped_joliet is None:
+            return
+
+        with self._parse_lock:
+            if self._skipped_joliet is None:
+                return
+
+            extent_to_dr, iso_file_length = self._skipped_joliet
+
+            # If the ISO9660 tree is still partially deferred, the Joliet
+            # records can't be linked to it yet; _parse_all_deferred_directories()
+            # will do that along with the rest.
+            lazy = bool(self._deferred_walks)
+            walk, le_ptrs = self._start_joliet_walk(extent_to_dr,
+                                                    iso_file_length, not lazy)
+            self._walk_directories(walk, le_ptrs, lazy)
+            if lazy:
+                self._deferred_walks.append(walk)
+
+            self._skipped_joliet = None
+
+    def _finish_walks(self, pvd_walk):
+        '''
+        An internal method to do the work that has to happen after all of the
+        directories on the ISO have been walked.
+
+        Parameters:
+         pvd_walk - The _DirectoryWalk object for the Primary Volume Descriptor.
+        Returns:
+         Nothing.
+        '''
+        self.interchange_level = max(self.interchange_level, pvd_walk.interchange_level)
+
+        # On El Torito ISOs, after we have walked the directories we look
+        # to see if all of the entries in El Torito have corresponding
+        # directory records.  If they don't, then it may be the case that
+        # the El Torito bits of the system are "hidden" or "unlinked",
+        # meaning that they take up space but have no corresponding directory
+        # record in the ISO filesystem.  In order to accommodate the rest
+        # of the system, which really expects these things to have directory
+        # records, we use fake directory records that don't get written out.
+        #
+        # Note that we specifically do *not* add these to any sort of parent;
+        # that way, we don't run afoul of any checks that adding a child to a
+        # parent might have.  This means that if we do ever want to unhide this
+        # entry, we'll have to do some additional work to give it a real name
+        # and link it to the appropriate parent.
+        if self.eltorito_boot_catalog is not None:
+            if self.eltorito_boot_catalog.dirrecord is None:
+                rec = dr.DirectoryRecord()
+                rec.parse_hidden(self.pvd, self.cdfp,
+                                 self.pvd.logical_block_size(),
+                                 self.eltorito_boot_catalog.extent_location(),
+                                 self.pvd.root_directory_record(),
+                                 self.pvd.sequence_number())
+                self.eltorito_boot_catalog.dirrecord = rec
+
+            if self.eltorito_boot_catalog.initial_entry.dirrecord is None:
+                rec = dr.DirectoryRecord()
+                rec.parse_hidden(self.pvd, self.cdfp,
+                                 self.eltorito_boot_catalog.initial_entry.length(),
+                                 self.eltorito_boot_catalog.initial_entry.get_rba(),
+                                 self.pvd.root_directory_record(),
+                                 self.pvd.sequence_number())
+                self.eltorito_boot_catalog.initial_entry.dirrecord = rec
+
+            for sec in self.eltorito_boot_catalog.sections:
+                for entry in sec.section_entries:
+                    if entry.dirrecord is None:
+                        rec = dr.DirectoryRecord()
+                        rec.parse_hidden(self.pvd, self.cdfp,
+                                         entry.length(),
+                                         entry.get_rba(),
+                                         self.pvd.root_directory_record(),
+                                         self.pvd.sequence_number())
+                        entry.dirrecord = rec
+
+            # Now that everything has a dirrecord, see if we have a boot
+            # info table.
+            self._check_for_eltorito_boot_info_table(self.eltorito_boot_catalog.initial_entry.dirrecord)
+            for sec in self.eltorito_boot_catalog.sections:
+                for entry in sec.section_entries:
+                    self._check_for_eltorito_boot_info_table(entry.dirrecord)
+
+        # We've seen ISOs in the wild (Office XP) that have a PVD space size
+        # that is smaller than the location of the last directory record
+        # extent + length.  If we see this, automatically update the size in the
+        # PVD (and any SVDs) so that subsequent operations will be correct.
+        if pvd_walk.lastbyte > self.pvd.space_size * self.pvd.logical_block_size():
+            new_pvd_size = utils.ceiling_div(pvd_walk.lastbyte, self.pvd.logical_block_size())
+            for pvd in self.pvds:
+                pvd.space_size = new_pvd_size
+            if self.joliet_vd is not None:
+                self.joliet_vd.space_size = new_pvd_size
+            if self.enhanced_vd is not None:
+                self.enhanced_vd.space_size = new_pvd_size
+
+        self._layout_end = self.pvd.space_size
 
     def _initialize(self):
         '''
@@ -1217,6 +2706,8 @@ class PyCdlib(object):
          Nothing.
         '''
         self.cdfp = None
+        self._cdmap = None
+        self._cdview = None
         self.pvd = None
         self.svds = []
         self.brs = []
@@ -1234,6 +2725,18 @@ class PyCdlib(object):
         self._rr_moved_rr_name = None
         self.enhanced_vd = None
         self.joliet_vd = None
+        self._deferred_dirs = {}
+        self._deferred_walks = []
+        self._iso_index = _PathIndex()
+        self._rr_index = _PathIndex()
+        self._joliet_index = _PathIndex()
+        self._index_keys = {}
+        self._batch_depth = 0
+        self._batch_dirty = {}
+        self._batch_always_consistent = False
+        self._layout_end = 0
+        self._headers_only = False
+        self._skipped_joliet = None
 
     def _parse_path_table(self, ptr_size, extent):
         '''
@@ -1248,15 +2751,13 @@ class PyCdlib(object):
         Returns:
          Nothing.
         '''
-        self._seek_to_extent(extent)
-        data = self.cdfp.read(ptr_size)
+        data = self._read_at(extent * self.pvd.logical_block_size(), ptr_size)
         offset = 0
         out = []
         extent_to_ptr = {}
         while offset < ptr_size:
             ptr = path_table_record.PathTableRecord()
-            len_di_byte = bytes(bytearray([data[offset]]))
-            read_len = path_table_record.PathTableRecord.record_length(struct.unpack_from("=B", len_di_byte, 0)[0])
+            read_len = path_table_record.PathTableRecord.record_length(struct.unpack_from("=B", data, offset)[0])
 
             ptr.parse(data[offset:offset + read_len])
             out.append(ptr)
@@ -1320,10 +2821,15 @@ class PyCdlib(object):
         sector, the El Torito Boot Catalog, the El Torito Initial Entry, and
         finally the data for the files.
 
+        If this object was created with preserve_extents=True, the metadata is
+        still laid out from the start of the ISO, but file data that already
+        has a location is left there and new data is appended after the end
+        of the ISO instead.
+
         Parameters:
          None.
         Returns:
-         Nothing.
+         The number of directory and file data extents that changed location.
         '''
         current_extent = 16
         for pvd in self.pvds:
@@ -1365,11 +2871,12 @@ class PyCdlib(object):
             self.joliet_vd.path_table_location_be = current_extent
             current_extent += self.joliet_vd.path_table_num_extents
 
-        current_extent, pvd_files = _reassign_vd_dirrecord_extents(self.pvd, current_extent)
+        current_extent, pvd_files, moved = _reassign_vd_dirrecord_extents(self.pvd, current_extent)
 
         joliet_files = []
         if self.joliet_vd is not None:
-            current_extent, joliet_files = _reassign_vd_dirrecord_extents(self.joliet_vd, current_extent)
+            current_extent, joliet_files, joliet_moved = _reassign_vd_dirrecord_extents(self.joliet_vd, current_extent)
+            moved += joliet_moved
 
         # The rock ridge "ER" sector must be after all of the directory
         # entries but before the file contents.
@@ -1377,23 +2884,62 @@ class PyCdlib(object):
             self.pvd.root_directory_record().children[0].rock_ridge.dr_entries.ce_record.update_extent(current_extent)
             current_extent += 1
 
+        if self._preserve_extents:
+            current_extent, data_moved = self._reassign_data_extents_preserving(current_extent, pvd_files + joliet_files)
+            moved += data_moved
+
+            # Holes left behind by removed or relocated data are not
+            # reclaimed, so the size of the ISO is wherever the data ends.
+            for pvd in self.pvds:
+                pvd.space_size = current_extent
+            if self.joliet_vd is not None:
+                self.joliet_vd.space_size = current_extent
+            if self.enhanced_vd is not None:
+                self.enhanced_vd.space_size = current_extent
+            self._layout_end = current_extent
+        else:
+            moved += self._reassign_data_extents(current_extent, pvd_files + joliet_files)
+
+        for child in pvd_files:
+            self.pvd.track_dirrecord(child)
+        for child in joliet_files:
+            self.joliet_vd.track_dirrecord(child)
+
+        if self.enhanced_vd is not None:
+            self.enhanced_vd.root_directory_record().new_extent_loc = self.pvd.root_directory_record().new_extent_loc
+
+        self._needs_reshuffle = False
+
+        return moved
+
+    def _reassign_data_extents(self, current_extent, files):
+        '''
+        An internal method to pack the El Torito Boot Catalog, the El Torito
+        boot files, and then the data for the rest of the files one after the
+        other, starting at the given extent.
+
+        Parameters:
+         current_extent - The first extent after the directory records.
+         files - The list of file directory records to assign extents to.
+        Returns:
+         The number of file data extents that changed location.
+        '''
+        log_block_size = self.pvd.log_block_size
+        moved = 0
         linked_records = {}
         if self.eltorito_boot_catalog is not None:
+            if self.eltorito_boot_catalog.dirrecord.extent_location() not in (None, current_extent):
+                moved += 1
             self.eltorito_boot_catalog.update_catalog_extent(current_extent)
             linked_records[id(self.eltorito_boot_catalog.dirrecord)] = True
             current_extent += 1
             for (rec, vd_unused) in self.eltorito_boot_catalog.dirrecord.linked_records:
                 linked_records[id(rec)] = True
 
-            # Collect the entries to update; this always includes at least the initial
-            # entry.
-            entries_to_update = [self.eltorito_boot_catalog.initial_entry]
-            for sec in self.eltorito_boot_catalog.sections:
-                for entry in sec.section_entries:
-                    entries_to_update.append(entry)
-
             # Now actually do the update.
-            for entry in entries_to_update:
+            for entry in self._eltorito_entries():
+                if entry.dirrecord.extent_location() not in (None, current_extent):
+                    moved += 1
                 entry.update_extent(current_extent)
                 if self.isohybrid_mbr is not None:
                     self.isohybrid_mbr.update_rba(current_extent)
@@ -1401,26 +2947,133 @@ class PyCdlib(object):
                 linked_records[id(entry.dirrecord)] = True
                 for (rec, vd_unused) in entry.dirrecord.linked_records:
                     linked_records[id(rec)] = True
-                current_extent += -(-entry.dirrecord.data_length // self.pvd.log_block_size)
+                current_extent += -(-entry.dirrecord.data_length // log_block_size)
 
-        for child in pvd_files + joliet_files:
+        for child in files:
             if id(child) in linked_records:
                 # We've already assigned an extent because it was linked to an
                 # earlier entry.
                 continue
 
+            if child.data_length > 0 and child.extent_location() not in (None, current_extent):
+                moved += 1
             child.new_extent_loc = current_extent
             for (rec, vd_unused) in child.linked_records:
                 rec.new_extent_loc = current_extent
                 linked_records[id(rec)] = True
 
-            # Equivalent to utils.ceiling_div(child.data_length, self.pvd.log_block_size), but faster
-            current_extent += -(-child.data_length // self.pvd.log_block_size)
+            # Equivalent to utils.ceiling_div(child.data_length, self.pvd.log_block_size), but faster
+            current_extent += -(-child.data_length // log_block_size)
+
+        return moved
+
+    def _reassign_data_extents_preserving(self, metadata_end, files):
+        '''
+        An internal method to assign extents to the El Torito Boot Catalog,
+        the El Torito boot files, and the data for the rest of the files while
+        leaving data that already has a location where it is.  Data without a
+        location yet, or whose location now overlaps the metadata that ends at
+        metadata_end, is placed after the current end of the ISO.
+
+        Parameters:
+         metadata_end - The first extent after the directory records.
+         files - The list of file directory records to assign extents to.
+        Returns:
+         A tuple of the extent after the last one in use and the number of
+         data extents that changed location.
+        '''
+        log_block_size = self.pvd.log_block_size
+
+        # Gather up each piece of data once (linked records share the data of
+        # the first record), along with the extent it can stay at, if any.
+        placements = []
+        linked_records = {}
 
-        if self.enhanced_vd is not None:
-            self.enhanced_vd.root_directory_record().new_extent_loc = self.pvd.root_directory_record().new_extent_loc
+        def _add_placement(rec, num_extents, update):
+            '''
+            Add a piece of data to the placement list, unless it is linked to
+            a piece of data that was already added.
+            '''
+            if id(rec) in linked_records:
+                return
+            linked_records[id(rec)] = True
+            keep = None
+            for r in [rec] + [l for (l, vd_unused) in rec.linked_records]:
+                linked_records[id(r)] = True
+                loc = r.extent_location()
+                if keep is None and loc is not None and (loc >= metadata_end or num_extents == 0):
+                    keep = loc
+            placements.append((rec.extent_location(), keep, num_extents, update))
+
+        def _update_record(rec):
+            '''
+            Return a function that moves a file record and its links.
+            '''
+            def _update(extent):
+                '''
+                Move the file record and its links to extent.
+                '''
+                rec.new_extent_loc = extent
+                for (l, vd_unused) in rec.linked_records:
+                    l.new_extent_loc = extent
+            return _update
 
-        self._needs_reshuffle = False
+        def _update_entry(entry):
+            '''
+            Return a function that moves an El Torito boot file.
+            '''
+            def _update(extent):
+                '''
+                Move the El Torito boot file to extent.
+                '''
+                entry.update_extent(extent)
+                if self.isohybrid_mbr is not None:
+                    self.isohybrid_mbr.update_rba(extent)
+            return _update
+
+        if self.eltorito_boot_catalog is not None:
+            _add_placement(self.eltorito_boot_catalog.dirrecord, 1,
+                           self.eltorito_boot_catalog.update_catalog_extent)
+            for entry in self._eltorito_entries():
+                _add_placement(entry.dirrecord,
+                               -(-entry.dirrecord.data_length // log_block_size),
+                               _update_entry(entry))
+
+        for child in files:
+            _add_placement(child, -(-child.data_length // log_block_size),
+                           _update_record(child))
+
+        high_water = max(metadata_end, self._layout_end)
+        for (old_unused, keep, num_extents, update_unused) in placements:
+            if keep is not None:
+                high_water = max(high_water, keep + num_extents)
+
+        moved = 0
+        for (old, keep, num_extents, update) in placements:
+            if keep is None:
+                keep = high_water
+                high_water += num_extents
+                if old is not None and num_extents > 0:
+                    moved += 1
+            update(keep)
+
+        return high_water, moved
+
+    def _eltorito_entries(self):
+        '''
+        An internal method to collect the El Torito entries whose boot files
+        need extents; this always includes at least the initial entry.
+
+        Parameters:
+         None.
+        Returns:
+         A list of El Torito entries.
+        '''
+        entries = [self.eltorito_boot_catalog.initial_entry]
+        for sec in self.eltorito_boot_catalog.sections:
+            for entry in sec.section_entries:
+                entries.append(entry)
+        return entries
 
     def _add_child_to_dr(self, child, logical_block_size):
         '''
@@ -1433,6 +3086,17 @@ class PyCdlib(object):
         Returns:
          Nothing.
         '''
+        if self._batch_depth > 0:
+            try:
+                child.parent.add_child_deferred(child)
+            except pycdlibexception.PyCdlibInvalidInput:
+                # See below for why a duplicate file is allowed here.
+                if child.is_dir():
+                    raise
+                child.parent.add_child_deferred(child, True)
+            self._batch_dirty[id(child.parent)] = (child.parent, logical_block_size)
+            return
+
         try_long_entry = False
         try:
             ret = child.parent.add_child(child, logical_block_size)
@@ -1471,6 +3135,15 @@ class PyCdlib(object):
         Returns:
          Nothing.
         '''
+        if self._batch_depth > 0:
+            child.parent.remove_child_deferred(child)
+            self._batch_dirty[id(child.parent)] = (child.parent, logical_block_size)
+            # A directory can only be removed once it is empty, and the
+            # caller accounts for its whole length, so it needs no layout.
+            self._batch_dirty.pop(id(child), None)
+            self._unindex_record(child)
+            return
+
         # The remove_child() method returns True if the parent no longer needs
         # the extent that the directory record for this child was on.  Remove
         # the extent as appropriate here.
@@ -1480,9 +3153,7 @@ class PyCdlib(object):
             if self.joliet_vd is not None:
                 self.joliet_vd.remove_from_space_size(self.joliet_vd.logical_block_size())
 
-        self._find_iso_record.cache_clear()  # pylint: disable=no-member
-        self._find_rr_record.cache_clear()  # pylint: disable=no-member
-        self._find_joliet_record.cache_clear()  # pylint: disable=no-member
+        self._unindex_record(child)
 
     def _add_to_ptr_size(self, ptr):
         '''
@@ -1693,7 +3364,145 @@ class PyCdlib(object):
 
         return tmp_path
 
-    def _open_fp(self, fp):
+    def _index_key(self):
+        '''
+        An internal method to compute the key that ties a metadata index to
+        the ISO it was saved from.  This is made up of the size, modification
+        time, and offset of the image the ISO is in, along with a checksum of
+        the volume descriptors.
+
+        Parameters:
+         None.
+        Returns:
+         The key for the ISO, as the packed _INDEX_HEADER of an index for it.
+        '''
+        (fp, offset) = utils.unwrap_window(self.cdfp, 0)
+        try:
+            st = os.fstat(fp.fileno())
+            size = st.st_size
+            have_mtime = 1
+            mtime = st.st_mtime
+        except (AttributeError, io.UnsupportedOperation):
+            old = fp.tell()
+            fp.seek(0, os.SEEK_END)
+            size = fp.tell()
+            fp.seek(old)
+            have_mtime = 0
+            mtime = 0.0
+
+        csum = hashlib.sha256()
+        extent = 16
+        while True:
+            vd = self._read_at(extent * 2048, 2048)
+            if len(vd) != 2048:
+                break
+            csum.update(vd)
+            if bytearray(vd[:1])[0] == headervd.VOLUME_DESCRIPTOR_TYPE_SET_TERMINATOR:
+                break
+            extent += 1
+
+        return _INDEX_HEADER.pack(_INDEX_MAGIC, _INDEX_VERSION, _INDEX_LAYOUT,
+                                  size, offset, have_mtime, mtime,
+                                  csum.digest())
+
+    def _load_index(self, index):
+        '''
+        An internal method to fill in the parsed metadata of the ISO from a
+        metadata index written by save_index().
+
+        Parameters:
+         index - The filename of the metadata index.
+        Returns:
+         True if the metadata was loaded, or False if the index does not match
+         the ISO (because either has changed since the index was saved).
+        '''
+        with open(index, 'rb') as indexfp:
+            header = indexfp.read(_INDEX_HEADER.size)
+            if not header.startswith(_INDEX_MAGIC):
+                raise pycdlibexception.PyCdlibInvalidInput("%s is not a PyCdlib index" % (index))
+            if header != self._index_key():
+                return False
+            try:
+                data = zlib.decompress(indexfp.read())
+            except zlib.error:
+                raise pycdlibexception.PyCdlibInvalidInput("%s is not a valid PyCdlib index" % (index))
+
+        # The metadata is a large graph of objects that are all still in use
+        # once loaded, so there is nothing for the garbage collector to find
+        # while loading it; it only slows the load down.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            state = _IndexUnpickler(io.BytesIO(data), self.cdfp).load()
+        except pycdlibexception.PyCdlibException:
+            raise
+        except Exception:  # pylint: disable=broad-except
+            # A damaged index can make pickle fail in any number of ways.
+            raise pycdlibexception.PyCdlibInvalidInput("%s is not a valid PyCdlib index" % (index))
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        if not isinstance(state, dict) or any(attr not in state for attr in _INDEX_ATTRS):
+            raise pycdlibexception.PyCdlibInvalidInput("%s is not a valid PyCdlib index" % (index))
+
+        for attr in _INDEX_ATTRS:
+            setattr(self, attr, state[attr])
+
+        return True
+
+    def _check_tree_available(self):
+        '''
+        An internal method to make sure that the directory tree of the ISO is
+        available, which it is not if the ISO was opened with headers_only.
+
+        Parameters:
+         None.
+        Returns:
+         Nothing.
+        '''
+        if self._headers_only:
+            raise pycdlibexception.PyCdlibInvalidInput("This ISO was opened with headers_only, so its directory tree is not available; open it again without headers_only")
+
+    def _open_headers_only(self):
+        '''
+        An internal method to finish opening an ISO with headers_only, once
+        the volume descriptors are parsed.  The Joliet and enhanced volume
+        descriptors are picked out, and the Rock Ridge version is taken from
+        the first record of the root directory, but no directories or path
+        tables are parsed.
+
+        Parameters:
+         None.
+        Returns:
+         Nothing.
+        '''
+        self.interchange_level = 1
+        for svd in self.svds:
+            if svd.version == 2 and svd.file_structure_version == 2:
+                self.interchange_level = 4
+            if _is_joliet_svd(svd):
+                if self.joliet_vd is not None:
+                    raise pycdlibexception.PyCdlibInvalidISO("Only a single Joliet SVD is supported")
+                self.joliet_vd = svd
+            elif svd.version == 2 and svd.file_structure_version == 2:
+                if self.enhanced_vd is not None:
+                    raise pycdlibexception.PyCdlibInvalidISO("Only a single enhanced VD is supported")
+                self.enhanced_vd = svd
+
+        root = self.pvd.root_directory_record()
+        data = self._read_at(root.extent_location() * self.pvd.logical_block_size(),
+                             self.pvd.logical_block_size())
+        lenbyte = bytearray(data[:1])[0] if data else 0
+        if lenbyte > 0:
+            # The dot record of the root is not added to the root, since the
+            # tree is not available anyway.
+            dot = dr.DirectoryRecord()
+            self.rock_ridge = dot.parse(self.pvd, data[:lenbyte], self.cdfp, root)
+
+        self._headers_only = True
+
+    def _open_fp(self, fp, lazy, offset, index, headers_only, parse_joliet):
         '''
         An internal method to open an existing ISO for inspection and
         modification.  Note that the file object passed in here must stay open
@@ -1702,14 +3511,36 @@ class PyCdlib(object):
 
         Parameters:
          fp - The file object containing the ISO to open up.
+         lazy - Whether to defer parsing of directories until they are needed.
+         offset - The byte offset of the ISO within the file object.
+         index - The filename of a metadata index to load instead of parsing
+                 the ISO, or None.
+         headers_only - Whether to stop after parsing the volume descriptors,
+                        El Torito, and isohybrid.
+         parse_joliet - Whether to walk the Joliet directory tree when
+                        opening.
         Returns:
          Nothing.
         '''
         if hasattr(fp, 'mode') and 'b' not in fp.mode:
             raise pycdlibexception.PyCdlibInvalidInput("The file to open must be in binary mode (add 'b' to the open flags)")
 
+        if offset < 0:
+            raise pycdlibexception.PyCdlibInvalidInput("The offset of the ISO must not be negative")
+
+        self._cdmap = _mmap_view(fp)
+        self._cdview = self._cdmap
+        if offset > 0:
+            # The rest of PyCdlib sees the ISO as if it started at byte 0.
+            fp = utils.FileWindow(fp, offset)
+            if self._cdmap is not None:
+                self._cdview = self._cdmap[offset:]
         self.cdfp = fp
 
+        if index is not None and self._load_index(index):
+            self._initialized = True
+            return
+
         # Get the Primary Volume Descriptor (pvd), the set of Supplementary
         # Volume Descriptors (svds), the set of Volume Partition
         # Descriptors (vpds), the set of Boot Records (brs), and the set of
@@ -1742,6 +3573,11 @@ class PyCdlib(object):
         self.version_vd = headervd.VersionVolumeDescriptor()
         self.version_vd.parse(self.vdsts[0].extent_location() + 1)
 
+        if headers_only:
+            self._open_headers_only()
+            self._initialized = True
+            return
+
         # Now that we have the PVD, parse the Path Tables according to Ecma-119
         # section 9.4.  We want to ensure that the big endian versions agree
         # with the little endian ones (to make sure it is a valid ISO).
@@ -1764,105 +3600,54 @@ class PyCdlib(object):
                 self.interchange_level = 4
                 break
 
+        old_loc = self.cdfp.tell()
+        self.cdfp.seek(0, os.SEEK_END)
+        iso_file_length = self.cdfp.tell()
+        self.cdfp.seek(old_loc)
+
         extent_to_dr = {}
 
         # OK, so now that we have the PVD, we start at its root directory
         # record and find all of the files
-        ic_level, lastbyte = self._walk_directories(self.pvd, extent_to_ptr, extent_to_dr, le_ptrs, True)
-
-        self.interchange_level = max(self.interchange_level, ic_level)
-
-        # On El Torito ISOs, after we have walked the directories we look
-        # to see if all of the entries in El Torito have corresponding
-        # directory records.  If they don't, then it may be the case that
-        # the El Torito bits of the system are "hidden" or "unlinked",
-        # meaning that they take up space but have no corresponding directory
-        # record in the ISO filesystem.  In order to accommodate the rest
-        # of the system, which really expects these things to have directory
-        # records, we use fake directory records that don't get written out.
-        #
-        # Note that we specifically do *not* add these to any sort of parent;
-        # that way, we don't run afoul of any checks that adding a child to a
-        # parent might have.  This means that if we do ever want to unhide this
-        # entry, we'll have to do some additional work to give it a real name
-        # and link it to the appropriate parent.
-        if self.eltorito_boot_catalog is not None:
-            if self.eltorito_boot_catalog.dirrecord is None:
-                rec = dr.DirectoryRecord()
-                rec.parse_hidden(self.pvd, self.cdfp,
-                                 self.pvd.logical_block_size(),
-                                 self.eltorito_boot_catalog.extent_location(),
-                                 self.pvd.root_directory_record(),
-                                 self.pvd.sequence_number())
-                self.eltorito_boot_catalog.dirrecord = rec
-
-            if self.eltorito_boot_catalog.initial_entry.dirrecord is None:
-                rec = dr.DirectoryRecord()
-                rec.parse_hidden(self.pvd, self.cdfp,
-                                 self.eltorito_boot_catalog.initial_entry.length(),
-                                 self.eltorito_boot_catalog.initial_entry.get_rba(),
-                                 self.pvd.root_directory_record(),
-                                 self.pvd.sequence_number())
-                self.eltorito_boot_catalog.initial_entry.dirrecord = rec
-
-            for sec in self.eltorito_boot_catalog.sections:
-                for entry in sec.section_entries:
-                    if entry.dirrecord is None:
-                        rec = dr.DirectoryRecord()
-                        rec.parse_hidden(self.pvd, self.cdfp,
-                                         entry.length(),
-                                         entry.get_rba(),
-                                         self.pvd.root_directory_record(),
-                                         self.pvd.sequence_number())
-                        entry.dirrecord = rec
-
-            # Now that everything has a dirrecord, see if we have a boot
-            # info table.
-            self._check_for_eltorito_boot_info_table(self.eltorito_boot_catalog.initial_entry.dirrecord)
-            for sec in self.eltorito_boot_catalog.sections:
-                for entry in sec.section_entries:
-                    self._check_for_eltorito_boot_info_table(entry.dirrecord)
+        pvd_walk = _DirectoryWalk(self.pvd, le_ptrs, extent_to_ptr, extent_to_dr,
+                                  True, iso_file_length, not lazy)
+        self._walk_directories(pvd_walk, le_ptrs, lazy)
+        walks = [pvd_walk]
 
         # The PVD is finished.  Now look to see if we need to parse the SVD.
         for svd in self.svds:
-            if (svd.flags & 0x1) == 0 and svd.escape_sequences[:3] in [b'%/@', b'%/C', b'%/E']:
+            if _is_joliet_svd(svd):
                 if self.joliet_vd is not None:
                     raise pycdlibexception.PyCdlibInvalidISO("Only a single Joliet SVD is supported")
 
                 self.joliet_vd = svd
 
-                le_ptrs, joliet_extent_to_ptr = self._parse_path_table(svd.path_table_size(),
-                                                                       svd.path_table_location_le)
-
-                tmp_be_ptrs, j_unused = self._parse_path_table(svd.path_table_size(),
-                                                               svd.path_table_location_be)
-
-                for index, ptr in enumerate(le_ptrs):
-                    if not ptr.equal_to_be(tmp_be_ptrs[index]):
-                        raise pycdlibexception.PyCdlibInvalidISO("Joliet Little-endian and big-endian path table records do not agree")
+                if not parse_joliet:
+                    # The Joliet tree is walked the first time it is needed;
+                    # see _parse_skipped_joliet().
+                    self._skipped_joliet = (extent_to_dr, iso_file_length)
+                    continue
 
-                self._walk_directories(svd, joliet_extent_to_ptr, extent_to_dr, le_ptrs, False)
+                joliet_walk, le_ptrs = self._start_joliet_walk(extent_to_dr,
+                                                               iso_file_length,
+                                                               not lazy)
+                self._walk_directories(joliet_walk, le_ptrs, lazy)
+                walks.append(joliet_walk)
             elif svd.version == 2 and svd.file_structure_version == 2:
                 if self.enhanced_vd is not None:
                     raise pycdlibexception.PyCdlibInvalidISO("Only a single enhanced VD is supported")
                 self.enhanced_vd = svd
 
-        # We've seen ISOs in the wild (Office XP) that have a PVD space size
-        # that is smaller than the location of the last directory record
-        # extent + length.  If we see this, automatically update the size in the
-        # PVD (and any SVDs) so that subsequent operations will be correct.
-        if lastbyte > self.pvd.space_size * self.pvd.logical_block_size():
-            new_pvd_size = utils.ceiling_div(lastbyte, self.pvd.logical_block_size())
-            for pvd in self.pvds:
-                pvd.space_size = new_pvd_size
-            if self.joliet_vd is not None:
-                self.joliet_vd.space_size = new_pvd_size
-            if self.enhanced_vd is not None:
-                self.enhanced_vd.space_size = new_pvd_size
+        if lazy:
+            self._deferred_walks = walks
+            for walk in walks:
+                self._resolve_deferred_rr_links(walk)
+        else:
+            self._finish_walks(pvd_walk)
 
         self._initialized = True
 
-    def _get_and_write_fp(self, iso_path, outfp, blocksize):
+    def _get_and_write_fp(self, iso_path, outfp, blocksize, io_policy=None):
         '''
         An internal method to fetch a single file from the ISO and write it out
         to the file object.
@@ -1871,20 +3656,25 @@ class PyCdlib(object):
          iso_path - The absolute path to the file to get data from.
          outfp - The file object to write data to.
          blocksize - The blocksize to use when copying data.
+         io_policy - The I/O policy to copy the data with.
         Returns:
          Nothing.
         '''
+        # Check this up front, so that a bad policy isn't mistaken for a path
+        # that wasn't found below.
+        utils.parse_io_policy(io_policy)
+
         try:
-            return self._get_file_from_iso_fp(outfp, joliet_path=iso_path, blocksize=blocksize)
+            return self._get_file_from_iso_fp(outfp, joliet_path=iso_path, blocksize=blocksize, io_policy=io_policy)
         except pycdlibexception.PyCdlibException:
             pass
 
         try:
-            return self._get_file_from_iso_fp(outfp, iso_path=iso_path, blocksize=blocksize)
+            return self._get_file_from_iso_fp(outfp, iso_path=iso_path, blocksize=blocksize, io_policy=io_policy)
         except pycdlibexception.PyCdlibException:
             pass
 
-        self._get_file_from_iso_fp(outfp, rr_path=iso_path, blocksize=blocksize)
+        self._get_file_from_iso_fp(outfp, rr_path=iso_path, blocksize=blocksize, io_policy=io_policy)
 
     def _get_file_from_iso_fp(self, outfp, **kwargs):
         '''
@@ -1900,10 +3690,13 @@ class PyCdlib(object):
                    with iso_path and joliet_path).
          joliet_path - The absolute Joliet path to lookup on the ISO (exclusive
                        with iso_path and rr_path).
+         io_policy - The I/O policy to copy the data with, as described in
+                     utils.parse_io_policy.
         Returns:
          Nothing.
         '''
         blocksize = 8192
+        io_policy = None
         joliet_path = None
         iso_path = None
         rr_path = None
@@ -1911,6 +3704,8 @@ class PyCdlib(object):
         for key in kwargs:
             if key == "blocksize":
                 blocksize = kwargs[key]
+            elif key == "io_policy":
+                io_policy = kwargs[key]
             elif key == "iso_path" and kwargs[key] is not None:
                 iso_path = utils.normpath(kwargs[key])
                 num_paths += 1
@@ -1926,6 +3721,24 @@ class PyCdlib(object):
         if num_paths != 1:
             raise pycdlibexception.PyCdlibInvalidInput("Exactly one of iso_path, rr_path, or joliet_path must be passed")
 
+        utils.parse_io_policy(io_policy)
+
+        found_record = self._find_data_record(iso_path, rr_path, joliet_path)
+
+        self._copy_record_data(found_record, outfp, blocksize, io_policy)
+
+    def _find_data_record(self, iso_path, rr_path, joliet_path):
+        '''
+        An internal method to find the directory record of a file on the ISO
+        to read the data of.  Exactly one of the paths must be passed.
+
+        Parameters:
+         iso_path - The normalized ISO9660 path to lookup, or None.
+         rr_path - The normalized Rock Ridge path to lookup, or None.
+         joliet_path - The normalized Joliet path to lookup, or None.
+        Returns:
+         The directory record of the file.
+        '''
         if self._needs_reshuffle:
             self._reshuffle_extents()
 
@@ -1953,6 +3766,21 @@ class PyCdlib(object):
                 # decision in the future if we need to.
                 raise pycdlibexception.PyCdlibInvalidInput("Symlinks have no data associated with them")
 
+        return found_record
+
+    def _copy_record_data(self, found_record, outfp, blocksize, io_policy):
+        '''
+        An internal method to write the data of a file on the ISO, following
+        all of the extents of the file, out to the file object.
+
+        Parameters:
+         found_record - The directory record of the file.
+         outfp - The file object to write data to.
+         blocksize - The number of bytes in each transfer.
+         io_policy - The I/O policy to copy the data with.
+        Returns:
+         Nothing.
+        '''
         while found_record is not None:
             with dr.DROpenData(found_record, self.pvd.logical_block_size()) as (data_fp, data_len):
                 # Here we copy the data into the output file descriptor.  If a boot
@@ -1970,61 +3798,163 @@ class PyCdlib(object):
                         data_len -= table_len
                         if data_len > 0:
                             data_fp.seek(len(rec), 1)
-                            utils.copy_data(data_len, blocksize, data_fp, outfp)
+                            utils.copy_data(data_len, blocksize, data_fp, outfp, io_policy)
                 else:
-                    utils.copy_data(data_len, blocksize, data_fp, outfp)
+                    utils.copy_data(data_len, blocksize, data_fp, outfp, io_policy)
 
             if found_record.data_continuation is not None:
                 found_record = found_record.data_continuation
             else:
                 found_record = None
 
-    def _outfp_write_with_check(self, outfp, data):
+    def _extract_file(self, rec, dest, blocksize, lock):
         '''
-        Internal method to write data out to the output file descriptor,
-        ensuring that it doesn't go beyond the bounds of the ISO.
+        An internal method to extract a file on the ISO, following all of its
+        extents, to a new local file.  Where possible, the data is copied
+        with positional reads, so that several files can be extracted at
+        once from the same file object; otherwise the copy is done while
+        holding the lock.
 
         Parameters:
-         outfp - The file object to write to.
-         data - The actual data to write.
+         rec - The directory record of the file.
+         dest - The local path to extract the file to.
+         blocksize - The number of bytes in each transfer.
+         lock - The lock that protects the file objects that the data is
+                read from.
         Returns:
          Nothing.
         '''
-        outfp.write(data)
-        # After the write, double check that we didn't write beyond the
-        # boundary of the PVD, and raise a PyCdlibException if we do.
-        if outfp.tell() > self.pvd.space_size * self.pvd.logical_block_size():
-            raise pycdlibexception.PyCdlibInternalError("Wrote past the end of the ISO! (%d > %d)" % (outfp.tell(), self.pvd.space_size * self.pvd.logical_block_size()))
+        log_block_size = self.pvd.logical_block_size()
+        # Don't follow a symlink that is already where the file goes.
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_NOFOLLOW', 0) | getattr(os, 'O_BINARY', 0)
+        with os.fdopen(os.open(dest, flags, 0o666), 'wb') as outfp:
+            if not hasattr(os, 'pwrite'):
+                with lock:
+                    self._copy_record_data(rec, outfp, blocksize, None)
+                return
+
+            out_fd = outfp.fileno()
+            out_offset = 0
+            while rec is not None:
+                opener = dr.DROpenData(rec, log_block_size)
+                if opener.drobj.manage_fp:
+                    # The file is opened just for this copy, so nothing else
+                    # is using it.
+                    with opener as (data_fp, data_len):
+                        utils.copy_data_positional(data_len, blocksize, data_fp,
+                                                   opener.data_offset(), out_fd,
+                                                   out_offset, lock)
+                else:
+                    data_len = opener.drobj.data_length
+                    utils.copy_data_positional(data_len, blocksize,
+                                               opener.drobj.data_fp,
+                                               opener.data_offset(), out_fd,
+                                               out_offset, lock)
 
-    def _output_directory_record(self, outfp, blocksize, child):
+                # As in _copy_record_data, the boot info table is overlaid
+                # on the data at offset 8, but never past the end of it.
+                if rec.boot_info_table is not None and data_len > 8:
+                    os.pwrite(out_fd, rec.boot_info_table.record()[:data_len - 8],
+                              out_offset + 8)
+
+                out_offset += data_len
+                rec = rec.data_continuation
+
+    def _output_directory_record(self, writer, blocksize, child):
         '''
         Internal method to write a directory record entry out.
 
         Parameters:
-         outfp - The file object to write the data to.
+         writer - The _BoundedWriter to write the data with.
          blocksize - The blocksize to use when writing the data out.
          child - The directory record to write.
         Returns:
          The total number of bytes written out.
         '''
-        with dr.DROpenData(child, self.pvd.logical_block_size()) as (data_fp, data_len):
-            outfp.seek(child.extent_location() * self.pvd.logical_block_size())
-            tmp_start = outfp.tell()
-            utils.copy_data(data_len, blocksize, data_fp, outfp)
-            self._outfp_write_with_check(outfp,
-                                         _pad(data_len, self.pvd.logical_block_size()))
+        log_block_size = self.pvd.logical_block_size()
+        start = child.extent_location() * log_block_size
+        with dr.DROpenData(child, log_block_size) as (data_fp, data_len):
+            writer.copy_at(start, data_len, blocksize, data_fp)
+            padding = _pad(data_len, log_block_size)
+            writer.write_at(start + data_len, padding)
 
         # If this file is being used as a bootfile, and the user
         # requested that the boot info table be patched into it,
         # we patch the boot info table at offset 8 here.
         if child.boot_info_table is not None:
-            old = outfp.tell()
-            outfp.seek(tmp_start + 8)
-            self._outfp_write_with_check(outfp, child.boot_info_table.record())
-            outfp.seek(old)
-        return outfp.tell() - tmp_start
+            writer.write_at(start + 8, child.boot_info_table.record())
+        return data_len + len(padding)
+
+    def _output_directory_records_parallel(self, out_fd, blocksize, children,
+                                           workers, progress, sparse, policy):
+        '''
+        Internal method to write the data for a list of directory records out
+        using a pool of threads.  Each piece of data already has its extent,
+        so the copies are independent of each other and are done with
+        positional writes to the output file descriptor.
+
+        Parameters:
+         out_fd - The file descriptor to write the data to.
+         blocksize - The blocksize to use when writing the data out.
+         children - The list of directory records to write.
+         workers - The number of threads to use.
+         progress - The _Progress object to update as data is written.
+         sparse - Whether to leave the padding after the data out, because
+                  it is already a hole in the output file.
+         policy - The I/O policy to copy the data with.
+        Returns:
+         Nothing.
+        '''
+        log_block_size = self.pvd.logical_block_size()
+        iso_size = self.pvd.space_size * log_block_size
+        lock = threading.Lock()
+
+        def _copy(data_fp, in_offset, data_len, out_offset):
+            '''
+            Copy one piece of data and its padding to out_offset.
+            '''
+            padding = _pad(data_len, log_block_size)
+            if out_offset + data_len + len(padding) > iso_size:
+                raise pycdlibexception.PyCdlibInternalError("Wrote past the end of the ISO! (%d > %d)" % (out_offset + data_len + len(padding), iso_size))
+            utils.copy_data_positional(data_len, blocksize, data_fp, in_offset,
+                                       out_fd, out_offset, lock, policy)
+            if not sparse:
+                os.pwrite(out_fd, padding, out_offset + data_len)
+            return data_len + len(padding)
+
+        def _output(child):
+            '''
+            Write the data for one directory record, returning the number of
+            bytes written.
+            '''
+            out_offset = child.extent_location() * log_block_size
+            opener = dr.DROpenData(child, log_block_size)
+            if opener.drobj.manage_fp:
+                # The file is opened just for this copy, so nothing else is
+                # using it.
+                with opener as (data_fp, data_len):
+                    length = _copy(data_fp, opener.data_offset(), data_len, out_offset)
+            else:
+                length = _copy(opener.drobj.data_fp, opener.data_offset(),
+                               opener.drobj.data_length, out_offset)
+
+            # If this file is being used as a bootfile, and the user
+            # requested that the boot info table be patched into it,
+            # we patch the boot info table at offset 8 here.
+            if child.boot_info_table is not None:
+                os.pwrite(out_fd, child.boot_info_table.record(), out_offset + 8)
+            return length
+
+        pool = multiprocessing.pool.ThreadPool(workers)
+        try:
+            for length in pool.imap_unordered(_output, children):
+                progress.call(length)
+        finally:
+            pool.terminate()
+            pool.join()
 
-    def _write_fp(self, outfp, blocksize=32768, progress_cb=None, progress_opaque=None):
+    def _write_fp(self, outfp, blocksize=32768, progress_cb=None, progress_opaque=None, workers=1, stream=False,
+                  sparse=False, sparse_data=False, io_policy=None, offset=0):
         '''
         Write a properly formatted ISO out to the file object passed in.  This
         also goes by the name of "mastering".
@@ -2036,86 +3966,234 @@ class PyCdlib(object):
                        work.  The callback function must have a signature of:
                        def func(done, total).
          progress_opaque - User data to be passed to the progress callback.
+         workers - The number of threads to copy file data with.  If more
+                   than 1, and both os.pwrite and a file descriptor for outfp
+                   are available, the metadata is written first and then the
+                   file data is copied in parallel.
+         stream - Whether to write the ISO out strictly from start to end,
+                  without seeking.  This is always done if outfp is not
+                  seekable.
+         sparse - Whether to leave blocks of zeros in the padding and the
+                  metadata as holes in the output, instead of writing them.
+                  This only has an effect if outfp is a regular file and the
+                  ISO is not being streamed; the file is truncated to zero
+                  length first, discarding anything already in it.
+         sparse_data - Whether to also leave blocks of zeros in the file
+                       data as holes.  This requires sparse, and means that
+                       the file data is read and checked rather than copied
+                       in the kernel, and is not copied in parallel.
+         io_policy - The I/O policy, as described in utils.parse_io_policy.
+                     With 'preallocate' the space for the ISO is allocated
+                     before writing (unless writing a sparse ISO); with
+                     'nocache' the file data and the ISO are dropped from the
+                     page cache as they are written.
+         offset - The byte offset to write the ISO at within outfp.  If not
+                  0, outfp must be seekable; the ISO is streamed out through
+                  a utils.FileWindow, and the parts of outfp outside of the
+                  ISO (and its isohybrid padding) are left alone.
         Returns:
          Nothing.
         '''
-        if hasattr(outfp, 'mode') and 'b' not in outfp.mode:
+        if sparse_data and not sparse:
+            raise pycdlibexception.PyCdlibInvalidInput("sparse_data can only be used along with sparse")
+
+        if offset < 0:
+            raise pycdlibexception.PyCdlibInvalidInput("The offset of the ISO must not be negative")
+        _check_offset_options(offset, workers, sparse, io_policy)
+
+        (preallocate, nocache) = utils.parse_io_policy(io_policy)
+        copy_policy = None
+        if nocache:
+            copy_policy = 'nocache'
+
+        # Some file objects (such as gzip.GzipFile) have a numeric mode, which
+        # says nothing about text or binary.
+        if isinstance(getattr(outfp, 'mode', None), str) and 'b' not in outfp.mode:
             raise pycdlibexception.PyCdlibInvalidInput("The file to write out must be in binary mode (add 'b' to the open flags)")
 
+        if self._batch_depth > 0:
+            raise pycdlibexception.PyCdlibInvalidInput("Cannot write out an ISO while a batch is in progress; call commit_batch() first")
+
         if self._needs_reshuffle:
             self._reshuffle_extents()
 
+        if offset > 0:
+            if not _is_seekable(outfp):
+                raise pycdlibexception.PyCdlibInvalidInput("An ISO can only be written at an offset to a seekable file object")
+            # The file may already have data where the ISO goes, which must
+            # not show through the gaps between the pieces of the ISO, so
+            # every byte is written out from start to end.
+            outfp = utils.FileWindow(outfp, offset)
+            outfp.seek(0)
+            stream = True
+
+        if stream or not _is_seekable(outfp):
+            progress = _Progress(self.pvd.space_size * self.pvd.logical_block_size(),
+                                 progress_cb, progress_opaque)
+            progress.call(0)
+            for chunk in self._virtual_image().chunks(blocksize):
+                outfp.write(chunk)
+                progress.call(len(chunk))
+            progress.finish()
+            return
+
+        # In parallel mode, the file data is collected here while walking the
+        # directories and written out after all of the metadata.
+        sparse = sparse and _is_regular_file(outfp)
+
+        parallel_records = None
+        if workers > 1 and hasattr(os, 'pwrite') and not (sparse and sparse_data):
+            # The file data is written with pwrite, so that only works if the
+            # descriptor is the file the ISO is going into.
+            if utils.file_fileno(outfp) is not None:
+                parallel_records = []
+
         outfp.seek(0)
 
-        class Progress(object):
-            '''
-            An inner class to deal with progress.
-            '''
-            def __init__(self, total):
-                self.done = 0
-                self.total = total
+        iso_size = self.pvd.space_size * self.pvd.logical_block_size()
+        if sparse:
+            # Anything that is skipped over has to read back as zeros, so
+            # start from an empty file.
+            outfp.truncate()
+            writer = _SparseWriter(outfp, iso_size, self.pvd.logical_block_size(),
+                                   sparse_data, copy_policy)
+        else:
+            writer = _BoundedWriter(outfp, iso_size, copy_policy)
+            if preallocate and _is_regular_file(outfp):
+                # Only the ISO itself is allocated, since the isohybrid
+                # padding is written after the end of the file below.
+                utils.preallocate(outfp.fileno(), 0, iso_size)
 
-            def call(self, length):
-                '''
-                Add the length to done, then call progress_cb if it is not None.
-                '''
-                self.done += length
-                if self.done > self.total:
-                    self.done = self.total
-                if progress_cb is not None:
-                    if len(inspect.getargspec(progress_cb).args) == 2:  # pylint: disable=W1505
-                        progress_cb(self.done, self.total)
-                    else:
-                        progress_cb(self.done, self.total, progress_opaque)
+        progress = _Progress(iso_size, progress_cb, progress_opaque)
+        progress.call(0)
 
-            def finish(self):
-                '''
-                If the progress_cb is not None, call progress_cb with the
-                final total.
-                '''
-                # In almost all cases, this will cause self.done to wildly
-                # overflow the total size.  However, with the hard cap in
-                # call, this works just fine.
-                self.call(self.total)
+        self._write_metadata(writer, blocksize, progress, parallel_records)
+
+        if parallel_records:
+            # Everything up to here went through the file object, so flush it
+            # before writing underneath it.  The file data goes in
+            # before the padding below, so that only the tail of the ISO is
+            # padded.
+            outfp.flush()
+            self._output_directory_records_parallel(outfp.fileno(), blocksize,
+                                                    parallel_records, workers,
+                                                    progress, sparse,
+                                                    copy_policy)
+
+        if sparse:
+            # Growing the file leaves a hole for the padding at the end of
+            # the ISO and for the isohybrid padding after it.
+            size = iso_size
+            if self.isohybrid_mbr is not None:
+                size += len(self.isohybrid_mbr.record_padding(iso_size))
+            outfp.truncate(size)
+            self._drop_from_cache(outfp, nocache)
+            progress.finish()
+            return
+
+        # We need to pad out to the total size of the disk, in the case that
+        # the last thing we wrote is shorter than a full block size.  We used
+        # to use the truncate method to do this, but it turns out that not all
+        # file-like objects allow you to use truncate to grow the file.  Thus,
+        # we do it the old-fashioned way by seeking to the end of the object,
+        # calculating the difference between the end and what we want, and then
+        # manually writing zeros for padding.
+        outfp.seek(0, os.SEEK_END)
+        file_end = outfp.tell()
+        writer.pos = file_end
+        writer.write_at(file_end, _pad(file_end, iso_size))
+
+        if self.isohybrid_mbr is not None:
+            outfp.seek(0, os.SEEK_END)
+            # Note that we very specifically do not use the writer here
+            # because this writes outside the PVD boundaries.
+            outfp.write(self.isohybrid_mbr.record_padding(iso_size))
+
+        self._drop_from_cache(outfp, nocache)
+        progress.finish()
+
+    def _drop_from_cache(self, outfp, nocache):
+        '''
+        An internal method to drop the ISO that was just written out from the
+        page cache, for the 'nocache' I/O policy.  Most of the file data was
+        dropped as it was copied, but not the last of it, nor the metadata.
+
+        Parameters:
+         outfp - The file object the ISO was written to.
+         nocache - Whether the 'nocache' I/O policy is in use.
+        Returns:
+         Nothing.
+        '''
+        if not nocache or not _is_regular_file(outfp):
+            return
+        outfp.flush()
+        utils.fadvise(outfp.fileno(), 0, 0, 'dontneed')
+
+    def _virtual_image(self):
+        '''
+        An internal method to build a _VirtualImage of the ISO as it is now.
+        The extents must already be up-to-date.
+
+        Parameters:
+         None.
+        Returns:
+         The _VirtualImage object.
+        '''
+        log_block_size = self.pvd.logical_block_size()
+        iso_size = self.pvd.space_size * log_block_size
+        writer = _ImageMapWriter(iso_size)
+        data_records = []
+        self._write_metadata(writer, 0, _Progress(iso_size, None, None),
+                             data_records)
+
+        size = iso_size
+        if self.isohybrid_mbr is not None:
+            padding = self.isohybrid_mbr.record_padding(iso_size)
+            writer.end += len(padding)
+            writer.write_at(iso_size, padding)
+            size += len(padding)
+
+        return _VirtualImage(writer.pieces, data_records, size, log_block_size)
+
+    def _write_metadata(self, writer, blocksize, progress, data_records):
+        '''
+        An internal method to write out everything but the padding at the end
+        of the ISO: the volume descriptors, the El Torito Boot Catalog, the
+        path tables, the directory records, and the file data.
 
-        progress = Progress(self.pvd.space_size * self.pvd.logical_block_size())
-        progress.call(0)
+        Parameters:
+         writer - The _BoundedWriter to write the data with.
+         blocksize - The blocksize to use when writing file data out.
+         progress - The _Progress object to update as data is written.
+         data_records - If not None, the list to collect the file records
+                        whose data should be written out later, instead of
+                        writing it out here.
+        Returns:
+         Nothing.
+        '''
+        log_block_size = self.pvd.logical_block_size()
 
         if self.isohybrid_mbr is not None:
-            self._outfp_write_with_check(outfp,
-                                         self.isohybrid_mbr.record(self.pvd.space_size * self.pvd.logical_block_size()))
+            writer.write_at(0, self.isohybrid_mbr.record(self.pvd.space_size * log_block_size))
 
         # Ecma-119, 6.2.1 says that the Volume Space is divided into a System
         # Area and a Data Area, where the System Area is in logical sectors 0
         # to 15, and whose contents is not specified by the standard.  Thus
         # we skip the first 16 sectors.
-        outfp.seek(self.pvd.extent_location() * self.pvd.logical_block_size())
+        offset = self.pvd.extent_location() * log_block_size
 
         # First write out the PVD.
         for pvd in self.pvds:
             rec = pvd.record()
-            self._outfp_write_with_check(outfp, rec)
-            progress.call(len(rec))
-
-        # Next write out the boot records.
-        for br in self.brs:
-            outfp.seek(br.extent_location() * self.pvd.logical_block_size())
-            rec = br.record()
-            self._outfp_write_with_check(outfp, rec)
-            progress.call(len(rec))
-
-        # Next we write out the SVDs.
-        for svd in self.svds:
-            outfp.seek(svd.extent_location() * self.pvd.logical_block_size())
-            rec = svd.record()
-            self._outfp_write_with_check(outfp, rec)
+            writer.write_at(offset, rec)
+            offset += len(rec)
             progress.call(len(rec))
 
-        # Next we write out the Volume Descriptor Terminators.
-        for vdst in self.vdsts:
-            outfp.seek(vdst.extent_location() * self.pvd.logical_block_size())
-            rec = vdst.record()
-            self._outfp_write_with_check(outfp, rec)
+        # Next write out the boot records, the SVDs, and the Volume Descriptor
+        # Terminators.
+        for vd in self.brs + self.svds + self.vdsts:
+            rec = vd.record()
+            writer.write_at(vd.extent_location() * log_block_size, rec)
             progress.call(len(rec))
 
         # Next we write out the version block.
@@ -2124,9 +4202,8 @@ class PyCdlib(object):
         # (if in debug mode, otherwise it is all zero).  However, there is no
         # mention of this in any of the specifications I've read so far.  Where
         # does it come from?
-        outfp.seek(self.version_vd.extent_location() * self.pvd.logical_block_size())
-        rec = self.version_vd.record(self.pvd.logical_block_size())
-        self._outfp_write_with_check(outfp, rec)
+        rec = self.version_vd.record(log_block_size)
+        writer.write_at(self.version_vd.extent_location() * log_block_size, rec)
         progress.call(len(rec))
 
         # In theory, the Path Table Records (for both the PVD and SVD) get
@@ -2134,139 +4211,109 @@ class PyCdlib(object):
         # Records, however, we will write them out along with the directory
         # records instead.
 
-        le_ptr_offset = 0
-        be_ptr_offset = 0
-
         if self.eltorito_boot_catalog is not None:
-            outfp.seek(self.eltorito_boot_catalog.extent_location() * self.pvd.logical_block_size())
             rec = self.eltorito_boot_catalog.record()
-            self._outfp_write_with_check(outfp, rec)
+            writer.write_at(self.eltorito_boot_catalog.extent_location() * log_block_size, rec)
             progress.call(len(rec))
 
             if self.eltorito_boot_catalog.initial_entry.dirrecord.hidden:
                 # If the initial entry is hidden, we have to make sure to write
                 # it out, since it won't be done below.
-                progress.call(self._output_directory_record(outfp, blocksize,
-                                                            self.eltorito_boot_catalog.initial_entry.dirrecord))
+                if data_records is not None:
+                    data_records.append(self.eltorito_boot_catalog.initial_entry.dirrecord)
+                else:
+                    progress.call(self._output_directory_record(writer, blocksize,
+                                                                self.eltorito_boot_catalog.initial_entry.dirrecord))
 
         # Now we need to write out the actual files.  Note that in many cases,
         # we haven't yet read the file out of the original, so we need to do
         # that here.
-        dirs = collections.deque([self.pvd.root_directory_record()])
+        self._write_directories(writer, self.pvd, True, blocksize, progress,
+                                data_records)
+
+        if self.joliet_vd is not None:
+            self._write_directories(writer, self.joliet_vd, False, blocksize,
+                                    progress, data_records)
+
+    def _write_directories(self, writer, vd, write_data, blocksize, progress,
+                           data_records):
+        '''
+        An internal method to write out the path tables and directory records
+        of a Volume Descriptor, along with (optionally) the data for the files.
+        Each path table and each directory is assembled in memory and written
+        out with a single write.
+
+        Parameters:
+         writer - The _BoundedWriter to write the data with.
+         vd - The Volume Descriptor whose directories should be written.
+         write_data - Whether to write out the data for the files as well.
+         blocksize - The blocksize to use when writing file data out.
+         progress - The _Progress object to update as data is written.
+         data_records - If not None, the list to collect the file records
+                        whose data should be written out later.
+        Returns:
+         Nothing.
+        '''
+        log_block_size = vd.logical_block_size()
+        le_ptrs = bytearray()
+        be_ptrs = bytearray()
+
+        dirs = collections.deque([vd.root_directory_record()])
         while dirs:
             curr = dirs.popleft()
-            curr_dirrecord_offset = 0
             if curr.is_dir():
-                orig = outfp.tell()
-                # Little Endian PTR
-                outfp.seek(self.pvd.path_table_location_le * self.pvd.logical_block_size() + le_ptr_offset)
-                ret = curr.ptr.record_little_endian()
-                self._outfp_write_with_check(outfp, ret)
-                le_ptr_offset += len(ret)
-                # Big Endian PTR
-                outfp.seek(self.pvd.path_table_location_be * self.pvd.logical_block_size() + be_ptr_offset)
-                ret = curr.ptr.record_big_endian()
-                self._outfp_write_with_check(outfp, ret)
-                be_ptr_offset += len(ret)
-                outfp.seek(orig)
+                le_ptrs += curr.ptr.record_little_endian()
+                be_ptrs += curr.ptr.record_big_endian()
                 progress.call(curr.file_length())
 
-            dir_extent = curr.extent_location()
+            dir_data = bytearray(-(-curr.data_length // log_block_size) * log_block_size)
+            dir_offset = 0
             for child in curr.children:
                 # No matter what type the child is, we need to first write out
                 # the directory record entry.
                 recstr = child.record()
-                if (curr_dirrecord_offset + len(recstr)) > self.pvd.logical_block_size():
-                    dir_extent += 1
-                    curr_dirrecord_offset = 0
-                outfp.seek(dir_extent * self.pvd.logical_block_size() + curr_dirrecord_offset)
-                # Now write out the child
-                self._outfp_write_with_check(outfp, recstr)
-                curr_dirrecord_offset += len(recstr)
+                reclen = len(recstr)
+                if (dir_offset % log_block_size) + reclen > log_block_size:
+                    dir_offset += log_block_size - (dir_offset % log_block_size)
+                if dir_offset + reclen > len(dir_data):
+                    dir_data.extend(bytearray(dir_offset + reclen - len(dir_data)))
+                dir_data[dir_offset:dir_offset + reclen] = recstr
+                dir_offset += reclen
 
                 if child.rock_ridge is not None and child.rock_ridge.dr_entries.ce_record is not None:
                     # The child has a continue block, so write it out here.
                     ce_rec = child.rock_ridge.dr_entries.ce_record
-                    outfp.seek(ce_rec.bl_cont_area * self.pvd.logical_block_size() + ce_rec.offset_cont_area)
                     rec = child.rock_ridge.record_ce_entries()
-                    self._outfp_write_with_check(outfp, rec)
+                    writer.write_at(ce_rec.bl_cont_area * log_block_size + ce_rec.offset_cont_area, rec)
                     progress.call(len(rec))
 
                 if child.rock_ridge is not None and child.rock_ridge.child_link_record_exists():
                     continue
 
-                matches_boot_catalog = self.eltorito_boot_catalog is not None and self.eltorito_boot_catalog.dirrecord == child
-                is_symlink = child.rock_ridge is not None and child.rock_ridge.is_symlink()
                 if child.is_dir():
                     # If the child is a directory, and is not dot or dotdot, we
                     # want to descend into it to look at the children.
                     if not child.is_dot() and not child.is_dotdot():
                         dirs.append(child)
-                elif child.data_length > 0 and child.target is None and not matches_boot_catalog and not is_symlink:
-                    # If the child is a file, then we need to write the
-                    # data to the output file.
-                    progress.call(self._output_directory_record(outfp, blocksize, child))
+                    continue
 
-        if self.joliet_vd is not None:
-            le_ptr_offset = 0
-            be_ptr_offset = 0
-            dirs = collections.deque([self.joliet_vd.root_directory_record()])
-            while dirs:
-                curr = dirs.popleft()
-                curr_dirrecord_offset = 0
-                if curr.is_dir():
-                    orig = outfp.tell()
-                    # Little Endian PTR
-                    outfp.seek(self.joliet_vd.path_table_location_le * self.joliet_vd.logical_block_size() + le_ptr_offset)
-                    ret = curr.ptr.record_little_endian()
-                    self._outfp_write_with_check(outfp, ret)
-                    le_ptr_offset += len(ret)
-                    # Big Endian PTR
-                    outfp.seek(self.joliet_vd.path_table_location_be * self.joliet_vd.logical_block_size() + be_ptr_offset)
-                    ret = curr.ptr.record_big_endian()
-                    self._outfp_write_with_check(outfp, ret)
-                    be_ptr_offset += len(ret)
-                    outfp.seek(orig)
-                    progress.call(curr.file_length())
-
-                dir_extent = curr.extent_location()
-                for child in curr.children:
-                    # No matter what type the child is, we need to first write
-                    # out the directory record entry.
-                    recstr = child.record()
-                    if (curr_dirrecord_offset + len(recstr)) > self.joliet_vd.logical_block_size():
-                        dir_extent += 1
-                        curr_dirrecord_offset = 0
-                    outfp.seek(dir_extent * self.joliet_vd.logical_block_size() + curr_dirrecord_offset)
-                    # Now write out the child
-                    self._outfp_write_with_check(outfp, recstr)
-                    curr_dirrecord_offset += len(recstr)
-
-                    if child.is_dir():
-                        # If the child is a directory, and is not dot or dotdot,
-                        # we want to descend into it to look at the children.
-                        if not child.is_dot() and not child.is_dotdot():
-                            dirs.append(child)
+                if not write_data:
+                    continue
 
-        # We need to pad out to the total size of the disk, in the case that
-        # the last thing we wrote is shorter than a full block size.  We used
-        # to use the truncate method to do this, but it turns out that not all
-        # file-like objects allow you to use truncate to grow the file.  Thus,
-        # we do it the old-fashioned way by seeking to the end of the object,
-        # calculating the difference between the end and what we want, and then
-        # manually writing zeros for padding.
-        outfp.seek(0, os.SEEK_END)
-        self._outfp_write_with_check(outfp,
-                                     _pad(outfp.tell(), self.pvd.space_size * self.pvd.logical_block_size()))
+                matches_boot_catalog = self.eltorito_boot_catalog is not None and self.eltorito_boot_catalog.dirrecord == child
+                is_symlink = child.rock_ridge is not None and child.rock_ridge.is_symlink()
+                if child.data_length > 0 and child.target is None and not matches_boot_catalog and not is_symlink:
+                    # If the child is a file, then we need to write the
+                    # data to the output file.
+                    if data_records is not None:
+                        data_records.append(child)
+                    else:
+                        progress.call(self._output_directory_record(writer, blocksize, child))
 
-        if self.isohybrid_mbr is not None:
-            outfp.seek(0, os.SEEK_END)
-            # Note that we very specifically do not call
-            # self._outfp_write_with_check here because this writes outside
-            # the PVD boundaries.
-            outfp.write(self.isohybrid_mbr.record_padding(self.pvd.space_size * self.pvd.logical_block_size()))
+            writer.write_at(curr.extent_location() * log_block_size, dir_data)
 
-        progress.finish()
+        writer.write_at(vd.path_table_location_le * log_block_size, le_ptrs)
+        writer.write_at(vd.path_table_location_be * log_block_size, be_ptrs)
 
     def _update_rr_ce_entry(self, rec):
         '''
@@ -2605,7 +4652,9 @@ class PyCdlib(object):
         Returns:
          A dr.DirectoryRecord object representing the path.
         '''
-        if self._needs_reshuffle:
+        # Inside of a batch the layout is settled at commit time, so don't
+        # redo it for every lookup.
+        if self._needs_reshuffle and self._batch_depth == 0:
             self._reshuffle_extents()
 
         if 'joliet_path' in kwargs:
@@ -2659,8 +4708,10 @@ class PyCdlib(object):
 
 
 ########################### PUBLIC API #####################################
-    def __init__(self, always_consistent=False):
+    def __init__(self, always_consistent=False, preserve_extents=False):
         self._always_consistent = always_consistent
+        self._preserve_extents = preserve_extents
+        self._parse_lock = threading.RLock()
         self._initialize()
 
     def new(self, interchange_level=1, sys_ident="", vol_ident="", set_size=1,
@@ -2838,12 +4889,41 @@ class PyCdlib(object):
 
         self._initialized = True
 
-    def open(self, filename):
+    def open(self, filename, lazy=False, offset=0, index=None, headers_only=False,
+             parse_joliet=True):
         '''
         Open up an existing ISO for inspection and modification.
 
         Parameters:
          filename - The filename containing the ISO to open up.
+         lazy - Whether to defer parsing of the directories below the root
+                until they are first looked up.  This makes opening large ISOs
+                much faster when only a few paths are needed.  Any operation
+                that modifies the ISO parses the remainder of the tree first.
+         offset - The byte offset of the ISO within the file, for ISOs that
+                  are embedded in a larger image; 0 by default.  All reads,
+                  and writes by modify_file_in_place, stay relative to it.
+         index - The filename of a metadata index written by save_index() for
+                 this ISO.  If the index still matches the ISO, the parsed
+                 metadata is loaded from it instead of parsing the ISO;
+                 otherwise, the ISO is parsed as usual.  Loading an index
+                 only ever creates PyCdlib's own objects, but the index is
+                 trusted to describe the ISO correctly, so only use indices
+                 from a trusted source.
+         headers_only - Whether to only parse the headers of the ISO: the
+                        volume descriptors, the El Torito boot catalog, and
+                        the isohybrid MBR, along with whether the ISO has
+                        Joliet and Rock Ridge.  This takes the same time no
+                        matter how large the ISO is, but any operation on the
+                        directory tree (including looking up paths, modifying
+                        the ISO, and writing it out) raises an exception.
+         parse_joliet - Whether to walk the Joliet directory tree when
+                        opening; True by default.  If False, the Joliet tree
+                        is walked the first time a Joliet path is looked up
+                        or the ISO is modified or written out, so nothing on
+                        the ISO is lost.  The ISO9660 tree, along with the
+                        Rock Ridge entries in its records, is always parsed,
+                        since the layout of the ISO depends on it.
         Returns:
          Nothing.
         '''
@@ -2853,12 +4933,13 @@ class PyCdlib(object):
         fp = open(filename, 'r+b')
         self._managing_fp = True
         try:
-            self._open_fp(fp)
+            self._open_fp(fp, lazy, offset, index, headers_only, parse_joliet)
         except:
             fp.close()
             raise
 
-    def open_fp(self, fp):
+    def open_fp(self, fp, lazy=False, offset=0, index=None, headers_only=False,
+                parse_joliet=True):
         '''
         Open up an existing ISO for inspection and modification.  Note that the
         file object passed in here must stay open for the lifetime of this
@@ -2868,13 +4949,58 @@ class PyCdlib(object):
 
         Parameters:
          fp - The file object containing the ISO to open up.
+         lazy - Whether to defer parsing of the directories below the root
+                until they are first looked up (see open()).
+         offset - The byte offset of the ISO within the file object (see
+                  open()).
+         index - The filename of a metadata index to load instead of parsing
+                 the ISO (see open()).
+         headers_only - Whether to only parse the headers of the ISO (see
+                        open()).
+         parse_joliet - Whether to walk the Joliet directory tree when
+                        opening (see open()).
         Returns:
          Nothing.
         '''
         if self._initialized:
             raise pycdlibexception.PyCdlibInvalidInput("This object already has an ISO; either close it or create a new object")
 
-        self._open_fp(fp)
+        self._open_fp(fp, lazy, offset, index, headers_only, parse_joliet)
+
+    def save_index(self, index):
+        '''
+        Save the parsed metadata of an opened ISO to a metadata index, so that
+        later opens of the same ISO can load it instead of parsing the ISO (see
+        open()).  The index is tied to the size, modification time, and volume
+        descriptors of the ISO, and is ignored if any of those change.  The
+        ISO must not have been modified since it was opened.
+
+        Parameters:
+         index - The filename to write the metadata index to.
+        Returns:
+         Nothing.
+        '''
+        if not self._initialized:
+            raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
+
+        if self.cdfp is None:
+            raise pycdlibexception.PyCdlibInvalidInput("Can only save an index of an ISO that was opened")
+
+        if self._batch_depth > 0 or self._needs_reshuffle:
+            raise pycdlibexception.PyCdlibInvalidInput("Cannot save an index of an ISO that has been modified")
+
+        self._parse_all_deferred_directories()
+
+        out = io.BytesIO()
+        _IndexPickler(out, self.cdfp).dump(dict((attr, getattr(self, attr)) for attr in _INDEX_ATTRS))
+
+        # Write the index under a temporary name and then move it into place,
+        # so that other processes opening the ISO never see half of it.
+        tmpname = index + '.tmp'
+        with open(tmpname, 'wb') as indexfp:
+            indexfp.write(self._index_key())
+            indexfp.write(zlib.compress(out.getvalue(), 1))
+        getattr(os, 'replace', os.rename)(tmpname, index)
 
     def get_file_from_iso(self, local_path, **kwargs):
         '''
@@ -2890,6 +5016,10 @@ class PyCdlib(object):
                    with iso_path and joliet_path).
          joliet_path - The absolute Joliet path to lookup on the ISO (exclusive
                        with iso_path and rr_path).
+         io_policy - None to copy the data normally (the default),
+                     'preallocate' to allocate the space for the file before
+                     writing it, 'nocache' to keep the data out of the page
+                     cache, or 'all' to do both.
         Returns:
          Nothing.
         '''
@@ -2913,6 +5043,10 @@ class PyCdlib(object):
                    with iso_path and joliet_path).
          joliet_path - The absolute Joliet path to lookup on the ISO (exclusive
                        with iso_path and rr_path).
+         io_policy - None to copy the data normally (the default),
+                     'preallocate' to allocate the space for the file before
+                     writing it, 'nocache' to keep the data out of the page
+                     cache, or 'all' to do both.
         Returns:
          Nothing.
         '''
@@ -2921,7 +5055,56 @@ class PyCdlib(object):
 
         self._get_file_from_iso_fp(outfp, **kwargs)
 
-    def get_and_write(self, iso_path, local_path, blocksize=8192):
+    def open_file_from_iso(self, **kwargs):
+        '''
+        Open a read-only, seekable file object for the data of a single file
+        on the ISO.  The data is read from the ISO as the file object is read,
+        so only the parts that are read are ever copied, and it can be handed
+        to anything that wants a file object (such as tarfile, zipfile, or
+        another PyCdlib object).  The file object reflects the ISO at the time
+        of this call, and must not be used after the ISO is modified or
+        closed.
+
+        Parameters:
+         iso_path - The absolute ISO9660 path to lookup on the ISO (exclusive
+                    with rr_path and joliet_path).
+         rr_path - The absolute Rock Ridge path to lookup on the ISO (exclusive
+                   with iso_path and joliet_path).
+         joliet_path - The absolute Joliet path to lookup on the ISO (exclusive
+                       with iso_path and rr_path).
+        Returns:
+         A file object (an io.RawIOBase) for the data of the file.
+        '''
+        if not self._initialized:
+            raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
+
+        joliet_path = None
+        iso_path = None
+        rr_path = None
+        num_paths = 0
+        for key in kwargs:
+            if key == "iso_path" and kwargs[key] is not None:
+                iso_path = utils.normpath(kwargs[key])
+                num_paths += 1
+            elif key == "rr_path" and kwargs[key] is not None:
+                rr_path = utils.normpath(kwargs[key])
+                num_paths += 1
+            elif key == "joliet_path" and kwargs[key] is not None:
+                joliet_path = utils.normpath(kwargs[key])
+                num_paths += 1
+            else:
+                raise pycdlibexception.PyCdlibInvalidInput("Unknown keyword %s" % (key))
+
+        if num_paths != 1:
+            raise pycdlibexception.PyCdlibInvalidInput("Exactly one of iso_path, rr_path, or joliet_path must be passed")
+
+        found_record = self._find_data_record(iso_path, rr_path, joliet_path)
+        if found_record.is_dir():
+            raise pycdlibexception.PyCdlibInvalidInput("Cannot open a directory")
+
+        return _ISOFile(found_record, self.pvd.logical_block_size())
+
+    def get_and_write(self, iso_path, local_path, blocksize=8192, io_policy=None):
         '''
         (deprecated) Fetch a single file from the ISO and write it out to the
         specified file.  Note that this will overwrite the contents of the local
@@ -2936,6 +5119,10 @@ class PyCdlib(object):
          iso_path - The absolute path to the file to get data from.
          local_path - The local filename to write the contents to.
          blocksize - The blocksize to use when copying data; the default is 8192.
+         io_policy - None to copy the data normally (the default),
+                     'preallocate' to allocate the space for the file before
+                     writing it, 'nocache' to keep the data out of the page
+                     cache, or 'all' to do both.
         Returns:
          Nothing.
         '''
@@ -2943,9 +5130,9 @@ class PyCdlib(object):
             raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
 
         with open(local_path, 'wb') as fp:
-            self._get_and_write_fp(iso_path, fp, blocksize)
+            self._get_and_write_fp(iso_path, fp, blocksize, io_policy)
 
-    def get_and_write_fp(self, iso_path, outfp, blocksize=8192):
+    def get_and_write_fp(self, iso_path, outfp, blocksize=8192, io_policy=None):
         '''
         (deprecated) Fetch a single file from the ISO and write it out to the
         file object.  Note that 'iso_path' must be an absolute path to the file.
@@ -2959,15 +5146,145 @@ class PyCdlib(object):
          iso_path - The absolute path to the file to get data from.
          outfp - The file object to write data to.
          blocksize - The blocksize to use when copying data; the default is 8192.
+         io_policy - None to copy the data normally (the default),
+                     'preallocate' to allocate the space for the file before
+                     writing it, 'nocache' to keep the data out of the page
+                     cache, or 'all' to do both.  These only have an effect
+                     if outfp has a file descriptor.
+        Returns:
+         Nothing.
+        '''
+        if not self._initialized:
+            raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
+
+        self._get_and_write_fp(iso_path, outfp, blocksize, io_policy)
+
+    def extract_tree(self, src_path, dest_dir, namespace=None, workers=1, blocksize=8192):
+        '''
+        Extract a directory on the ISO, and everything underneath it, to a
+        local directory.  The tree is walked once, and then the files are
+        extracted in the order that their data is laid out on the ISO, so that
+        the ISO is read from start to end.  When extracting the Rock Ridge
+        namespace, symlinks are recreated and the Rock Ridge file modes and
+        times are applied; otherwise, the modification times are taken from
+        the directory records.  Symlinks are created with their targets as-is,
+        including absolute targets and targets with '..' in them, but nothing
+        is ever extracted through a symlink, and an ISO with two entries of
+        the same name in a directory is refused.
+
+        Parameters:
+         src_path - The absolute path of the directory on the ISO to extract,
+                    in the namespace being extracted.
+         dest_dir - The local directory to extract into; it is created if it
+                    does not exist.
+         namespace - The namespace to extract; one of 'iso', 'rr', or
+                     'joliet'.  If None (the default), Rock Ridge is used if
+                     the ISO has it, then Joliet, then ISO9660.
+         workers - The number of threads to extract files with; set to 1 (no
+                   extra threads) by default.
+         blocksize - The number of bytes in each transfer.
         Returns:
          Nothing.
         '''
         if not self._initialized:
             raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
 
-        self._get_and_write_fp(iso_path, outfp, blocksize)
+        if namespace is None:
+            if self.rock_ridge is not None:
+                namespace = 'rr'
+            elif self.joliet_vd is not None:
+                namespace = 'joliet'
+            else:
+                namespace = 'iso'
+
+        if self._needs_reshuffle:
+            self._reshuffle_extents()
+
+        src_path = utils.normpath(src_path)
+        if namespace == 'rr':
+            if self.rock_ridge is None:
+                raise pycdlibexception.PyCdlibInvalidInput("Cannot extract a Rock Ridge tree from a non-Rock Ridge ISO")
+            rec = self._find_rr_record(src_path)
+        elif namespace == 'joliet':
+            if self.joliet_vd is None:
+                raise pycdlibexception.PyCdlibInvalidInput("Cannot extract a Joliet tree from a non-Joliet ISO")
+            rec = self._find_joliet_record(src_path)
+        elif namespace == 'iso':
+            rec = self._find_iso_record(src_path)
+        else:
+            raise pycdlibexception.PyCdlibInvalidInput("Invalid namespace %s; must be one of 'iso', 'rr', or 'joliet'" % (namespace))
+
+        if not rec.is_dir():
+            raise pycdlibexception.PyCdlibInvalidInput("Can only extract a directory")
+
+        if not os.path.isdir(dest_dir):
+            os.makedirs(dest_dir)
+
+        # Walk the whole tree first, creating the directories and symlinks,
+        # and gathering up the files to extract.
+        dirs = []
+        files = []
+        todo = collections.deque([(rec, dest_dir)])
+        while todo:
+            (curr, curr_path) = todo.popleft()
+            self._parse_deferred_directory(curr)
+            names = set()
+            for child in _yield_children(curr):
+                if child.is_dot() or child.is_dotdot():
+                    continue
+                if namespace == 'rr' and child.rock_ridge is not None and child.rock_ridge.relocated_record() and child.parent is curr:
+                    # Relocated directories are extracted where their child
+                    # link is (_yield_children follows the link for us), not
+                    # in the rr_moved directory.
+                    continue
+
+                name = _extract_name(child, namespace)
+                # A second entry with the same name would be extracted on top
+                # of the first one, and through it if the first one is a
+                # symlink, so the ISO is refused instead.
+                if os.path.normcase(name) in names:
+                    raise pycdlibexception.PyCdlibInvalidISO("Cannot extract a second entry named %s" % (name))
+                names.add(os.path.normcase(name))
+
+                path = os.path.join(curr_path, name)
+                if namespace == 'rr' and child.rock_ridge is not None and child.rock_ridge.is_symlink():
+                    os.symlink(child.rock_ridge.symlink_path().decode('utf-8'), path)
+                elif child.is_dir():
+                    try:
+                        os.mkdir(path)
+                    except OSError:
+                        # Extracting into a directory that is already there
+                        # is fine, but a symlink to one is not followed.
+                        if not stat.S_ISDIR(os.lstat(path).st_mode):
+                            raise
+                    dirs.append((child, path))
+                    todo.append((child, path))
+                else:
+                    files.append((child, path))
+
+        files.sort(key=lambda f: f[0].extent_location())
+
+        lock = threading.Lock()
+        if workers > 1:
+            pool = multiprocessing.pool.ThreadPool(workers)
+            try:
+                for unused in pool.imap_unordered(lambda f: self._extract_file(f[0], f[1], blocksize, lock), files):
+                    pass
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            for (child, path) in files:
+                self._extract_file(child, path, blocksize, lock)
 
-    def write(self, filename, blocksize=8192, progress_cb=None, progress_opaque=None):
+        # The directories are done last, and from the bottom up, so that
+        # extracting their contents doesn't change their times, and so that
+        # read-only modes don't get in the way.
+        for (child, path) in files + dirs[::-1]:
+            _set_extracted_metadata(child, path, namespace)
+
+    def write(self, filename, blocksize=8192, progress_cb=None, progress_opaque=None, workers=1, sparse=False,
+              sparse_data=False, io_policy=None, offset=0):
         '''
         Write a properly formatted ISO out to the filename passed in.  This
         also goes by the name of "mastering".
@@ -2979,16 +5296,46 @@ class PyCdlib(object):
                        work.  The callback function must have a signature of:
                        def func(done, total, opaque).
          progress_opaque - User data to be passed to the progress callback.
+         workers - The number of threads to copy file data with; set to 1 (no
+                   extra threads) by default.
+         sparse - Whether to leave the blocks of zeros in the padding and
+                  metadata of the ISO as holes in the file, instead of
+                  writing them; set to False by default.
+         sparse_data - Whether to also leave blocks of zeros in the file data
+                       as holes, which means reading and checking all of the
+                       file data; this requires sparse, and is set to False
+                       by default.
+         io_policy - None to write the ISO out normally (the default),
+                     'preallocate' to allocate the space for the ISO before
+                     writing it, 'nocache' to keep the file data and the ISO
+                     out of the page cache, or 'all' to do both.
+         offset - The byte offset to write the ISO at within the file, for
+                  ISOs that are embedded in a larger image; 0 by default.  If
+                  not 0 and the file already exists, it is not truncated and
+                  everything outside of the ISO is kept.  The sparse, workers
+                  and io_policy options cannot be used with an offset.
         Returns:
          Nothing.
         '''
         if not self._initialized:
             raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
 
-        with open(filename, 'wb') as fp:
-            self._write_fp(fp, blocksize, progress_cb, progress_opaque)
+        self._parse_all_deferred_directories()
+
+        # Check this before the file is opened, so that a bad combination
+        # doesn't leave an empty file behind.
+        _check_offset_options(offset, workers, sparse, io_policy)
 
-    def write_fp(self, outfp, blocksize=8192, progress_cb=None, progress_opaque=None):
+        mode = 'wb'
+        if offset > 0 and os.path.exists(filename):
+            mode = 'r+b'
+        with open(filename, mode) as fp:
+            self._write_fp(fp, blocksize, progress_cb, progress_opaque, workers,
+                           sparse=sparse, sparse_data=sparse_data,
+                           io_policy=io_policy, offset=offset)
+
+    def write_fp(self, outfp, blocksize=8192, progress_cb=None, progress_opaque=None, workers=1, stream=False,
+                 sparse=False, sparse_data=False, io_policy=None, offset=0):
         '''
         Write a properly formatted ISO out to the file object passed in.  This
         also goes by the name of "mastering".
@@ -3000,13 +5347,111 @@ class PyCdlib(object):
                        work.  The callback function must have a signature of:
                        def func(done, total, opaque).
          progress_opaque - User data to be passed to the progress callback.
+         workers - The number of threads to copy file data with; set to 1 (no
+                   extra threads) by default.  This only has an effect if
+                   outfp has a file descriptor.
+         stream - Whether to write the ISO out strictly from start to end,
+                  without seeking, as needed for pipes, sockets and
+                  compressors.  This is done automatically if outfp reports
+                  that it is not seekable; set to False by default.
+         sparse - Whether to leave the blocks of zeros in the padding and
+                  metadata of the ISO as holes, instead of writing them.  This
+                  only has an effect if outfp is a regular file and the ISO is
+                  not being streamed; set to False by default.  Since the
+                  holes have to read back as zeros, outfp is truncated to
+                  zero length first, discarding anything already in it.
+         sparse_data - Whether to also leave blocks of zeros in the file data
+                       as holes, which means reading and checking all of the
+                       file data; this requires sparse, and is set to False
+                       by default.
+         io_policy - None to write the ISO out normally (the default),
+                     'preallocate' to allocate the space for the ISO before
+                     writing it, 'nocache' to keep the file data and the ISO
+                     out of the page cache, or 'all' to do both.  These only
+                     have an effect if outfp is a regular file.
+         offset - The byte offset to write the ISO at within outfp, which
+                  must then be seekable; 0 by default.  Everything in outfp
+                  outside of the ISO is left alone.  The sparse, workers and
+                  io_policy options cannot be used with an offset.
         Returns:
          Nothing.
         '''
         if not self._initialized:
             raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
 
-        self._write_fp(outfp, blocksize, progress_cb, progress_opaque)
+        self._parse_all_deferred_directories()
+
+        self._write_fp(outfp, blocksize, progress_cb, progress_opaque, workers, stream,
+                       sparse, sparse_data, io_policy, offset)
+
+    def open_image(self):
+        '''
+        Open a read-only, seekable file object that reads as the ISO that
+        write_fp() would produce.  Only the metadata is generated up front;
+        the file data is read from its source as the corresponding part of
+        the image is read, so the full image is never built.  The image
+        reflects the ISO at the time of this call, and the file objects the
+        data comes from must stay open while it is in use.
+
+        Parameters:
+         None.
+        Returns:
+         A file object (an io.RawIOBase) for the image.
+        '''
+        if not self._initialized:
+            raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
+
+        self._parse_all_deferred_directories()
+
+        if self._batch_depth > 0:
+            raise pycdlibexception.PyCdlibInvalidInput("Cannot open the image while a batch is in progress; call commit_batch() first")
+
+        if self._needs_reshuffle:
+            self._reshuffle_extents()
+
+        return self._virtual_image()
+
+    def layout(self):
+        '''
+        Get the layout of the ISO that write_fp() would produce, without
+        writing anything.  The layout is an ordered list of regions that
+        together cover the whole image: runs of zeros, metadata (with the
+        bytes to write), and file data (with where to copy it from).  File
+        data regions may be shorter than their source claims, in which case
+        the rest of the region is zeros, just as when writing.
+
+        Parameters:
+         None.
+        Returns:
+         A list of LayoutRegion namedtuples of (offset, length, kind, data,
+         source, source_offset, record), ordered by offset.
+        '''
+        if not self._initialized:
+            raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
+
+        self._parse_all_deferred_directories()
+
+        if self._batch_depth > 0:
+            raise pycdlibexception.PyCdlibInvalidInput("Cannot get the layout while a batch is in progress; call commit_batch() first")
+
+        if self._needs_reshuffle:
+            self._reshuffle_extents()
+
+        log_block_size = self.pvd.logical_block_size()
+        regions = []
+        for (offset, length, source) in self._virtual_image().regions():
+            if source is None:
+                regions.append(LayoutRegion(offset, length, "zero", None, None, None, None))
+            elif isinstance(source, bytes):
+                regions.append(LayoutRegion(offset, length, "metadata", source, None, None, None))
+            else:
+                (rec, data_offset) = source
+                opener = dr.DROpenData(rec, log_block_size)
+                regions.append(LayoutRegion(offset, length, "file", None,
+                                            opener.drobj.data_fp,
+                                            opener.data_offset() + data_offset,
+                                            rec))
+        return regions
 
     def add_fp(self, fp, length, iso_path, rr_name=None, joliet_path=None, file_mode=None):
         '''
@@ -3029,6 +5474,8 @@ class PyCdlib(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
 
+        self._parse_all_deferred_directories()
+
         self._add_fp(fp, length, False, iso_path, rr_name, joliet_path, file_mode)
 
     def add_file(self, filename, iso_path, rr_name=None, joliet_path=None, file_mode=None):
@@ -3050,6 +5497,8 @@ class PyCdlib(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
 
+        self._parse_all_deferred_directories()
+
         self._add_fp(filename, os.stat(filename).st_size, True, iso_path, rr_name, joliet_path, file_mode)
 
     def modify_file_in_place(self, fp, length, iso_path, rr_name=None, joliet_path=None):
@@ -3071,7 +5520,9 @@ class PyCdlib(object):
             extent boundary.
 
         Unlike all other APIs in PyCdlib, this API actually modifies the
-        originally opened on-disk file, so use it with caution.
+        originally opened on-disk file, so use it with caution.  For an ISO
+        that was opened at an offset within its file, the modifications are
+        made at that same offset.
 
         Parameters:
          fp - The file object to use for the contents of the new file.
@@ -3085,6 +5536,8 @@ class PyCdlib(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
 
+        self._parse_all_deferred_directories()
+
         if hasattr(self.cdfp, 'mode') and not self.cdfp.mode.startswith(('r+', 'w', 'a', 'rb+')):
             raise pycdlibexception.PyCdlibInvalidInput("To modify a file in place, the original ISO must have been opened in a write mode (r+, w, or a)")
 
@@ -3196,6 +5649,8 @@ class PyCdlib(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
 
+        self._parse_all_deferred_directories()
+
         self._add_hard_link(**kwargs)
 
     def rm_hard_link(self, iso_path=None, joliet_path=None):
@@ -3221,6 +5676,8 @@ class PyCdlib(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
 
+        self._parse_all_deferred_directories()
+
         if iso_path is not None and joliet_path is not None:
             raise pycdlibexception.PyCdlibInvalidInput("Only one of iso_path or joliet_path arguments can be passed")
 
@@ -3322,6 +5779,8 @@ class PyCdlib(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
 
+        self._parse_all_deferred_directories()
+
         if iso_path is None and joliet_path is None:
             raise pycdlibexception.PyCdlibInvalidInput("Either iso_path or joliet_path must be passed")
 
@@ -3477,6 +5936,8 @@ class PyCdlib(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
 
+        self._parse_all_deferred_directories()
+
         iso_path = utils.normpath(iso_path)
 
         if bytes(bytearray([iso_path[0]])) != b'/':
@@ -3536,6 +5997,8 @@ class PyCdlib(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
 
+        self._parse_all_deferred_directories()
+
         if iso_path is None and joliet_path is None:
             raise pycdlibexception.PyCdlibInvalidInput("Either iso_path or joliet_path must be passed")
 
@@ -3662,6 +6125,8 @@ class PyCdlib(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
 
+        self._parse_all_deferred_directories()
+
         # In order to add an El Torito boot, we need to do the following:
         # 1.  Find the boot file record (which must already exist).
         # 2.  Construct a BootRecord.
@@ -3779,6 +6244,8 @@ class PyCdlib(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
 
+        self._parse_all_deferred_directories()
+
         if self.eltorito_boot_catalog is None:
             raise pycdlibexception.PyCdlibInvalidInput("This ISO doesn't have an El Torito Boot Record")
 
@@ -3840,6 +6307,8 @@ class PyCdlib(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
 
+        self._parse_all_deferred_directories()
+
         if self.rock_ridge is None:
             raise pycdlibexception.PyCdlibInvalidInput("Can only add symlinks to a Rock Ridge ISO")
 
@@ -3898,6 +6367,7 @@ class PyCdlib(object):
         else:
             rec = self._get_entry(iso_path=iso_path)
 
+        self._parse_deferred_directory(rec)
         for c in _yield_children(rec):
             yield c
 
@@ -3944,6 +6414,7 @@ class PyCdlib(object):
         else:
             rec = self._get_entry(iso_path=iso_path)
 
+        self._parse_deferred_directory(rec)
         for c in _yield_children(rec):
             yield c
 
@@ -4007,6 +6478,146 @@ class PyCdlib(object):
             return self._get_entry(iso_path=rr_path)
         return self._get_entry(iso_path=iso_path)
 
+    def batch(self):
+        '''
+        Get a context manager that batches all of the modifications made
+        inside of it.  This is equivalent to calling begin_batch() on entry
+        and commit_batch() on exit; see those for the details.  Note that the
+        batch is committed even if the block raises an exception; there is
+        no rollback.
+
+        Parameters:
+         None.
+        Returns:
+         A context manager that returns this object on entry.
+        '''
+        return _Batch(self)
+
+    def begin_batch(self):
+        '''
+        Start batching modifications to the ISO.  Until the matching call to
+        commit_batch(), adding and removing entries only inserts them into (or
+        removes them from) their parent directory; laying out the directory
+        records, growing or shrinking the directories, and reassigning the
+        extents on the ISO are all done once at commit time.  Batches may be
+        nested, in which case the work is done when the outermost batch is
+        committed.  The ISO cannot be written out while a batch is in
+        progress, and the extents of records looked up during a batch are
+        not meaningful until it is committed.
+
+        Parameters:
+         None.
+        Returns:
+         Nothing.
+        '''
+        if not self._initialized:
+            raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
+
+        self._parse_all_deferred_directories()
+
+        if self._batch_depth == 0:
+            self._batch_always_consistent = self._always_consistent
+            self._always_consistent = False
+        self._batch_depth += 1
+
+    def commit_batch(self):
+        '''
+        Finish a batch of modifications started by begin_batch().  When the
+        outermost batch is committed, every directory that was modified is
+        laid out once, the sizes of the Volume Descriptors are updated to
+        match, and, if this object was created with always_consistent, the
+        extents on the ISO are reassigned.
+
+        Parameters:
+         None.
+        Returns:
+         Nothing.
+        '''
+        if self._batch_depth == 0:
+            raise pycdlibexception.PyCdlibInvalidInput("No batch is in progress; call begin_batch() first")
+
+        self._batch_depth -= 1
+        if self._batch_depth > 0:
+            return
+
+        dirty = self._batch_dirty
+        self._batch_dirty = {}
+        self._always_consistent = self._batch_always_consistent
+
+        for dir_record, logical_block_size in dirty.values():
+            delta = dir_record.update_layout(logical_block_size)
+            if delta == 0:
+                continue
+            for pvd in self.pvds:
+                if delta > 0:
+                    pvd.add_to_space_size(delta * pvd.logical_block_size())
+                else:
+                    pvd.remove_from_space_size(-delta * pvd.logical_block_size())
+            if self.joliet_vd is not None:
+                if delta > 0:
+                    self.joliet_vd.add_to_space_size(delta * self.joliet_vd.logical_block_size())
+                else:
+                    self.joliet_vd.remove_from_space_size(-delta * self.joliet_vd.logical_block_size())
+
+        if self.enhanced_vd is not None:
+            self.enhanced_vd.copy_sizes(self.pvd)
+
+        if self._always_consistent:
+            self._reshuffle_extents()
+        else:
+            self._needs_reshuffle = True
+
+    def get_record_by_extent(self, extent, joliet=False):
+        '''
+        Get the directory record that owns the data at a particular extent.
+        Directories, and files with data, own the extents they start at; the
+        dot and dotdot entries, zero-length files, Rock Ridge symlinks, and
+        Rock Ridge child link placeholders never do.  If several hard links
+        share the extent, the first one in the directory tree is returned.
+
+        Parameters:
+         extent - The extent to look up.
+         joliet - Whether to look the extent up in the Joliet directory tree
+                  instead of the ISO9660 one.
+        Returns:
+         A dr.DirectoryRecord object that owns the extent.
+        '''
+        if not self._initialized:
+            raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
+
+        self._parse_all_deferred_directories()
+
+        if self._needs_reshuffle:
+            self._reshuffle_extents()
+
+        vd = self.pvd
+        if joliet:
+            if self.joliet_vd is None:
+                raise pycdlibexception.PyCdlibInvalidInput("Cannot look up a Joliet extent on a non-Joliet ISO")
+            vd = self.joliet_vd
+
+        return vd.find_dirrecord_by_extent(extent)
+
+    def path_index_info(self):
+        '''
+        Get the statistics for the path lookup indices.  There is one index
+        for each of the ISO9660, Rock Ridge, and Joliet namespaces; each is
+        filled in as paths are looked up, and is updated as entries are
+        removed from the ISO.
+
+        Parameters:
+         None.
+        Returns:
+         A dictionary mapping each of 'iso', 'rr', and 'joliet' to a
+         PathIndexInfo namedtuple of (hits, misses, currsize).
+        '''
+        if not self._initialized:
+            raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
+
+        return {'iso': self._iso_index.info(),
+                'rr': self._rr_index.info(),
+                'joliet': self._joliet_index.info()}
+
     def add_isohybrid(self, part_entry=1, mbr_id=None,
                       part_offset=0, geometry_sectors=32, geometry_heads=64,
                       part_type=0x17, mac=False):
@@ -4129,6 +6740,8 @@ class PyCdlib(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
 
+        self._parse_all_deferred_directories()
+
         for pvd in self.pvds:
             pvd.add_to_space_size(pvd.logical_block_size())
 
@@ -4160,6 +6773,8 @@ class PyCdlib(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
 
+        self._parse_all_deferred_directories()
+
         if len([x for x in [iso_path, rr_path, joliet_path] if x is not None]) != 1:
             raise pycdlibexception.PyCdlibInvalidInput("Must provide exactly one of iso_path, rr_path, or joliet_path")
 
@@ -4190,6 +6805,8 @@ class PyCdlib(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
 
+        self._parse_all_deferred_directories()
+
         if len([x for x in [iso_path, rr_path, joliet_path] if x is not None]) != 1:
             raise pycdlibexception.PyCdlibInvalidInput("Must provide exactly one of iso_path, rr_path, or joliet_path")
 
@@ -4216,12 +6833,14 @@ class PyCdlib(object):
         Parameters:
          None.
         Returns:
-         Nothing.
+         The number of directory and file data extents that changed location.
         '''
         if not self._initialized:
             raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
 
-        self._reshuffle_extents()
+        self._parse_all_deferred_directories()
+
+        return self._reshuffle_extents()
 
     def set_relocated_name(self, name, rr_name):
         '''
@@ -4238,6 +6857,8 @@ class PyCdlib(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
 
+        self._parse_all_deferred_directories()
+
         if self.rock_ridge is None:
             raise pycdlibexception.PyCdlibInvalidInput("Can only set the relocated name on a Rock Ridge ISO")
 
@@ -4266,6 +6887,19 @@ class PyCdlib(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInvalidInput("This object is not yet initialized; call either open() or new() to create an ISO")
 
+        if self._cdmap is not None:
+            mapped = self._cdmap.obj
+            # On an ISO opened at an offset, the view is a slice of the map,
+            # and both have to be released before the map can be closed.
+            self._cdview.release()
+            self._cdmap.release()
+            try:
+                mapped.close()
+            except BufferError:
+                # Something still holds a slice of the map; it will be
+                # unmapped when that is garbage collected.
+                pass
+
         if self._managing_fp:
             # In this case, we are managing self.cdfp, so we need to close it
             self.cdfp.close()
@@ -38,6 +38,9 @@ class RRSPRecord(object):
     '''
     __slots__ = ['_initialized', 'bytes_to_skip']
 
+    FMT = "=BBBBB"
+    STRUCT = struct.Struct(FMT)
+
     def __init__(self):
         self._initialized = False
 
@@ -53,8 +56,11 @@ class RRSPRecord(object):
         if self._initialized:
             raise pycdlibexception.PyCdlibInternalError("SP record already initialized!")
 
+        if len(rrstr) < 2 + self.STRUCT.size:
+            raise pycdlibexception.PyCdlibInvalidISO("SP record too short")
+
         (su_len, su_entry_version_unused, check_byte1, check_byte2,
-         self.bytes_to_skip) = struct.unpack_from("=BBBBB", rrstr[:7], 2)
+         self.bytes_to_skip) = self.STRUCT.unpack_from(rrstr, 2)
 
         # We assume that the caller has already checked the su_entry_version,
         # so we don't bother.
@@ -93,7 +99,7 @@ class RRSPRecord(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInternalError("SP record not yet initialized!")
 
-        return b'SP' + struct.pack("=BBBBB", RRSPRecord.length(), SU_ENTRY_VERSION, 0xbe, 0xef, self.bytes_to_skip)
+        return b'SP' + self.STRUCT.pack(RRSPRecord.length(), SU_ENTRY_VERSION, 0xbe, 0xef, self.bytes_to_skip)
 
     @staticmethod
     def length():
@@ -116,6 +122,9 @@ class RRRRRecord(object):
     '''
     __slots__ = ['_initialized', 'rr_flags']
 
+    FMT = "=BBB"
+    STRUCT = struct.Struct(FMT)
+
     def __init__(self):
         self.rr_flags = None
         self._initialized = False
@@ -132,8 +141,10 @@ class RRRRRecord(object):
         if self._initialized:
             raise pycdlibexception.PyCdlibInternalError("RR record already initialized!")
 
-        (su_len, su_entry_version_unused, self.rr_flags) = struct.unpack_from("=BBB",
-                                                                              rrstr[:5], 2)
+        if len(rrstr) < 2 + self.STRUCT.size:
+            raise pycdlibexception.PyCdlibInvalidISO("RR record too short")
+
+        (su_len, su_entry_version_unused, self.rr_flags) = self.STRUCT.unpack_from(rrstr, 2)
 
         # We assume that the caller has already checked the su_entry_version,
         # so we don't bother.
@@ -204,7 +215,7 @@ class RRRRRecord(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInternalError("RR record not yet initialized!")
 
-        return b'RR' + struct.pack("=BBB", RRRRRecord.length(), SU_ENTRY_VERSION, self.rr_flags)
+        return b'RR' + self.STRUCT.pack(RRRRRecord.length(), SU_ENTRY_VERSION, self.rr_flags)
 
     @staticmethod
     def length():
@@ -228,6 +239,9 @@ class RRCERecord(object):
     '''
     __slots__ = ['_initialized', 'bl_cont_area', 'offset_cont_area', 'len_cont_area']
 
+    FMT = "=BBLLLLLL"
+    STRUCT = struct.Struct(FMT)
+
     def __init__(self):
         self._initialized = False
 
@@ -244,9 +258,12 @@ class RRCERecord(object):
         if self._initialized:
             raise pycdlibexception.PyCdlibInternalError("CE record already initialized!")
 
+        if len(rrstr) < 2 + self.STRUCT.size:
+            raise pycdlibexception.PyCdlibInvalidISO("CE record too short")
+
         (su_len, su_entry_version_unused, bl_cont_area_le, bl_cont_area_be,
          offset_cont_area_le, offset_cont_area_be,
-         len_cont_area_le, len_cont_area_be) = struct.unpack_from("=BBLLLLLL", rrstr[:28], 2)
+         len_cont_area_le, len_cont_area_be) = self.STRUCT.unpack_from(rrstr, 2)
 
         # We assume that the caller has already checked the su_entry_version,
         # so we don't bother.
@@ -342,15 +359,14 @@ class RRCERecord(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInternalError("CE record not yet initialized!")
 
-        return b'CE' + struct.pack("=BBLLLLLL",
-                                   RRCERecord.length(),
-                                   SU_ENTRY_VERSION,
-                                   self.bl_cont_area,
-                                   utils.swab_32bit(self.bl_cont_area),
-                                   self.offset_cont_area,
-                                   utils.swab_32bit(self.offset_cont_area),
-                                   self.len_cont_area,
-                                   utils.swab_32bit(self.len_cont_area))
+        return b'CE' + self.STRUCT.pack(RRCERecord.length(),
+                                        SU_ENTRY_VERSION,
+                                        self.bl_cont_area,
+                                        utils.swab_32bit(self.bl_cont_area),
+                                        self.offset_cont_area,
+                                        utils.swab_32bit(self.offset_cont_area),
+                                        self.len_cont_area,
+                                        utils.swab_32bit(self.len_cont_area))
 
     @staticmethod
     def length():
@@ -374,6 +390,10 @@ class RRPXRecord(object):
     '''
     __slots__ = ['_initialized', 'posix_file_mode', 'posix_file_links', 'posix_user_id', 'posix_group_id', 'posix_serial_number']
 
+    FMT = "=BBLLLLLLLL"
+    STRUCT = struct.Struct(FMT)
+    SERIAL_STRUCT = struct.Struct("=LL")
+
     def __init__(self):
         self.posix_file_mode = None
         self.posix_file_links = None
@@ -395,10 +415,13 @@ class RRPXRecord(object):
         if self._initialized:
             raise pycdlibexception.PyCdlibInternalError("PX record already initialized!")
 
+        if len(rrstr) < 2 + self.STRUCT.size:
+            raise pycdlibexception.PyCdlibInvalidISO("PX record too short")
+
         (su_len, su_entry_version_unused, posix_file_mode_le, posix_file_mode_be,
          posix_file_links_le, posix_file_links_be, posix_file_user_id_le,
          posix_file_user_id_be, posix_file_group_id_le,
-         posix_file_group_id_be) = struct.unpack_from("=BBLLLLLLLL", rrstr[:38], 2)
+         posix_file_group_id_be) = self.STRUCT.unpack_from(rrstr, 2)
 
         # We assume that the caller has already checked the su_entry_version,
         # so we don't bother.
@@ -421,9 +444,11 @@ class RRPXRecord(object):
             posix_file_serial_number_le = 0
             rr_version = "1.09"
         elif su_len == 44:
+            if len(rrstr) < 36 + self.SERIAL_STRUCT.size:
+                raise pycdlibexception.PyCdlibInvalidISO("PX record too short")
+
             (posix_file_serial_number_le,
-             posix_file_serial_number_be) = struct.unpack_from("=LL",
-                                                               rrstr[:44], 36)
+             posix_file_serial_number_be) = self.SERIAL_STRUCT.unpack_from(rrstr, 36)
             if posix_file_serial_number_le != utils.swab_32bit(posix_file_serial_number_be):
                 raise pycdlibexception.PyCdlibInvalidISO("PX record big and little-endian file serial number do not agree")
 
@@ -474,18 +499,18 @@ class RRPXRecord(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInternalError("PX record not yet initialized!")
 
-        outlist = [b'PX', struct.pack("=BBLLLLLLLL", RRPXRecord.length(rr_version),
-                                      SU_ENTRY_VERSION, self.posix_file_mode,
-                                      utils.swab_32bit(self.posix_file_mode),
-                                      self.posix_file_links,
-                                      utils.swab_32bit(self.posix_file_links),
-                                      self.posix_user_id,
-                                      utils.swab_32bit(self.posix_user_id),
-                                      self.posix_group_id,
-                                      utils.swab_32bit(self.posix_group_id))]
+        outlist = [b'PX', self.STRUCT.pack(RRPXRecord.length(rr_version),
+                                           SU_ENTRY_VERSION, self.posix_file_mode,
+                                           utils.swab_32bit(self.posix_file_mode),
+                                           self.posix_file_links,
+                                           utils.swab_32bit(self.posix_file_links),
+                                           self.posix_user_id,
+                                           utils.swab_32bit(self.posix_user_id),
+                                           self.posix_group_id,
+                                           utils.swab_32bit(self.posix_group_id))]
         if rr_version == "1.12":
-            outlist.append(struct.pack("=LL", self.posix_serial_number,
-                                       utils.swab_32bit(self.posix_serial_number)))
+            outlist.append(self.SERIAL_STRUCT.pack(self.posix_serial_number,
+                                                   utils.swab_32bit(self.posix_serial_number)))
         elif rr_version != "1.09":
             # This should never happen
             raise pycdlibexception.PyCdlibInternalError("Invalid rr_version")
@@ -518,6 +543,9 @@ class RRERRecord(object):
     '''
     __slots__ = ['_initialized', 'ext_id', 'ext_des', 'ext_src', 'ext_ver']
 
+    FMT = "=BBBBBB"
+    STRUCT = struct.Struct(FMT)
+
     def __init__(self):
         self.ext_id = None
         self.ext_des = None
@@ -536,8 +564,11 @@ class RRERRecord(object):
         if self._initialized:
             raise pycdlibexception.PyCdlibInternalError("ER record already initialized!")
 
+        if len(rrstr) < 2 + self.STRUCT.size:
+            raise pycdlibexception.PyCdlibInvalidISO("ER record too short")
+
         (su_len, su_entry_version_unused, len_id, len_des, len_src,
-         self.ext_ver) = struct.unpack_from("=BBBBBB", rrstr[:8], 2)
+         self.ext_ver) = self.STRUCT.unpack_from(rrstr, 2)
 
         # We assume that the caller has already checked the su_entry_version,
         # so we don't bother.
@@ -552,8 +583,12 @@ class RRERRecord(object):
         if total_length > su_len or total_length > len(rrstr):
             raise pycdlibexception.PyCdlibInvalidISO("Combined length of ER ID, des, and src longer than record")
 
-        fmtstr = "=%ds%ds%ds" % (len_id, len_des, len_src)
-        (self.ext_id, self.ext_des, self.ext_src) = struct.unpack_from(fmtstr, rrstr, 8)
+        offset = 8
+        self.ext_id = bytes(rrstr[offset:offset + len_id])
+        offset += len_id
+        self.ext_des = bytes(rrstr[offset:offset + len_des])
+        offset += len_des
+        self.ext_src = bytes(rrstr[offset:offset + len_src])
 
         self._initialized = True
 
@@ -591,7 +626,7 @@ class RRERRecord(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInternalError("ER record not yet initialized!")
 
-        return b'ER' + struct.pack("=BBBBBB", RRERRecord.length(self.ext_id, self.ext_des, self.ext_src), SU_ENTRY_VERSION, len(self.ext_id), len(self.ext_des), len(self.ext_src), self.ext_ver) + self.ext_id + self.ext_des + self.ext_src
+        return b'ER' + self.STRUCT.pack(RRERRecord.length(self.ext_id, self.ext_des, self.ext_src), SU_ENTRY_VERSION, len(self.ext_id), len(self.ext_des), len(self.ext_src), self.ext_ver) + self.ext_id + self.ext_des + self.ext_src
 
     @staticmethod
     def length(ext_id, ext_des, ext_src):
@@ -615,6 +650,9 @@ class RRESRecord(object):
     '''
     __slots__ = ['_initialized', 'extension_sequence']
 
+    FMT = "=BBB"
+    STRUCT = struct.Struct(FMT)
+
     def __init__(self):
         self.extension_sequence = None
         self._initialized = False
@@ -634,7 +672,10 @@ class RRESRecord(object):
         # We assume that the caller has already checked the su_entry_version,
         # so we don't bother.
 
-        (su_len, su_entry_version_unused, self.extension_sequence) = struct.unpack_from("=BBB", rrstr[:5], 2)
+        if len(rrstr) < 2 + self.STRUCT.size:
+            raise pycdlibexception.PyCdlibInvalidISO("ES record too short")
+
+        (su_len, su_entry_version_unused, self.extension_sequence) = self.STRUCT.unpack_from(rrstr, 2)
         if su_len != RRESRecord.length():
             raise pycdlibexception.PyCdlibInvalidISO("Invalid length on rock ridge extension")
 
@@ -667,7 +708,7 @@ class RRESRecord(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInternalError("ES record not yet initialized!")
 
-        return b'ES' + struct.pack("=BBB", RRESRecord.length(), SU_ENTRY_VERSION, self.extension_sequence)
+        return b'ES' + self.STRUCT.pack(RRESRecord.length(), SU_ENTRY_VERSION, self.extension_sequence)
 
     @staticmethod
     def length():
@@ -690,6 +731,9 @@ class RRPNRecord(object):
     '''
     __slots__ = ['_initialized', 'dev_t_high', 'dev_t_low']
 
+    FMT = "=BBLLLL"
+    STRUCT = struct.Struct(FMT)
+
     def __init__(self):
         self.dev_t_high = None
         self.dev_t_low = None
@@ -707,8 +751,11 @@ class RRPNRecord(object):
         if self._initialized:
             raise pycdlibexception.PyCdlibInternalError("PN record already initialized!")
 
+        if len(rrstr) < 2 + self.STRUCT.size:
+            raise pycdlibexception.PyCdlibInvalidISO("PN record too short")
+
         (su_len, su_entry_version_unused, dev_t_high_le, dev_t_high_be,
-         dev_t_low_le, dev_t_low_be) = struct.unpack_from("=BBLLLL", rrstr[:20], 2)
+         dev_t_low_le, dev_t_low_be) = self.STRUCT.unpack_from(rrstr, 2)
 
         # We assume that the caller has already checked the su_entry_version,
         # so we don't bother.
@@ -758,7 +805,7 @@ class RRPNRecord(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInternalError("PN record not yet initialized!")
 
-        return b'PN' + struct.pack("=BBLLLL", RRPNRecord.length(), SU_ENTRY_VERSION, self.dev_t_high, utils.swab_32bit(self.dev_t_high), self.dev_t_low, utils.swab_32bit(self.dev_t_low))
+        return b'PN' + self.STRUCT.pack(RRPNRecord.length(), SU_ENTRY_VERSION, self.dev_t_high, utils.swab_32bit(self.dev_t_high), self.dev_t_low, utils.swab_32bit(self.dev_t_low))
 
     @staticmethod
     def length():
@@ -784,6 +831,10 @@ class RRSLRecord(object):
     '''
     __slots__ = ['_initialized', 'symlink_components', 'flags']
 
+    FMT = "=BBB"
+    STRUCT = struct.Struct(FMT)
+    COMPONENT_STRUCT = struct.Struct("=BB")
+
     class Component(object):
         '''
         A class that represents one component of a Symbolic Link Record.
@@ -847,13 +898,13 @@ class RRSLRecord(object):
              Representation of this compnent suitable for writing to disk.
             '''
             if self.flags & (1 << 1):
-                return struct.pack("=BB", (1 << 1), 0)
+                return RRSLRecord.COMPONENT_STRUCT.pack((1 << 1), 0)
             elif self.flags & (1 << 2):
-                return struct.pack("=BB", (1 << 2), 0)
+                return RRSLRecord.COMPONENT_STRUCT.pack((1 << 2), 0)
             elif self.flags & (1 << 3):
-                return struct.pack("=BB", (1 << 3), 0)
+                return RRSLRecord.COMPONENT_STRUCT.pack((1 << 3), 0)
 
-            return struct.pack("=BB", self.flags, self.curr_length) + self.data
+            return RRSLRecord.COMPONENT_STRUCT.pack(self.flags, self.curr_length) + self.data
 
         def set_continued(self):
             '''
@@ -942,7 +993,10 @@ class RRSLRecord(object):
         if self._initialized:
             raise pycdlibexception.PyCdlibInternalError("SL record already initialized!")
 
-        (su_len, su_entry_version_unused, self.flags) = struct.unpack_from("=BBB", rrstr[:5], 2)
+        if len(rrstr) < 2 + self.STRUCT.size:
+            raise pycdlibexception.PyCdlibInvalidISO("SL record too short")
+
+        (su_len, su_entry_version_unused, self.flags) = self.STRUCT.unpack_from(rrstr, 2)
 
         # We assume that the caller has already checked the su_entry_version,
         # so we don't bother.
@@ -950,12 +1004,15 @@ class RRSLRecord(object):
         cr_offset = 5
         data_len = su_len - 5
         while data_len > 0:
-            (cr_flags, len_cp) = struct.unpack_from("=BB", rrstr[:cr_offset + 2], cr_offset)
+            if len(rrstr) < cr_offset + self.COMPONENT_STRUCT.size:
+                raise pycdlibexception.PyCdlibInvalidISO("SL record too short")
+
+            (cr_flags, len_cp) = self.COMPONENT_STRUCT.unpack_from(rrstr, cr_offset)
 
             data_len -= 2
             cr_offset += 2
 
-            self.symlink_components.append(self.Component(cr_flags, len_cp, rrstr[cr_offset:cr_offset + len_cp], previous_continued))
+            self.symlink_components.append(self.Component(cr_flags, len_cp, bytes(rrstr[cr_offset:cr_offset + len_cp]), previous_continued))
 
             previous_continued = self.symlink_components[-1].is_continued()
 
@@ -1029,7 +1086,7 @@ class RRSLRecord(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInternalError("SL record not yet initialized!")
 
-        outlist = [b'SL', struct.pack("=BBB", self.current_length(), SU_ENTRY_VERSION, self.flags)]
+        outlist = [b'SL', self.STRUCT.pack(self.current_length(), SU_ENTRY_VERSION, self.flags)]
         for comp in self.symlink_components:
             outlist.append(comp.record())
 
@@ -1159,6 +1216,9 @@ class RRNMRecord(object):
     '''
     __slots__ = ['_initialized', 'posix_name_flags', 'posix_name']
 
+    FMT = "=BBB"
+    STRUCT = struct.Struct(FMT)
+
     def __init__(self):
         self._initialized = False
         self.posix_name_flags = None
@@ -1176,7 +1236,10 @@ class RRNMRecord(object):
         if self._initialized:
             raise pycdlibexception.PyCdlibInternalError("NM record already initialized!")
 
-        (su_len, su_entry_version_unused, self.posix_name_flags) = struct.unpack_from("=BBB", rrstr[:5], 2)
+        if len(rrstr) < 2 + self.STRUCT.size:
+            raise pycdlibexception.PyCdlibInvalidISO("NM record too short")
+
+        (su_len, su_entry_version_unused, self.posix_name_flags) = self.STRUCT.unpack_from(rrstr, 2)
 
         # We assume that the caller has already checked the su_entry_version,
         # so we don't bother.
@@ -1188,7 +1251,7 @@ class RRNMRecord(object):
         if name_len != 0:
             if (self.posix_name_flags & (1 << 1)) or (self.posix_name_flags & (1 << 2)) or (self.posix_name_flags & (1 << 5)):
                 raise pycdlibexception.PyCdlibInvalidISO("Invalid name in Rock Ridge NM entry (0x%x %d)" % (self.posix_name_flags, name_len))
-            self.posix_name += rrstr[5:5 + name_len]
+            self.posix_name += bytes(rrstr[5:5 + name_len])
 
         self._initialized = True
 
@@ -1221,7 +1284,7 @@ class RRNMRecord(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInternalError("NM record not yet initialized!")
 
-        return b'NM' + struct.pack(b"=BBB", RRNMRecord.length(self.posix_name), SU_ENTRY_VERSION, self.posix_name_flags) + self.posix_name
+        return b'NM' + self.STRUCT.pack(RRNMRecord.length(self.posix_name), SU_ENTRY_VERSION, self.posix_name_flags) + self.posix_name
 
     def set_continued(self):
         '''
@@ -1259,6 +1322,9 @@ class RRCLRecord(object):
     '''
     __slots__ = ['_initialized', 'child_log_block_num']
 
+    FMT = "=BBLL"
+    STRUCT = struct.Struct(FMT)
+
     def __init__(self):
         self.child_log_block_num = None
         self._initialized = False
@@ -1278,7 +1344,10 @@ class RRCLRecord(object):
         # We assume that the caller has already checked the su_entry_version,
         # so we don't bother.
 
-        (su_len, su_entry_version_unused, child_log_block_num_le, child_log_block_num_be) = struct.unpack_from("=BBLL", rrstr[:12], 2)
+        if len(rrstr) < 2 + self.STRUCT.size:
+            raise pycdlibexception.PyCdlibInvalidISO("CL record too short")
+
+        (su_len, su_entry_version_unused, child_log_block_num_le, child_log_block_num_be) = self.STRUCT.unpack_from(rrstr, 2)
         if su_len != RRCLRecord.length():
             raise pycdlibexception.PyCdlibInvalidISO("Invalid length on rock ridge extension")
 
@@ -1316,7 +1385,7 @@ class RRCLRecord(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInternalError("CL record not yet initialized!")
 
-        return b'CL' + struct.pack("=BBLL", RRCLRecord.length(), SU_ENTRY_VERSION, self.child_log_block_num, utils.swab_32bit(self.child_log_block_num))
+        return b'CL' + self.STRUCT.pack(RRCLRecord.length(), SU_ENTRY_VERSION, self.child_log_block_num, utils.swab_32bit(self.child_log_block_num))
 
     def set_log_block_num(self, bl):
         '''
@@ -1354,6 +1423,9 @@ class RRPLRecord(object):
     '''
     __slots__ = ['_initialized', 'parent_log_block_num']
 
+    FMT = "=BBLL"
+    STRUCT = struct.Struct(FMT)
+
     def __init__(self):
         self.parent_log_block_num = None
         self._initialized = False
@@ -1373,7 +1445,10 @@ class RRPLRecord(object):
         # We assume that the caller has already checked the su_entry_version,
         # so we don't bother.
 
-        (su_len, su_entry_version_unused, parent_log_block_num_le, parent_log_block_num_be) = struct.unpack_from("=BBLL", rrstr[:12], 2)
+        if len(rrstr) < 2 + self.STRUCT.size:
+            raise pycdlibexception.PyCdlibInvalidISO("PL record too short")
+
+        (su_len, su_entry_version_unused, parent_log_block_num_le, parent_log_block_num_be) = self.STRUCT.unpack_from(rrstr, 2)
         if su_len != RRPLRecord.length():
             raise pycdlibexception.PyCdlibInvalidISO("Invalid length on rock ridge extension")
         if parent_log_block_num_le != utils.swab_32bit(parent_log_block_num_be):
@@ -1410,7 +1485,7 @@ class RRPLRecord(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInternalError("PL record not yet initialized!")
 
-        return b'PL' + struct.pack("=BBLL", RRPLRecord.length(), SU_ENTRY_VERSION, self.parent_log_block_num, utils.swab_32bit(self.parent_log_block_num))
+        return b'PL' + self.STRUCT.pack(RRPLRecord.length(), SU_ENTRY_VERSION, self.parent_log_block_num, utils.swab_32bit(self.parent_log_block_num))
 
     def set_log_block_num(self, bl):
         '''
@@ -1452,6 +1527,9 @@ class RRTFRecord(object):
     '''
     __slots__ = ['_initialized', 'creation_time', 'access_time', 'modification_time', 'attribute_change_time', 'backup_time', 'expiration_time', 'effective_time', 'time_flags']
 
+    FMT = "=BBB"
+    STRUCT = struct.Struct(FMT)
+
     def __init__(self):
         self.creation_time = None
         self.access_time = None
@@ -1478,7 +1556,10 @@ class RRTFRecord(object):
         # We assume that the caller has already checked the su_entry_version,
         # so we don't bother.
 
-        (su_len, su_entry_version_unused, self.time_flags,) = struct.unpack_from("=BBB", rrstr[:5], 2)
+        if len(rrstr) < 2 + self.STRUCT.size:
+            raise pycdlibexception.PyCdlibInvalidISO("TF record too short")
+
+        (su_len, su_entry_version_unused, self.time_flags,) = self.STRUCT.unpack_from(rrstr, 2)
         if su_len < 5:
             raise pycdlibexception.PyCdlibInvalidISO("Not enough bytes in the TF record")
 
@@ -1573,7 +1654,7 @@ class RRTFRecord(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInternalError("TF record not yet initialized!")
 
-        outlist = [b'TF', struct.pack("=BBB", RRTFRecord.length(self.time_flags), SU_ENTRY_VERSION, self.time_flags)]
+        outlist = [b'TF', self.STRUCT.pack(RRTFRecord.length(self.time_flags), SU_ENTRY_VERSION, self.time_flags)]
         if self.creation_time is not None:
             outlist.append(self.creation_time.record())
         if self.access_time is not None:
@@ -1620,6 +1701,9 @@ class RRSFRecord(object):
     '''
     __slots__ = ['_initialized', 'virtual_file_size_high', 'virtual_file_size_low', 'table_depth']
 
+    FMT = "=BBLLLLB"
+    STRUCT = struct.Struct(FMT)
+
     def __init__(self):
         self._initialized = False
 
@@ -1638,9 +1722,12 @@ class RRSFRecord(object):
         # We assume that the caller has already checked the su_entry_version,
         # so we don't bother.
 
+        if len(rrstr) < 2 + self.STRUCT.size:
+            raise pycdlibexception.PyCdlibInvalidISO("SF record too short")
+
         (su_len, su_entry_version_unused, virtual_file_size_high_le,
          virtual_file_size_high_be, virtual_file_size_low_le,
-         virtual_file_size_low_be, self.table_depth) = struct.unpack_from("=BBLLLLB", rrstr[:21], 2)
+         virtual_file_size_low_be, self.table_depth) = self.STRUCT.unpack_from(rrstr, 2)
         if su_len != RRSFRecord.length():
             raise pycdlibexception.PyCdlibInvalidISO("Invalid length on rock ridge extension")
 
@@ -1687,7 +1774,7 @@ class RRSFRecord(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInternalError("SF record not yet initialized!")
 
-        return b'SF' + struct.pack("=BBLLLLB", RRSFRecord.length(), SU_ENTRY_VERSION, self.virtual_file_size_high, utils.swab_32bit(self.virtual_file_size_high), self.virtual_file_size_low, utils.swab_32bit(self.virtual_file_size_low), self.table_depth)
+        return b'SF' + self.STRUCT.pack(RRSFRecord.length(), SU_ENTRY_VERSION, self.virtual_file_size_high, utils.swab_32bit(self.virtual_file_size_high), self.virtual_file_size_low, utils.swab_32bit(self.virtual_file_size_low), self.table_depth)
 
     @staticmethod
     def length():
@@ -1711,6 +1798,9 @@ class RRRERecord(object):
     '''
     __slots__ = ['_initialized']
 
+    FMT = "=BB"
+    STRUCT = struct.Struct(FMT)
+
     def __init__(self):
         self._initialized = False
 
@@ -1726,7 +1816,10 @@ class RRRERecord(object):
         if self._initialized:
             raise pycdlibexception.PyCdlibInternalError("RE record already initialized!")
 
-        (su_len, su_entry_version_unused) = struct.unpack_from("=BB", rrstr[:4], 2)
+        if len(rrstr) < 2 + self.STRUCT.size:
+            raise pycdlibexception.PyCdlibInvalidISO("RE record too short")
+
+        (su_len, su_entry_version_unused) = self.STRUCT.unpack_from(rrstr, 2)
 
         # We assume that the caller has already checked the su_entry_version,
         # so we don't bother.
@@ -1763,7 +1856,7 @@ class RRRERecord(object):
         if not self._initialized:
             raise pycdlibexception.PyCdlibInternalError("RE record not yet initialized")
 
-        return b'RE' + struct.pack("=BB", RRRERecord.length(), SU_ENTRY_VERSION)
+        return b'RE' + self.STRUCT.pack(RRRERecord.length(), SU_ENTRY_VERSION)
 
     @staticmethod
     def length():
@@ -1779,12 +1872,76 @@ class RRRERecord(object):
         return 4
 
 
+class RRRawRecord(object):
+    '''
+    A class that holds a SUSP entry handled by a parser registered with
+    register_entry_parser() that did not supply its own record object, so
+    that the entry can be written back out verbatim.
+    '''
+    __slots__ = ['_initialized', 'data']
+
+    def __init__(self):
+        self.data = b''
+        self._initialized = False
+
+    def parse(self, rrstr):
+        '''
+        Parse a SUSP entry out of a string.
+
+        Parameters:
+         rrstr - The string to parse the record out of.
+        Returns:
+         Nothing.
+        '''
+        if self._initialized:
+            raise pycdlibexception.PyCdlibInternalError("Raw record already initialized!")
+
+        if len(rrstr) < 4:
+            raise pycdlibexception.PyCdlibInvalidISO("SUSP entry too short")
+
+        su_len = bytearray(rrstr[2:3])[0]
+        if su_len < 4 or su_len > len(rrstr):
+            raise pycdlibexception.PyCdlibInvalidISO("Invalid length on SUSP entry")
+
+        self.data = bytes(rrstr[:su_len])
+
+        self._initialized = True
+
+    def record(self):
+        '''
+        Generate a string representing this SUSP entry.
+
+        Parameters:
+         None.
+        Returns:
+         String containing the SUSP entry.
+        '''
+        if not self._initialized:
+            raise pycdlibexception.PyCdlibInternalError("Raw record not yet initialized!")
+
+        return self.data
+
+    def length(self):
+        '''
+        Return the length of this SUSP entry.
+
+        Parameters:
+         None.
+        Returns:
+         The length of this entry in bytes.
+        '''
+        if not self._initialized:
+            raise pycdlibexception.PyCdlibInternalError("Raw record not yet initialized!")
+
+        return len(self.data)
+
+
 class RockRidgeEntries(object):
     '''
     A simple class container to hold a long list of possible Rock Ridge
     records.
     '''
-    __slots__ = ['sp_record', 'rr_record', 'ce_record', 'px_record', 'er_record', 'es_record', 'pn_record', 'sl_records', 'nm_records', 'cl_record', 'pl_record', 'tf_record', 'sf_record', 're_record']
+    __slots__ = ['sp_record', 'rr_record', 'ce_record', 'px_record', 'er_record', 'es_record', 'pn_record', 'sl_records', 'nm_records', 'cl_record', 'pl_record', 'tf_record', 'sf_record', 're_record', 'extra_records']
 
     def __init__(self):
         self.sp_record = None
@@ -1801,6 +1958,261 @@ class RockRidgeEntries(object):
         self.tf_record = None
         self.sf_record = None
         self.re_record = None
+        self.extra_records = []
+
+
+def _single_entry_parser(rrclass, attr, name):
+    '''
+    An internal function to build a parser for a SUSP entry type that may
+    appear at most once for a directory record (across both the directory
+    record and its continuation area).
+
+    Parameters:
+     rrclass - The class to instantiate and parse the entry with.
+     attr - The RockRidgeEntries slot to store the parsed entry in.
+     name - The name of the entry to use in error messages.
+    Returns:
+     A parser function suitable for register_entry_parser().
+    '''
+    def _parse(rr, entry_list, rrstr, is_first_dir_record_of_root):  # pylint: disable=unused-argument
+        '''
+        Parse a single instance entry into the entry list.
+        '''
+        if getattr(rr.dr_entries, attr) is not None or getattr(rr.ce_entries, attr) is not None:
+            raise pycdlibexception.PyCdlibInvalidISO("Only single %s record supported" % (name))
+
+        rec = rrclass()
+        rec.parse(rrstr)
+        setattr(entry_list, attr, rec)
+    return _parse
+
+
+def _parse_sp_entry(rr, entry_list, rrstr, is_first_dir_record_of_root):
+    '''
+    An internal function to parse a SUSP SP entry.
+
+    Parameters:
+     rr - The RockRidge object the entry is being parsed for.
+     entry_list - The RockRidgeEntries object to store the entry in.
+     rrstr - The string to parse, starting at the entry.
+     is_first_dir_record_of_root - Whether this is the first directory record
+                                   of the root directory record.
+    Returns:
+     Nothing.
+    '''
+    if len(rrstr) < 7 or not is_first_dir_record_of_root:
+        raise pycdlibexception.PyCdlibInvalidISO("Invalid SUSP SP record")
+
+    if rr.dr_entries.sp_record is not None or rr.ce_entries.sp_record is not None:
+        raise pycdlibexception.PyCdlibInvalidISO("Only single SP record supported")
+
+    # OK, this is the first Directory Record of the root directory, which
+    # means we should check it for the SUSP/RR extension, which is exactly 7
+    # bytes and starts with 'SP'.
+    entry_list.sp_record = RRSPRecord()
+    entry_list.sp_record.parse(rrstr)
+
+
+def _parse_rr_entry(rr, entry_list, rrstr, is_first_dir_record_of_root):  # pylint: disable=unused-argument
+    '''
+    An internal function to parse a Rock Ridge RR entry.
+
+    Parameters:
+     rr - The RockRidge object the entry is being parsed for.
+     entry_list - The RockRidgeEntries object to store the entry in.
+     rrstr - The string to parse, starting at the entry.
+     is_first_dir_record_of_root - Whether this is the first directory record
+                                   of the root directory record.
+    Returns:
+     Nothing.
+    '''
+    if rr.dr_entries.rr_record is not None or rr.ce_entries.rr_record is not None:
+        raise pycdlibexception.PyCdlibInvalidISO("Only single RR record supported")
+
+    entry_list.rr_record = RRRRRecord()
+    entry_list.rr_record.parse(rrstr)
+    # The RR Record only exists in the 1.09 specification.  However, we have
+    # seen ISOs in the wild (OpenSolaris 2008) that put an RR Record into a
+    # 1.12 ISO.  Therefore, if no previous version has been seen, then we
+    # assign this to version 1.09.  If a previous version has been seen, and
+    # is 1.12, then we don't downgrade it, but just leave it as 1.12.
+    if rr.rr_version is None:
+        rr.rr_version = "1.09"
+
+
+def _parse_px_entry(rr, entry_list, rrstr, is_first_dir_record_of_root):  # pylint: disable=unused-argument
+    '''
+    An internal function to parse a Rock Ridge PX entry.
+
+    Parameters:
+     rr - The RockRidge object the entry is being parsed for.
+     entry_list - The RockRidgeEntries object to store the entry in.
+     rrstr - The string to parse, starting at the entry.
+     is_first_dir_record_of_root - Whether this is the first directory record
+                                   of the root directory record.
+    Returns:
+     Nothing.
+    '''
+    if rr.dr_entries.px_record is not None or rr.ce_entries.px_record is not None:
+        raise pycdlibexception.PyCdlibInvalidISO("Only single PX record supported")
+
+    entry_list.px_record = RRPXRecord()
+    version = entry_list.px_record.parse(rrstr)
+    # See the comment in _parse_rr_entry for why the logic is as follows.
+    if rr.rr_version is None:
+        rr.rr_version = version
+    elif rr.rr_version == "1.09" and version == "1.12":
+        rr.rr_version = "1.12"
+    elif rr.rr_version != version:
+        raise pycdlibexception.PyCdlibInvalidISO("PX record doesn't agree with Rock Ridge version")
+
+
+def _parse_pd_entry(rr, entry_list, rrstr, is_first_dir_record_of_root):  # pylint: disable=unused-argument
+    '''
+    An internal function to parse a SUSP PD (padding) entry.  There is
+    nothing to keep from a padding entry, so this does no work.
+
+    Parameters:
+     rr - The RockRidge object the entry is being parsed for.
+     entry_list - The RockRidgeEntries object to store the entry in.
+     rrstr - The string to parse, starting at the entry.
+     is_first_dir_record_of_root - Whether this is the first directory record
+                                   of the root directory record.
+    Returns:
+     Nothing.
+    '''
+    pass
+
+
+def _parse_st_entry(rr, entry_list, rrstr, is_first_dir_record_of_root):  # pylint: disable=unused-argument
+    '''
+    An internal function to parse a SUSP ST (terminator) entry.
+
+    Parameters:
+     rr - The RockRidge object the entry is being parsed for.
+     entry_list - The RockRidgeEntries object to store the entry in.
+     rrstr - The string to parse, starting at the entry.
+     is_first_dir_record_of_root - Whether this is the first directory record
+                                   of the root directory record.
+    Returns:
+     Nothing.
+    '''
+    if bytearray(rrstr[2:3])[0] != 4:
+        raise pycdlibexception.PyCdlibInvalidISO("Invalid length on rock ridge extension")
+
+
+def _parse_sl_entry(rr, entry_list, rrstr, is_first_dir_record_of_root):  # pylint: disable=unused-argument
+    '''
+    An internal function to parse a Rock Ridge SL entry.
+
+    Parameters:
+     rr - The RockRidge object the entry is being parsed for.
+     entry_list - The RockRidgeEntries object to store the entry in.
+     rrstr - The string to parse, starting at the entry.
+     is_first_dir_record_of_root - Whether this is the first directory record
+                                   of the root directory record.
+    Returns:
+     Nothing.
+    '''
+    new_sl_record = RRSLRecord()
+    previous_continued = False
+    if entry_list.sl_records:
+        previous_continued = entry_list.sl_records[-1].last_component_continued()
+    new_sl_record.parse(rrstr, previous_continued)
+    entry_list.sl_records.append(new_sl_record)
+
+
+# The table of SUSP entry parsers, keyed by the two-byte entry signature.
+# Every parser is called as parser(rr, entry_list, rrstr,
+# is_first_dir_record_of_root), where rrstr starts at the entry itself.  The
+# NM, PX and TF entries that nearly every directory record carries are
+# handled inline in RockRidge.parse() before this table is consulted.
+_ENTRY_PARSERS = {
+    b'SP': _parse_sp_entry,
+    b'RR': _parse_rr_entry,
+    b'CE': _single_entry_parser(RRCERecord, 'ce_record', 'CE'),
+    b'PX': _parse_px_entry,
+    b'PD': _parse_pd_entry,
+    b'ST': _parse_st_entry,
+    b'ER': _single_entry_parser(RRERRecord, 'er_record', 'ER'),
+    b'ES': _single_entry_parser(RRESRecord, 'es_record', 'ES'),
+    b'PN': _single_entry_parser(RRPNRecord, 'pn_record', 'PN'),
+    b'SL': _parse_sl_entry,
+    b'CL': _single_entry_parser(RRCLRecord, 'cl_record', 'CL'),
+    b'PL': _single_entry_parser(RRPLRecord, 'pl_record', 'PL'),
+    b'RE': _single_entry_parser(RRRERecord, 're_record', 'RE'),
+    b'TF': _single_entry_parser(RRTFRecord, 'tf_record', 'TF'),
+    b'SF': _single_entry_parser(RRSFRecord, 'sf_record', 'SF'),
+}
+
+
+# The entries that RockRidge.parse() handles itself without consulting
+# _ENTRY_PARSERS, so they can't have a parser registered for them.
+_INLINE_ENTRY_SIGNATURES = frozenset([b'NM', b'PX', b'TF'])
+
+# The parsers that PyCdlib ships with, so that unregister_entry_parser() can
+# put back a built-in parser that register_entry_parser() replaced.
+_BUILTIN_ENTRY_PARSERS = dict(_ENTRY_PARSERS)
+
+
+def register_entry_parser(signature, parser):
+    '''
+    A function to register a parser for a SUSP entry type, such as one of the
+    extensions (ZF, AL, etc.) that PyCdlib does not understand natively.  A
+    parser registered for a signature that is already known replaces the
+    existing one, except for NM, PX and TF, which are always parsed by
+    PyCdlib itself.  Entries handled by a registered parser are kept with the
+    directory record and written back out when the ISO is written.
+
+    Parameters:
+     signature - The two-byte signature of the entry type.
+     parser - The function to call for each entry of this type.  It is called
+              as parser(rr, entry_list, rrstr, is_first_dir_record_of_root),
+              where rr is the RockRidge object being parsed, entry_list is the
+              RockRidgeEntries object the entry was found in, and rrstr starts
+              at the entry.  It may return an object with record() and
+              length() methods to use when writing the entry back out; if it
+              returns None, the bytes of the entry are written back verbatim.
+    Returns:
+     Nothing.
+    '''
+    if len(signature) != 2:
+        raise pycdlibexception.PyCdlibInvalidInput("A SUSP signature must be exactly 2 bytes")
+    if signature in _INLINE_ENTRY_SIGNATURES:
+        raise pycdlibexception.PyCdlibInvalidInput("The parser for %s entries cannot be replaced" % (signature.decode('ascii')))
+
+    def _parse_registered_entry(rr, entry_list, rrstr, is_first_dir_record_of_root):
+        '''
+        An internal function to call a registered parser and keep the entry
+        it parsed for writing.
+        '''
+        rec = parser(rr, entry_list, rrstr, is_first_dir_record_of_root)
+        if rec is None:
+            rec = RRRawRecord()
+            rec.parse(rrstr)
+        entry_list.extra_records.append(rec)
+
+    _ENTRY_PARSERS[signature] = _parse_registered_entry
+
+
+def unregister_entry_parser(signature):
+    '''
+    A function to remove a parser registered with register_entry_parser().  If
+    the registered parser replaced one of PyCdlib's own, the original parser
+    is restored.
+
+    Parameters:
+     signature - The two-byte signature of the entry type.
+    Returns:
+     Nothing.
+    '''
+    if _ENTRY_PARSERS.get(signature) is _BUILTIN_ENTRY_PARSERS.get(signature):
+        raise pycdlibexception.PyCdlibInvalidInput("No parser registered for this SUSP signature")
+
+    if signature in _BUILTIN_ENTRY_PARSERS:
+        _ENTRY_PARSERS[signature] = _BUILTIN_ENTRY_PARSERS[signature]
+    else:
+        del _ENTRY_PARSERS[signature]
 
 
 # This is the class that implements the Rock Ridge extensions for PyCdlib.  The
@@ -1822,6 +2234,9 @@ class RockRidge(object):
     '''
     __slots__ = ['_initialized', 'dr_entries', 'ce_entries', 'cl_to_moved_dr', 'moved_to_cl_dr', 'parent_link', 'rr_version', 'ce_block', 'bytes_to_skip', 'su_entry_version', '_full_name']
 
+    FMT = "=2sBB"
+    STRUCT = struct.Struct(FMT)
+
     def __init__(self):
         self.dr_entries = RockRidgeEntries()
         self.ce_entries = RockRidgeEntries()
@@ -1832,18 +2247,6 @@ class RockRidge(object):
         self.ce_block = None
         self._initialized = False
 
-    def has_entry(self, name):
-        '''
-        An internal method to tell if we have already parsed an entry of the
-        named type.
-
-        Parameters:
-         name - The name of the entry to check.
-        Returns:
-         True if we have already parsed an entry of the named type, False otherwise.
-        '''
-        return getattr(self.dr_entries, name) or getattr(self.ce_entries, name)
-
     def parse(self, record, is_first_dir_record_of_root, bytes_to_skip, continuation):
         '''
         Method to parse a rock ridge record.
@@ -1881,128 +2284,32 @@ class RockRidge(object):
                 if bytes(bytearray([record[offset]])) != b'\x00':
                     raise pycdlibexception.PyCdlibInvalidISO("Invalid pad byte")
                 break
-            elif left < 4:
+            elif left < 4 or len(record) < offset + self.STRUCT.size:
                 raise pycdlibexception.PyCdlibInvalidISO("Not enough bytes left in the System Use field")
 
-            (rtype, su_len, su_entry_version) = struct.unpack_from("=2sBB", record[:offset + 4], offset)
+            (rtype, su_len, su_entry_version) = self.STRUCT.unpack_from(record, offset)
             if su_entry_version != SU_ENTRY_VERSION:
                 raise pycdlibexception.PyCdlibInvalidISO("Invalid RR version %d!" % su_entry_version)
 
-            if rtype == b'SP':
-                if left < 7 or not is_first_dir_record_of_root:
-                    raise pycdlibexception.PyCdlibInvalidISO("Invalid SUSP SP record")
-
-                if self.has_entry('sp_record'):
-                    raise pycdlibexception.PyCdlibInvalidISO("Only single SP record supported")
-
-                # OK, this is the first Directory Record of the root
-                # directory, which means we should check it for the SUSP/RR
-                # extension, which is exactly 7 bytes and starts with 'SP'.
-
-                entry_list.sp_record = RRSPRecord()
-                entry_list.sp_record.parse(record[offset:])
-            elif rtype == b'RR':
-                if self.has_entry('rr_record'):
-                    raise pycdlibexception.PyCdlibInvalidISO("Only single RR record supported")
-
-                entry_list.rr_record = RRRRRecord()
-                entry_list.rr_record.parse(record[offset:])
-                # The RR Record only exists in the 1.09 specification.  However,
-                # we have seen ISOs in the wild (OpenSolaris 2008) that put an
-                # RR Record into a 1.12 ISO.  Therefore, if no previous version
-                # has been seen, then we assign this to version 1.09.  If a
-                # previous version has been seen, and is 1.12, then we don't
-                # downgrade it, but just leave it as 1.12.
-                if self.rr_version is None:
-                    self.rr_version = "1.09"
-            elif rtype == b'CE':
-                if self.has_entry('ce_record'):
-                    raise pycdlibexception.PyCdlibInvalidISO("Only single CE record supported")
-
-                entry_list.ce_record = RRCERecord()
-                entry_list.ce_record.parse(record[offset:])
-            elif rtype == b'PX':
-                if self.has_entry('px_record'):
-                    raise pycdlibexception.PyCdlibInvalidISO("Only single PX record supported")
-
-                entry_list.px_record = RRPXRecord()
-                version = entry_list.px_record.parse(record[offset:])
-                # See the comment above in the RR handling for why the logic
-                # is as follows.
-                if self.rr_version is None:
-                    self.rr_version = version
-                else:
-                    if self.rr_version == "1.09" and version == "1.12":
-                        self.rr_version = "1.12"
-                    elif self.rr_version != version:
-                        raise pycdlibexception.PyCdlibInvalidISO("PX record doesn't agree with Rock Ridge version")
-            elif rtype == b'PD':
-                # no work to do here
-                pass
-            elif rtype == b'ST':
-                if su_len != 4:
-                    raise pycdlibexception.PyCdlibInvalidISO("Invalid length on rock ridge extension")
-            elif rtype == b'ER':
-                if self.has_entry('er_record'):
-                    raise pycdlibexception.PyCdlibInvalidISO("Only single ER record supported")
-
-                entry_list.er_record = RRERRecord()
-                entry_list.er_record.parse(record[offset:])
-            elif rtype == b'ES':
-                if self.has_entry('es_record'):
-                    raise pycdlibexception.PyCdlibInvalidISO("Only single ES record supported")
-
-                entry_list.es_record = RRESRecord()
-                entry_list.es_record.parse(record[offset:])
-            elif rtype == b'PN':
-                if self.has_entry('pn_record'):
-                    raise pycdlibexception.PyCdlibInvalidISO("Only single PN record supported")
-
-                entry_list.pn_record = RRPNRecord()
-                entry_list.pn_record.parse(record[offset:])
-            elif rtype == b'SL':
-                new_sl_record = RRSLRecord()
-                previous_continued = False
-                if entry_list.sl_records:
-                    previous_continued = entry_list.sl_records[-1].last_component_continued()
-                new_sl_record.parse(record[offset:], previous_continued)
-                entry_list.sl_records.append(new_sl_record)
-            elif rtype == b'NM':
+            # NM, PX and TF make up the bulk of the entries on any Rock Ridge
+            # ISO, so handle them here without going through the table.
+            if rtype == b'NM':
                 new_nm_record = RRNMRecord()
                 new_nm_record.parse(record[offset:])
                 entry_list.nm_records.append(new_nm_record)
-            elif rtype == b'CL':
-                if self.has_entry('cl_record'):
-                    raise pycdlibexception.PyCdlibInvalidISO("Only single CL record supported")
-
-                entry_list.cl_record = RRCLRecord()
-                entry_list.cl_record.parse(record[offset:])
-            elif rtype == b'PL':
-                if self.has_entry('pl_record'):
-                    raise pycdlibexception.PyCdlibInvalidISO("Only single PL record supported")
-
-                entry_list.pl_record = RRPLRecord()
-                entry_list.pl_record.parse(record[offset:])
-            elif rtype == b'RE':
-                if self.has_entry('re_record'):
-                    raise pycdlibexception.PyCdlibInvalidISO("Only single RE record supported")
-
-                entry_list.re_record = RRRERecord()
-                entry_list.re_record.parse(record[offset:])
+            elif rtype == b'PX':
+                _parse_px_entry(self, entry_list, record[offset:], is_first_dir_record_of_root)
             elif rtype == b'TF':
-                if self.has_entry('tf_record'):
+                if self.dr_entries.tf_record is not None or self.ce_entries.tf_record is not None:
                     raise pycdlibexception.PyCdlibInvalidISO("Only single TF record supported")
 
                 entry_list.tf_record = RRTFRecord()
                 entry_list.tf_record.parse(record[offset:])
-            elif rtype == b'SF':
-                if self.has_entry('sf_record'):
-                    raise pycdlibexception.PyCdlibInvalidISO("Only single SF record supported")
-
-                entry_list.sf_record = RRSFRecord()
-                entry_list.sf_record.parse(record[offset:])
             else:
-                raise pycdlibexception.PyCdlibInvalidISO("Unknown SUSP record")
+                parser = _ENTRY_PARSERS.get(rtype)
+                if parser is None:
+                    raise pycdlibexception.PyCdlibInvalidISO("Unknown SUSP record")
+                parser(self, entry_list, record[offset:], is_first_dir_record_of_root)
             offset += su_len
             left -= su_len
 
@@ -2059,6 +2366,9 @@ class RockRidge(object):
         if entries.er_record is not None:
             outlist.append(entries.er_record.record())
 
+        for extra_record in entries.extra_records:
+            outlist.append(extra_record.record())
+
         if entries.ce_record is not None:
             outlist.append(entries.ce_record.record())
 
@@ -21,9 +21,17 @@ Various utilities for PyCdlib.
 from __future__ import absolute_import
 
 import io
+import os
 import socket
+import struct
+import threading
 import time
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 import pycdlib.pycdlibexception as pycdlibexception
 
 have_sendfile = True
@@ -35,6 +43,13 @@ except ImportError:
     except ImportError:
         have_sendfile = False
 
+try:
+    # On Python 2, open() returns the builtin file type rather than an
+    # io.FileIO.
+    _plain_file_types = (io.FileIO, file)  # pylint: disable=undefined-variable
+except NameError:
+    _plain_file_types = (io.FileIO,)
+
 
 def swab_32bit(input_int):
     '''
@@ -77,64 +92,724 @@ def ceiling_div(numer, denom):
     return -(-numer // denom)
 
 
-def copy_data(data_length, blocksize, infp, outfp):
+# The ioctl number of FICLONERANGE on Linux, _IOW(0x94, 13, struct
+# file_clone_range), and the layout of struct file_clone_range.
+_FICLONERANGE = 0x4020940d
+_FILE_CLONE_RANGE = struct.Struct("=qQQQ")
+
+_copy_counters_lock = threading.Lock()
+_copy_counters = {'reflink': 0, 'copy_file_range': 0, 'sendfile': 0, 'loop': 0}
+
+
+def _count_copy(method):
+    '''
+    An internal function to count a copy done with the given method.
+
+    Parameters:
+     method - The name of the copy method.
+    Returns:
+     Nothing.
+    '''
+    with _copy_counters_lock:
+        _copy_counters[method] += 1
+
+
+def copy_data_counters():
+    '''
+    A function to get the number of copies done with each of the copy methods
+    used by copy_data and copy_data_positional.  A copy that had to fall back
+    partway through is counted for each method that copied some of it.
+
+    Parameters:
+     None.
+    Returns:
+     A dictionary mapping 'reflink', 'copy_file_range', 'sendfile' and 'loop'
+     to the number of copies done that way.
+    '''
+    with _copy_counters_lock:
+        return dict(_copy_counters)
+
+
+def reset_copy_data_counters():
+    '''
+    A function to set the counters returned by copy_data_counters back to
+    zero.
+
+    Parameters:
+     None.
+    Returns:
+     Nothing.
+    '''
+    with _copy_counters_lock:
+        for method in _copy_counters:
+            _copy_counters[method] = 0
+
+
+def _fileno(fp):
+    '''
+    An internal function to get the file descriptor of a file object.
+
+    Parameters:
+     fp - The file object.
+    Returns:
+     The file descriptor, or None if the file object does not have one.
+    '''
+    # Python 3 implements the fileno method for all file-like objects, so
+    # we can't just use the existence of the method to tell whether it is
+    # available.  Instead, we try to call it, and if we fail, then we
+    # assume it is not available.
+    try:
+        return fp.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        return None
+
+
+def file_fileno(fp):
+    '''
+    A function to get the file descriptor of a file object, but only if the
+    bytes read through the file object are the bytes of the file.  Objects
+    such as bz2.BZ2File and gzip.GzipFile return the descriptor of the
+    compressed file from fileno(), so reading from that descriptor directly
+    would see the wrong data.
+
+    Parameters:
+     fp - The file object.
+    Returns:
+     The file descriptor, or None if the file object is not a plain file.
+    '''
+    if isinstance(fp, PositionalReader):
+        fp = fp.fp
+    raw = fp
+    if isinstance(fp, (io.BufferedReader, io.BufferedWriter, io.BufferedRandom)):
+        raw = fp.raw
+    if not isinstance(raw, _plain_file_types):
+        return None
+    return _fileno(raw)
+
+
+def _reflink(in_fd, in_offset, out_fd, out_offset, length):
+    '''
+    An internal function to try to share the data between the two files
+    instead of copying it, as supported by btrfs and XFS.  This only works
+    within a single file system, and only for ranges that are aligned to the
+    file system block size (or that run to the end of the files).
+
+    Parameters:
+     in_fd - The file descriptor to copy from.
+     in_offset - The offset in in_fd to copy from.
+     out_fd - The file descriptor to copy to.
+     out_offset - The offset in out_fd to copy to.
+     length - The number of bytes to copy.
+    Returns:
+     True if the data was shared, False otherwise.
+    '''
+    # A length of zero asks the kernel to share everything up to the end of
+    # the input file, which is not what we want.
+    if fcntl is None or length == 0:
+        return False
+    try:
+        fcntl.ioctl(out_fd, _FICLONERANGE,
+                    _FILE_CLONE_RANGE.pack(in_fd, in_offset, length, out_offset))
+    except (IOError, OSError):
+        return False
+    _count_copy('reflink')
+    return True
+
+
+def _copy_file_range(in_fd, in_offset, out_fd, out_offset, length):
+    '''
+    An internal function to copy data between two offsets in the kernel with
+    copy_file_range, which may also share the data on file systems that
+    support it.
+
+    Parameters:
+     in_fd - The file descriptor to copy from.
+     in_offset - The offset in in_fd to copy from.
+     out_fd - The file descriptor to copy to.
+     out_offset - The offset in out_fd to copy to.
+     length - The number of bytes to copy.
+    Returns:
+     A tuple of the number of bytes copied and whether the copy is done;
+     the copy is done if all of the bytes were copied or the end of the
+     input was reached.  If it is not done, the rest must be copied some
+     other way.
+    '''
+    if not hasattr(os, 'copy_file_range'):
+        return 0, False
+    copied = 0
+    done = False
+    try:
+        while copied < length:
+            ret = os.copy_file_range(in_fd, out_fd, length - copied,
+                                     in_offset + copied, out_offset + copied)
+            if ret == 0:
+                break
+            copied += ret
+        done = True
+    except OSError:
+        # Not every pair of file systems supports it.
+        pass
+    if copied > 0:
+        _count_copy('copy_file_range')
+    return copied, done
+
+
+# The I/O policies that can be passed to copy_data, and whether each one
+# preallocates the output and keeps the data out of the page cache.
+_IO_POLICIES = {
+    None: (False, False),
+    'preallocate': (True, False),
+    'nocache': (False, True),
+    'all': (True, True),
+}
+
+# How much data to copy between the page cache hints of a "nocache" copy.
+_CACHE_WINDOW = 8 * 1024 * 1024
+
+
+def parse_io_policy(policy):
+    '''
+    A function to check an I/O policy and split it into what it asks for.
+    The policy is one of None (the default, which does nothing special),
+    'preallocate' (allocate the space for the output up front with
+    posix_fallocate), 'nocache' (tell the kernel that the input is read
+    sequentially and drop the data that has been copied from the page
+    cache), or 'all' (both 'preallocate' and 'nocache').
+
+    Parameters:
+     policy - The I/O policy.
+    Returns:
+     A tuple of whether to preallocate the output and whether to keep the
+     data out of the page cache.
+    '''
+    try:
+        return _IO_POLICIES[policy]
+    except (KeyError, TypeError):
+        raise pycdlibexception.PyCdlibInvalidInput("Invalid I/O policy %s; must be one of None, 'preallocate', 'nocache' or 'all'" % (policy))
+
+
+def preallocate(fd, offset, length):
+    '''
+    A function to allocate the space for a range of a file up front, so that
+    the file does not have to be grown as it is written.  This does nothing
+    if the platform or the file system does not support it.
+
+    Parameters:
+     fd - The file descriptor of the file.
+     offset - The offset of the range to allocate.
+     length - The length of the range to allocate.
+    Returns:
+     Nothing.
+    '''
+    if length <= 0 or not hasattr(os, 'posix_fallocate'):
+        return
+    try:
+        os.posix_fallocate(fd, offset, length)
+    except OSError:
+        pass
+
+
+def fadvise(fd, offset, length, advice):
+    '''
+    A function to tell the kernel how a range of a file will be used.  This
+    does nothing if the platform does not support it.
+
+    Parameters:
+     fd - The file descriptor of the file.
+     offset - The offset of the range.
+     length - The length of the range, or 0 for up to the end of the file.
+     advice - Either 'sequential' if the range is about to be read in order,
+              or 'dontneed' if the range will not be used again.
+    Returns:
+     Nothing.
+    '''
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    if advice == 'sequential':
+        advice = os.POSIX_FADV_SEQUENTIAL
+    else:
+        advice = os.POSIX_FADV_DONTNEED
+    try:
+        os.posix_fadvise(fd, offset, length, advice)
+    except OSError:
+        pass
+
+
+def copy_data(data_length, blocksize, infp, outfp, policy=None):
     '''
     A utility function to copy data from the input file object to the output
-    file object.  This function will use the most efficient copy method available,
-    which is often sendfile.
+    file object.  This function will use the most efficient copy method
+    available, trying in turn: sharing the data with a reflink,
+    copy_file_range, sendfile, and finally reading and writing in a loop.
+    Each method falls back to the next one if it isn't supported for these
+    file objects.
+
+    Parameters:
+     data_length - The amount of data to copy.
+     blocksize - How much data to copy per iteration.
+     infp - The file object to copy data from.
+     outfp - The file object to copy data to.
+     policy - The I/O policy to copy with, as described in parse_io_policy;
+              None by default.  The hints only apply to file objects with a
+              file descriptor.
+    Returns:
+     Nothing.
+    '''
+    (preallocate_output, nocache) = parse_io_policy(policy)
+
+    in_fd = file_fileno(infp)
+    out_fd = file_fileno(outfp)
+
+    if preallocate_output and out_fd is not None:
+        preallocate(out_fd, outfp.tell(), data_length)
+
+    if not nocache or (in_fd is None and out_fd is None):
+        _copy_data(data_length, blocksize, infp, outfp, in_fd, out_fd)
+        return
+
+    in_offset = None
+    if in_fd is not None:
+        in_offset = infp.tell()
+        fadvise(in_fd, in_offset, data_length, 'sequential')
+    out_offset = None
+    if out_fd is not None:
+        out_offset = outfp.tell()
+
+    # Copy a window at a time, dropping what has been copied from the page
+    # cache as we go.  The data that was read can be dropped right away.
+    # The data that was written can only be dropped once it has been
+    # written back, which asking to drop it starts, so it is dropped a
+    # window behind.
+    done = 0
+    while done < data_length:
+        window = min(_CACHE_WINDOW, data_length - done)
+        _copy_data(window, blocksize, infp, outfp, in_fd, out_fd)
+        if in_fd is not None:
+            fadvise(in_fd, in_offset + done, window, 'dontneed')
+        if out_fd is not None:
+            outfp.flush()
+            start = max(done - _CACHE_WINDOW, 0)
+            fadvise(out_fd, out_offset + start, done + window - start, 'dontneed')
+        done += window
+
+
+def _copy_data(data_length, blocksize, infp, outfp, in_fd, out_fd):
+    '''
+    An internal function to copy data from the input file object to the
+    output file object, with the copy methods described in copy_data.
 
     Parameters:
      data_length - The amount of data to copy.
      blocksize - How much data to copy per iteration.
      infp - The file object to copy data from.
      outfp - The file object to copy data to.
+     in_fd - The file descriptor of infp, or None if it has none.
+     out_fd - The file descriptor of outfp, or None if it has none.
     Returns:
      Nothing.
     '''
-    use_sendfile = False
-    if have_sendfile:
-        # Python 3 implements the fileno method for all file-like objects, so
-        # we can't just use the existence of the method to tell whether it is
-        # available.  Instead, we try to assign it, and if we fail, then we
-        # assume it is not available.
-        try:
-            x_unused = infp.fileno()  # NOQA
-            y_unused = outfp.fileno()  # NOQA
-            use_sendfile = True
-        except (AttributeError, io.UnsupportedOperation):
-            pass
-
-    if use_sendfile:
+    left = data_length
+    if in_fd is not None and out_fd is not None:
         # This is one of those instances where using the file object and the
-        # file descriptor causes problems.  The sendfile() call actually updates
-        # the underlying file descriptor, but the file object does not know
-        # about it.  To get around this, we instead get the offset, allow
-        # sendfile() to update the offset, then manually seek the file object
-        # to the right location.  This ensures that the file object gets updated
-        # properly.
+        # file descriptor causes problems.  The methods below work on the
+        # underlying file descriptors, and the file objects don't know about
+        # it.  To get around this, we instead get the offsets, do the copy,
+        # then manually seek the file objects to the right location.  This
+        # ensures that the file objects get updated properly.
         in_offset = infp.tell()
         out_offset = outfp.tell()
-        sendfile(outfp.fileno(), infp.fileno(), in_offset, data_length)
-        infp.seek(in_offset + data_length)
-        outfp.seek(out_offset + data_length)
-    else:
-        left = data_length
-        readsize = blocksize
-        while left > 0:
-            if left < readsize:
-                readsize = left
-            data = infp.read(readsize)
-            # We have seen ISOs in the wild (Tribes Vengeance 1of4.iso) that
-            # lie about the size of their files, causing reads to fail (since
-            # we hit EOF before the supposed end of the file).  If we are using
-            # sendfile above, sendfile just silently returns as much data as it
-            # can, with no additional checking.  We should do the same here, so
-            # if we got less data than we asked for, abort the loop silently.
-            data_len = len(data)
-            if data_len != readsize:
-                data_len = left
-            outfp.write(data)
-            left -= data_len
+        done = _reflink(in_fd, in_offset, out_fd, out_offset, left)
+        if not done:
+            copied, done = _copy_file_range(in_fd, in_offset, out_fd,
+                                            out_offset, left)
+            left -= copied
+        if not done and have_sendfile:
+            try:
+                # Note that sendfile() writes at the current position of the
+                # output file descriptor.
+                os.lseek(out_fd, out_offset + data_length - left, os.SEEK_SET)
+                sendfile(out_fd, in_fd, in_offset + data_length - left, left)
+                _count_copy('sendfile')
+                done = True
+            except (IOError, OSError):
+                pass
+        infp.seek(in_offset + data_length - left)
+        outfp.seek(out_offset + data_length - left)
+        if done:
+            infp.seek(in_offset + data_length)
+            outfp.seek(out_offset + data_length)
+            return
+
+    if left > 0:
+        _count_copy('loop')
+    readsize = blocksize
+    while left > 0:
+        if left < readsize:
+            readsize = left
+        data = infp.read(readsize)
+        # We have seen ISOs in the wild (Tribes Vengeance 1of4.iso) that
+        # lie about the size of their files, causing reads to fail (since
+        # we hit EOF before the supposed end of the file).  If we are using
+        # sendfile above, sendfile just silently returns as much data as it
+        # can, with no additional checking.  We should do the same here, so
+        # if we got less data than we asked for, abort the loop silently.
+        data_len = len(data)
+        if data_len != readsize:
+            data_len = left
+        outfp.write(data)
+        left -= data_len
+
+
+def copy_data_positional(data_length, blocksize, infp, in_offset, out_fd,
+                         out_offset, lock, policy=None):
+    '''
+    A utility function to copy data from the input file object to a fixed
+    offset in the output file descriptor.  Neither the input nor the output
+    file position is used, so several of these copies can run at the same
+    time.  Where possible the data is shared with a reflink or copied with
+    copy_file_range; otherwise it is copied with pread and pwrite.  Input
+    file objects without a file descriptor (such as BytesIO) are read with
+    seek and read while holding the lock.
+
+    Parameters:
+     data_length - The amount of data to copy.
+     blocksize - How much data to copy per iteration.
+     infp - The file object to copy data from.
+     in_offset - The offset in the input file object to start copying from.
+     out_fd - The file descriptor to copy data to.
+     out_offset - The offset in the output file descriptor to copy data to.
+     lock - The lock to hold while reading from input file objects that
+            have no file descriptor.
+     policy - The I/O policy to copy with, as described in parse_io_policy;
+              None by default.
+    Returns:
+     Nothing.
+    '''
+    (preallocate_output, nocache) = parse_io_policy(policy)
+
+    (infp, in_offset) = unwrap_window(infp, in_offset)
+    in_fd = file_fileno(infp)
+
+    if preallocate_output:
+        preallocate(out_fd, out_offset, data_length)
+    if nocache:
+        if in_fd is not None:
+            fadvise(in_fd, in_offset, data_length, 'sequential')
+        _copy_data_positional(data_length, blocksize, infp, in_offset, in_fd,
+                              out_fd, out_offset, lock)
+        # Other copies may be writing next to this one, so there is no
+        # window to drop a step behind; just drop this copy once it is done.
+        if in_fd is not None:
+            fadvise(in_fd, in_offset, data_length, 'dontneed')
+        fadvise(out_fd, out_offset, data_length, 'dontneed')
+        return
+
+    _copy_data_positional(data_length, blocksize, infp, in_offset, in_fd,
+                          out_fd, out_offset, lock)
+
+
+def _copy_data_positional(data_length, blocksize, infp, in_offset, in_fd,
+                          out_fd, out_offset, lock):
+    '''
+    An internal function to copy data to a fixed offset in the output file
+    descriptor, with the copy methods described in copy_data_positional.
+
+    Parameters:
+     data_length - The amount of data to copy.
+     blocksize - How much data to copy per iteration.
+     infp - The file object to copy data from.
+     in_offset - The offset in the input file object to start copying from.
+     in_fd - The file descriptor of infp, or None if it has none.
+     out_fd - The file descriptor to copy data to.
+     out_offset - The offset in the output file descriptor to copy data to.
+     lock - The lock to hold while reading from input file objects that
+            have no file descriptor.
+    Returns:
+     Nothing.
+    '''
+    left = data_length
+    if in_fd is not None:
+        if _reflink(in_fd, in_offset, out_fd, out_offset, left):
+            return
+        copied, done = _copy_file_range(in_fd, in_offset, out_fd, out_offset,
+                                        left)
+        if done:
+            return
+        in_offset += copied
+        out_offset += copied
+        left -= copied
+
+    if left > 0:
+        _count_copy('loop')
+    while left > 0:
+        readsize = min(left, blocksize)
+        if in_fd is not None:
+            data = os.pread(in_fd, readsize, in_offset)
+        else:
+            with lock:
+                infp.seek(in_offset)
+                data = infp.read(readsize)
+        # As in copy_data, a file that is shorter than it claims to be just
+        # ends the copy early.
+        if not data:
+            break
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(out_fd, view, out_offset)
+            view = view[written:]
+            out_offset += written
+        in_offset += len(data)
+        left -= len(data)
+
+
+class FileWindow(object):
+    '''
+    A file-like object that makes the part of another file object starting at
+    an offset look like a whole file, so that an ISO embedded in a larger
+    image can be used as if it started at byte 0.  The file descriptor is not
+    exposed, since its offsets would not match; PositionalReader and
+    copy_data_positional see through the window to the underlying file
+    object instead, so they can still use it.
+    '''
+    __slots__ = ['fp', 'offset']
+
+    def __init__(self, fp, offset):
+        self.fp = fp
+        self.offset = offset
+
+    @property
+    def mode(self):
+        '''
+        The mode of the underlying file object.
+        '''
+        return self.fp.mode
+
+    def fileno(self):
+        '''
+        A method to get the file descriptor of the window, which is not
+        supported.
+
+        Parameters:
+         None.
+        Returns:
+         Nothing; io.UnsupportedOperation is always raised.
+        '''
+        raise io.UnsupportedOperation("fileno")
+
+    def tell(self):
+        '''
+        A method to get the current position within the window.
+
+        Parameters:
+         None.
+        Returns:
+         The current position within the window.
+        '''
+        return self.fp.tell() - self.offset
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        '''
+        A method to change the current position within the window.
+
+        Parameters:
+         offset - The offset to seek to.
+         whence - What the offset is relative to; os.SEEK_SET, os.SEEK_CUR,
+                  or os.SEEK_END.
+        Returns:
+         The new position within the window.
+        '''
+        if whence == os.SEEK_SET:
+            offset += self.offset
+        self.fp.seek(offset, whence)
+        return self.tell()
+
+    def read(self, size=-1):
+        '''
+        A method to read data from the current position within the window.
+
+        Parameters:
+         size - The maximum number of bytes to read; if negative, read up to
+                the end.
+        Returns:
+         The data that was read.
+        '''
+        return self.fp.read(size)
+
+    def write(self, data):
+        '''
+        A method to write data at the current position within the window.
+
+        Parameters:
+         data - The data to write.
+        Returns:
+         The number of bytes written.
+        '''
+        return self.fp.write(data)
+
+    def flush(self):
+        '''
+        A method to flush the underlying file object.
+
+        Parameters:
+         None.
+        Returns:
+         Nothing.
+        '''
+        self.fp.flush()
+
+    def close(self):
+        '''
+        A method to close the underlying file object.
+
+        Parameters:
+         None.
+        Returns:
+         Nothing.
+        '''
+        self.fp.close()
+
+
+def unwrap_window(fp, offset):
+    '''
+    A function to translate an offset in a file object to the offset in the
+    file object underneath any FileWindow.
+
+    Parameters:
+     fp - The file object.
+     offset - The offset within the file object.
+    Returns:
+     A tuple of the underlying file object and the offset within it.
+    '''
+    while isinstance(fp, FileWindow):
+        offset += fp.offset
+        fp = fp.fp
+    return (fp, offset)
+
+
+# The lock held while reading from file objects that can only be read by
+# seeking them; see PositionalReader.
+_seek_read_lock = threading.Lock()
+
+
+class PositionalReader(object):
+    '''
+    A read-only file-like object that reads from another file object at its
+    own position, without using or changing the position of the other file
+    object.  This allows several readers to share the same file object from
+    different threads.  Reads are done with pread if the file object is a
+    plain file, and by slicing the buffer of in-memory file objects (such
+    as BytesIO); otherwise they fall back to a seek and read while holding a
+    lock that is shared by all PositionalReader objects.
+    '''
+    __slots__ = ['fp', 'pos', '_fd']
+
+    def __init__(self, fp, pos):
+        (self.fp, self.pos) = unwrap_window(fp, pos)
+        self._fd = None
+        if hasattr(os, 'pread'):
+            self._fd = file_fileno(self.fp)
+        if self._fd is not None and hasattr(self.fp, 'flush'):
+            # pread goes around any buffering in the file object, so make sure
+            # anything written through it is visible first.
+            self.fp.flush()
+
+    def _end(self):
+        '''
+        An internal method to get the length of the underlying file object.
+
+        Parameters:
+         None.
+        Returns:
+         The length of the underlying file object.
+        '''
+        if self._fd is not None:
+            return os.fstat(self._fd).st_size
+        with _seek_read_lock:
+            old = self.fp.tell()
+            self.fp.seek(0, os.SEEK_END)
+            end = self.fp.tell()
+            self.fp.seek(old)
+        return end
+
+    def fileno(self):
+        '''
+        A method to get the file descriptor of the underlying file object.
+
+        Parameters:
+         None.
+        Returns:
+         The file descriptor of the underlying file object.  This raises
+         io.UnsupportedOperation if the underlying file object is not a plain
+         file, since the descriptor would not hold the data read through it.
+        '''
+        fd = file_fileno(self.fp)
+        if fd is None:
+            raise io.UnsupportedOperation('fileno')
+        return fd
+
+    def tell(self):
+        '''
+        A method to get the current position of this reader.
+
+        Parameters:
+         None.
+        Returns:
+         The current position of this reader.
+        '''
+        return self.pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        '''
+        A method to change the position of this reader.  The position of the
+        underlying file object is not changed.
+
+        Parameters:
+         offset - The offset to seek to.
+         whence - What the offset is relative to; os.SEEK_SET, os.SEEK_CUR,
+                  or os.SEEK_END.
+        Returns:
+         The new position of this reader.
+        '''
+        if whence == os.SEEK_SET:
+            self.pos = offset
+        elif whence == os.SEEK_CUR:
+            self.pos += offset
+        elif whence == os.SEEK_END:
+            self.pos = self._end() + offset
+        else:
+            raise pycdlibexception.PyCdlibInvalidInput("Invalid whence %d" % (whence))
+        return self.pos
+
+    def read(self, size=-1):
+        '''
+        A method to read data from the current position of this reader.
+
+        Parameters:
+         size - The maximum number of bytes to read; if negative, read up to
+                the end of the underlying file object.
+        Returns:
+         The data that was read.
+        '''
+        if size < 0:
+            size = max(self._end() - self.pos, 0)
+
+        if self._fd is not None:
+            data = os.pread(self._fd, size, self.pos)
+        elif hasattr(self.fp, 'getbuffer'):
+            buf = self.fp.getbuffer()
+            try:
+                data = buf[self.pos:self.pos + size].tobytes()
+            finally:
+                buf.release()
+        else:
+            with _seek_read_lock:
+                old = self.fp.tell()
+                self.fp.seek(self.pos)
+                data = self.fp.read(size)
+                self.fp.seek(old)
+
+        self.pos += len(data)
+        return data
 
 
 def encode_space_pad(instr, length, encoding):
@@ -3199,14 +3199,14 @@ def test_new_duplicate_pvd_joliet():
 
     iso.close()
 
-def test_new_write_fp_not_binary():
+def test_new_write_fp_not_binary(tmpdir):
     # Create a new ISO.
     iso = pycdlib.PyCdlib()
 
     iso.new()
 
     with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
-        with open(os.path.join(str(), 'out.iso'), 'w') as outfp:
+        with open(str(tmpdir.join('out.iso')), 'w') as outfp:
             iso.write_fp(outfp)
 
     iso.close()
@@ -3718,3 +3718,1319 @@ local-hostname: cloudimg
     do_a_test(iso, check_joliet_ident_encoding)
 
     iso.close()
+
+@pytest.fixture
+def fixed_clock(monkeypatch):
+    # Directory record dates are taken at write time, so pin the clock to
+    # be able to compare separate writes.
+    monkeypatch.setattr(pycdlib.dates.time, 'time', lambda: 1500000000.0)
+
+def _add_isolinux(iso, isohybrid=True, padding=b'', joliet_path=None,
+                  boot_info_table=True):
+    # Add an isolinux boot file and make it the El Torito boot entry.
+    isolinuxstr = b'\x00'*0x40 + b'\xfb\xc0\x78\x70' + padding
+    iso.add_fp(BytesIO(isolinuxstr), len(isolinuxstr), "/ISOLINUX.BIN;1", rr_name="isolinux.bin", joliet_path=joliet_path)
+    iso.add_eltorito("/ISOLINUX.BIN;1", "/BOOT.CAT;1", boot_load_size=4, boot_info_table=boot_info_table)
+    if isohybrid:
+        iso.add_isohybrid()
+
+def test_new_open_lazy():
+    iso = pycdlib.PyCdlib()
+    iso.new(rock_ridge="1.09", joliet=3)
+
+    iso.add_directory("/DIR1", rr_name="dir1", joliet_path="/dir1")
+    iso.add_directory("/DIR1/SUBDIR1", rr_name="subdir1", joliet_path="/dir1/subdir1")
+    foostr = b"foo\n"
+    iso.add_fp(BytesIO(foostr), len(foostr), "/DIR1/SUBDIR1/FOO.;1", rr_name="foo", joliet_path="/dir1/subdir1/foo")
+
+    out = BytesIO()
+    iso.write_fp(out)
+    iso.close()
+
+    iso2 = pycdlib.PyCdlib()
+    iso2.open_fp(out, lazy=True)
+
+    rec = iso2.get_record(iso_path="/DIR1")
+    assert(len(rec.children) == 0)
+
+    names = [c.file_identifier() for c in iso2.list_children(iso_path="/DIR1")]
+    assert(names == [b'.', b'..', b'SUBDIR1'])
+
+    rec = iso2.get_record(rr_path="/dir1/subdir1/foo")
+    assert(rec.data_length == len(foostr))
+
+    fooout = BytesIO()
+    iso2.get_file_from_iso_fp(fooout, joliet_path="/dir1/subdir1/foo")
+    assert(fooout.getvalue() == foostr)
+
+    iso2.close()
+
+def test_new_open_lazy_relocated():
+    iso = pycdlib.PyCdlib()
+    iso.new(rock_ridge="1.09")
+    # Deep enough to be relocated to rr_moved.
+    path = ""
+    for i in range(1, 9):
+        path += "/DIR%d" % (i)
+        iso.add_directory(path, rr_name="dir%d" % (i))
+    iso.add_fp(BytesIO(b"deep\n"), 5, path + "/DEEP.;1", rr_name="deep")
+    iso.add_directory("/OTHER", rr_name="other")
+    iso.add_directory("/OTHER/SUB", rr_name="sub")
+
+    out = BytesIO()
+    iso.write_fp(out)
+    iso.close()
+
+    deep = "/dir1/dir2/dir3/dir4/dir5/dir6/dir7/dir8"
+    for first in ["/dir1/dir2/dir3/dir4/dir5/dir6/dir7", "/rr_moved/dir8"]:
+        iso = pycdlib.PyCdlib()
+        iso.open_fp(out, lazy=True)
+        list(iso.list_children(rr_path=first))
+
+        # Only the directories on the way to the relocated directory were
+        # parsed to resolve its links, not the rest of the tree.
+        assert(len(iso.get_record(rr_path="/other").children) == 0)
+        rec = iso.get_record(rr_path=deep + "/deep")
+        assert(rec.data_length == 5)
+        dir8 = iso.get_record(rr_path=deep)
+        assert(dir8.rock_ridge.moved_to_cl_dr is not None)
+        assert(len(iso.get_record(rr_path="/other").children) == 0)
+
+        written = BytesIO()
+        iso.write_fp(written)
+        assert(written.getvalue() == out.getvalue())
+        iso.close()
+
+def test_new_open_lazy_add_file():
+    iso = pycdlib.PyCdlib()
+    iso.new(joliet=3)
+
+    iso.add_directory("/DIR1", joliet_path="/dir1")
+
+    out = BytesIO()
+    iso.write_fp(out)
+    iso.close()
+
+    iso2 = pycdlib.PyCdlib()
+    iso2.open_fp(BytesIO(out.getvalue()), lazy=True)
+
+    foostr = b"foo\n"
+    iso2.add_fp(BytesIO(foostr), len(foostr), "/FOO.;1", joliet_path="/foo")
+
+    rec = iso2.get_record(iso_path="/DIR1")
+    assert(len(rec.children) == 2)
+
+    do_a_test(iso2, check_joliet_onefileonedir)
+
+    iso2.close()
+
+def test_new_open_mmap(tmpdir):
+    iso = pycdlib.PyCdlib()
+    iso.new(rock_ridge="1.09")
+
+    iso.add_directory("/DIR1", rr_name="dir1")
+    foostr = b"foo\n"
+    iso.add_fp(BytesIO(foostr), len(foostr), "/DIR1/FOO.;1", rr_name="foo")
+    iso.add_symlink("/SYM.;1", "sym", "dir1/foo")
+
+    outfile = str(tmpdir.join("mmaptest.iso"))
+    iso.write(outfile)
+    iso.close()
+
+    iso2 = pycdlib.PyCdlib()
+    iso2.open(outfile)
+
+    rec = iso2.get_record(rr_path="/dir1/foo")
+    assert(rec.file_identifier() == b"FOO.;1")
+    assert(type(rec.file_identifier()) == bytes)
+    assert(iso2.get_record(rr_path="/sym").rock_ridge.symlink_path() == b"dir1/foo")
+
+    fooout = BytesIO()
+    iso2.get_file_from_iso_fp(fooout, rr_path="/dir1/foo")
+    assert(fooout.getvalue() == foostr)
+
+    out = BytesIO()
+    iso2.write_fp(out)
+    iso2.close()
+
+    with open(outfile, 'rb') as infp:
+        assert(infp.read() == out.getvalue())
+
+def test_new_open_bz2(tmpdir):
+    bz2 = pytest.importorskip("bz2")
+
+    iso = pycdlib.PyCdlib()
+    iso.new()
+    foostr = b"foo\n"
+    iso.add_fp(BytesIO(foostr), len(foostr), "/FOO.;1")
+    isodata = BytesIO()
+    iso.write_fp(isodata)
+    iso.close()
+
+    # A BZ2File reports the descriptor of the compressed file from fileno(),
+    # so the ISO must be read through the object rather than mapped.
+    outfile = str(tmpdir.join("bz2test.iso.bz2"))
+    with bz2.BZ2File(outfile, "wb") as outfp:
+        outfp.write(isodata.getvalue())
+
+    with bz2.BZ2File(outfile, "rb") as infp:
+        iso2 = pycdlib.PyCdlib()
+        iso2.open_fp(infp)
+        fooout = BytesIO()
+        iso2.get_file_from_iso_fp(fooout, iso_path="/FOO.;1")
+        assert(fooout.getvalue() == foostr)
+        iso2.close()
+
+def test_new_rr_truncated_entries():
+    # Each entry is cut off before the end of its fixed-size part.
+    truncated = [
+        (pycdlib.rockridge.RRSPRecord, b"SP\x07\x01\xbe"),
+        (pycdlib.rockridge.RRRRRecord, b"RR\x05\x01"),
+        (pycdlib.rockridge.RRCERecord, b"CE\x1c\x01" + b"\x00" * 20),
+        (pycdlib.rockridge.RRPXRecord, b"PX\x24\x01" + b"\x00" * 30),
+        (pycdlib.rockridge.RRPNRecord, b"PN\x14\x01" + b"\x00" * 10),
+        (pycdlib.rockridge.RRCLRecord, b"CL\x0c\x01\x00\x00"),
+        (pycdlib.rockridge.RRTFRecord, b"TF\x05"),
+    ]
+    for rrclass, rrstr in truncated:
+        with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidISO):
+            rrclass().parse(rrstr)
+
+    # A 1.12 PX entry that is missing its serial number.
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidISO):
+        pycdlib.rockridge.RRPXRecord().parse(b"PX\x2c\x01" + b"\x00" * 32)
+
+    # A symlink component that runs off of the end of the SL entry.
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidISO):
+        pycdlib.rockridge.RRSLRecord().parse(b"SL\x09\x01\x00\x00", False)
+
+    # A System Use area whose last entry is cut off.
+    rr = pycdlib.rockridge.RockRidge()
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidISO):
+        rr.parse(b"NM\x08\x01\x00foo" + b"PX\x24\x01" + b"\x00" * 8, False, 0, False)
+
+def test_new_rr_register_entry_parser():
+    # An NM entry for "foo" followed by a zisofs ZF entry.
+    sua = b"NM\x08\x01\x00foo" + b"ZF\x10\x01pz\x02\x0f\x00\x00\x10\x00\x00\x00\x00\x00"
+
+    rr = pycdlib.rockridge.RockRidge()
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidISO):
+        rr.parse(sua, False, 0, False)
+
+    seen = []
+    def parse_zf(rr, entry_list, rrstr, is_first_dir_record_of_root):
+        seen.append(bytes(rrstr[:4]))
+
+    pycdlib.rockridge.register_entry_parser(b"ZF", parse_zf)
+    try:
+        rr = pycdlib.rockridge.RockRidge()
+        rr.parse(sua, False, 0, False)
+    finally:
+        pycdlib.rockridge.unregister_entry_parser(b"ZF")
+
+    assert(seen == [b"ZF\x10\x01"])
+    assert(rr.name() == b"foo")
+    # The ZF entry is written back out along with the entries PyCdlib knows.
+    assert(rr.record_dr_entries() == sua)
+
+    assert(b"ZF" not in pycdlib.rockridge._ENTRY_PARSERS)
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        pycdlib.rockridge.unregister_entry_parser(b"ZF")
+
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        pycdlib.rockridge.register_entry_parser(b"ZFX", parse_zf)
+
+def test_new_rr_register_entry_parser_replace_builtin():
+    builtin = pycdlib.rockridge._ENTRY_PARSERS[b"SF"]
+
+    pycdlib.rockridge.register_entry_parser(b"SF", lambda rr, entry_list, rrstr, first: None)
+    try:
+        assert(pycdlib.rockridge._ENTRY_PARSERS[b"SF"] is not builtin)
+    finally:
+        pycdlib.rockridge.unregister_entry_parser(b"SF")
+
+    assert(pycdlib.rockridge._ENTRY_PARSERS[b"SF"] is builtin)
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        pycdlib.rockridge.unregister_entry_parser(b"SF")
+
+    # NM, PX and TF are always parsed inline, so they can't be replaced.
+    for signature in (b"NM", b"PX", b"TF"):
+        with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+            pycdlib.rockridge.register_entry_parser(signature, lambda rr, entry_list, rrstr, first: None)
+
+def test_new_path_index():
+    iso = pycdlib.PyCdlib()
+    iso.new(rock_ridge="1.09", joliet=3)
+
+    iso.add_directory("/DIR1", rr_name="dir1", joliet_path="/dir1")
+    foostr = b"foo\n"
+    iso.add_fp(BytesIO(foostr), len(foostr), "/DIR1/FOO.;1", rr_name="foo", joliet_path="/dir1/foo")
+    iso.add_fp(BytesIO(foostr), len(foostr), "/DIR1/BAR.;1", rr_name="bar", joliet_path="/dir1/bar")
+
+    rec = iso.get_record(iso_path="/DIR1/FOO.;1")
+    start = iso.path_index_info()['iso']
+    assert(iso.get_record(iso_path="/DIR1/FOO.;1") is rec)
+    assert(iso.get_record(rr_path="/dir1/foo") is rec)
+
+    info = iso.path_index_info()
+    assert(info['iso'].hits == start.hits + 1)
+    assert(info['rr'].currsize == 2)
+
+    iso.rm_file("/DIR1/FOO.;1", rr_name="foo", joliet_path="/dir1/foo")
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.get_record(iso_path="/DIR1/FOO.;1")
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.get_record(joliet_path="/dir1/foo")
+    assert(iso.path_index_info()['rr'].currsize == 1)
+    assert(iso.get_record(iso_path="/DIR1/BAR.;1").file_identifier() == b"BAR.;1")
+
+    iso.close()
+
+    iso.new()
+    assert(iso.path_index_info()['iso'] == (0, 0, 0))
+    iso.close()
+
+def test_new_get_record_by_extent():
+    iso = pycdlib.PyCdlib()
+    iso.new(rock_ridge="1.09", joliet=3)
+
+    path = ''
+    for i in range(1, 9):
+        path += '/DIR%d' % (i)
+        iso.add_directory(path, rr_name='dir%d' % (i), joliet_path=path.lower())
+    foostr = b"foo\n"
+    iso.add_fp(BytesIO(foostr), len(foostr), path + "/FOO.;1", rr_name="foo", joliet_path=path.lower() + "/foo")
+
+    out = BytesIO()
+    iso.write_fp(out)
+    iso.close()
+
+    iso = pycdlib.PyCdlib()
+    iso.open_fp(out)
+
+    for rr_path in ["/", "/dir1", "/dir1/dir2/dir3/dir4/dir5/dir6/dir7/dir8", "/dir1/dir2/dir3/dir4/dir5/dir6/dir7/dir8/foo"]:
+        rec = iso.get_record(rr_path=rr_path)
+        assert(iso.get_record_by_extent(rec.extent_location()) is rec)
+
+    rec = iso.get_record(joliet_path="/dir1/dir2/dir3/dir4/dir5/dir6/dir7/dir8/foo")
+    assert(iso.get_record_by_extent(rec.extent_location(), joliet=True) is rec)
+
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.get_record_by_extent(iso.pvd.space_size + 100)
+
+    iso.rm_file("/DIR1/DIR2/DIR3/DIR4/DIR5/DIR6/DIR7/DIR8/FOO.;1", rr_name="foo", joliet_path="/dir1/dir2/dir3/dir4/dir5/dir6/dir7/dir8/foo")
+    iso.add_fp(BytesIO(foostr), len(foostr), "/BAR.;1", rr_name="bar")
+    bar = iso.get_record(iso_path="/BAR.;1")
+    assert(iso.get_record_by_extent(bar.extent_location()) is bar)
+
+    iso.close()
+
+def test_new_eltorito_hard_linked_boot_file():
+    iso = pycdlib.PyCdlib()
+    iso.new()
+
+    bootstr = b"boot\n"
+    iso.add_fp(BytesIO(bootstr), len(bootstr), "/BOOT.;1")
+    iso.add_hard_link(iso_old_path="/BOOT.;1", iso_new_path="/BOOT2.;1")
+    iso.add_eltorito("/BOOT.;1", "/BOOT.CAT;1")
+
+    out = BytesIO()
+    iso.write_fp(out)
+    iso.close()
+
+    iso = pycdlib.PyCdlib()
+    iso.open_fp(out)
+
+    # Both records share the extent of the boot file; as every record on the
+    # PVD is offered to the boot catalog in turn, the last one wins.
+    boot = iso.get_record(iso_path="/BOOT.;1")
+    boot2 = iso.get_record(iso_path="/BOOT2.;1")
+    assert(boot.extent_location() == boot2.extent_location())
+    assert(iso.eltorito_boot_catalog.initial_entry.dirrecord is boot2)
+    assert(iso.eltorito_boot_catalog.dirrecord is iso.get_record(iso_path="/BOOT.CAT;1"))
+
+    iso.close()
+
+def test_new_batch_dirs_overflow_ptr_extent():
+    numdirs = 295
+
+    # Create a new ISO.
+    iso = pycdlib.PyCdlib(always_consistent=True)
+    iso.new()
+
+    with iso.batch():
+        for i in reversed(range(1, 1+numdirs)):
+            iso.add_directory("/DIR%d" % i)
+
+    do_a_test(iso, check_dirs_overflow_ptr_extent)
+
+    iso.close()
+
+def test_new_batch_overflow_correct_extents():
+    # Create a new ISO.
+    iso = pycdlib.PyCdlib()
+    iso.new(joliet=3, rock_ridge="1.09")
+
+    thisstr = b'\n'
+    iso.begin_batch()
+    for letter in ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'i', 'j', 'k', 'l', 'm', 'n']:
+        iso.add_fp(BytesIO(thisstr), len(thisstr), "/"+letter.upper()*8+'.;1', rr_name=letter*136, joliet_path="/"+letter*64)
+
+    iso.add_fp(BytesIO(thisstr), len(thisstr), "/OOOOOOOO.;1", rr_name='o'*57, joliet_path="/"+'o'*57)
+
+    iso.add_fp(BytesIO(thisstr), len(thisstr), "/P.;1", rr_name='p', joliet_path="/p")
+
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.write_fp(BytesIO())
+    iso.commit_batch()
+
+    do_a_test(iso, check_overflow_correct_extents)
+
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.commit_batch()
+
+    iso.close()
+
+def test_new_batch_rm_large_directory():
+    # Create a new ISO.
+    iso = pycdlib.PyCdlib()
+    iso.new(joliet=3)
+
+    with iso.batch():
+        for i in range(1, 50):
+            iso.add_directory("/DIR%d" % i, joliet_path="/dir%d" % i)
+
+        with iso.batch():
+            for i in range(1, 50):
+                iso.rm_directory("/DIR%d" % i, joliet_path="/dir%d" % i)
+
+    do_a_test(iso, check_joliet_nofiles)
+
+    iso.close()
+
+def test_new_preserve_extents():
+    iso = pycdlib.PyCdlib()
+    iso.new(rock_ridge="1.09")
+    for i in range(1, 21):
+        data = b"a" * (2048 + i)
+        iso.add_fp(BytesIO(data), len(data), "/FILE%d.;1" % (i), rr_name="file%d" % (i))
+
+    out = BytesIO()
+    iso.write_fp(out)
+    iso.close()
+
+    iso = pycdlib.PyCdlib(preserve_extents=True)
+    iso.open_fp(out)
+    orig_extents = {}
+    for i in range(1, 21):
+        orig_extents[i] = iso.get_record(iso_path="/FILE%d.;1" % (i)).extent_location()
+    orig_size = iso.pvd.space_size
+
+    # Enough new entries to make the root directory grow by an extent, which
+    # pushes the metadata into the first file.
+    for i in range(1, 41):
+        data = ("new%d\n" % (i)).encode()
+        iso.add_fp(BytesIO(data), len(data), "/NEW%d.;1" % (i), rr_name="new%d" % (i))
+
+    moved = iso.force_consistency()
+
+    kept = 0
+    for i in range(1, 21):
+        rec = iso.get_record(iso_path="/FILE%d.;1" % (i))
+        if rec.extent_location() == orig_extents[i]:
+            kept += 1
+        else:
+            assert(rec.extent_location() >= orig_size)
+    assert(kept > 0)
+    # Only the data that was in the way of the larger root directory moved.
+    assert(moved == 20 - kept)
+
+    for i in range(1, 41):
+        assert(iso.get_record(iso_path="/NEW%d.;1" % (i)).extent_location() >= orig_size)
+
+    # Nothing changed since the last layout, so nothing moves.
+    assert(iso.force_consistency() == 0)
+
+    out2 = BytesIO()
+    iso.write_fp(out2)
+    assert(len(out2.getvalue()) == iso.pvd.space_size * 2048)
+    iso.close()
+
+    iso = pycdlib.PyCdlib()
+    iso.open_fp(out2)
+    for i in range(1, 21):
+        data = BytesIO()
+        iso.get_and_write_fp("/FILE%d.;1" % (i), data)
+        assert(data.getvalue() == b"a" * (2048 + i))
+    for i in range(1, 41):
+        data = BytesIO()
+        iso.get_and_write_fp("/NEW%d.;1" % (i), data)
+        assert(data.getvalue() == ("new%d\n" % (i)).encode())
+    iso.close()
+
+def test_new_write_workers(tmpdir, fixed_clock):
+    iso = pycdlib.PyCdlib()
+    iso.new(rock_ridge="1.09")
+    for i in range(1, 11):
+        src = tmpdir.join("file%d" % (i))
+        src.write(b"a" * (3000 * i), mode='wb')
+        iso.add_file(str(src), "/FILE%d.;1" % (i), rr_name="file%d" % (i))
+    for i in range(1, 11):
+        data = b"b" * (1000 * i)
+        iso.add_fp(BytesIO(data), len(data), "/FP%d.;1" % (i), rr_name="fp%d" % (i))
+    _add_isolinux(iso)
+
+    serial = BytesIO()
+    iso.write_fp(serial)
+
+    serialfile = tmpdir.join("serial.iso")
+    iso.write(str(serialfile))
+    assert(serialfile.read(mode='rb') == serial.getvalue())
+
+    parallel = tmpdir.join("parallel.iso")
+    iso.write(str(parallel), workers=4)
+    assert(parallel.read(mode='rb') == serial.getvalue())
+
+    iso.close()
+
+    # And again with the data coming from the original ISO.
+    iso = pycdlib.PyCdlib()
+    iso.open(str(parallel))
+    reparallel = tmpdir.join("reparallel.iso")
+    iso.write(str(reparallel), workers=4)
+    assert(reparallel.read(mode='rb') == serial.getvalue())
+    iso.close()
+
+def test_new_open_image(fixed_clock):
+    iso = pycdlib.PyCdlib()
+    iso.new(rock_ridge="1.09", joliet=3)
+    for i in range(1, 11):
+        data = ("%d" % (i % 10)).encode() * (1500 * i)
+        iso.add_fp(BytesIO(data), len(data), "/FILE%d.;1" % (i), rr_name="file%d" % (i), joliet_path="/file%d" % (i))
+    _add_isolinux(iso)
+
+    out = BytesIO()
+    iso.write_fp(out)
+    expected = out.getvalue()
+
+    img = iso.open_image()
+    assert(img.readable())
+    assert(img.seekable())
+    assert(img.read() == expected)
+    assert(img.seek(0, os.SEEK_END) == len(expected))
+    assert(img.read(10) == b"")
+
+    # Reads that straddle metadata, file data and the gaps between them.
+    for (offset, length) in [(0, 512), (16 * 2048 - 7, 2048 * 3), (len(expected) - 100, 100), (12345, 98765)]:
+        img.seek(offset)
+        assert(img.read(length) == expected[offset:offset + length])
+
+    with pytest.raises(ValueError):
+        img.seek(-1)
+
+    img.close()
+    with pytest.raises(ValueError):
+        img.seek(0)
+    iso.close()
+
+def test_new_open_image_not_initialized():
+    iso = pycdlib.PyCdlib()
+
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.open_image()
+
+def test_new_write_stream(fixed_clock):
+    class NonSeekable(object):
+        def __init__(self):
+            self.data = BytesIO()
+            self.mode = 'wb'
+
+        def write(self, data):
+            self.data.write(data)
+
+        def seekable(self):
+            return False
+
+    iso = pycdlib.PyCdlib()
+    iso.new(rock_ridge="1.09")
+    for i in range(1, 11):
+        data = ("%d" % (i % 10)).encode() * (1500 * i)
+        iso.add_fp(BytesIO(data), len(data), "/FILE%d.;1" % (i), rr_name="file%d" % (i))
+    _add_isolinux(iso)
+
+    out = BytesIO()
+    iso.write_fp(out)
+
+    # A non-seekable output is streamed automatically.
+    stream = NonSeekable()
+    iso.write_fp(stream)
+    assert(stream.data.getvalue() == out.getvalue())
+
+    # And streaming can be asked for on a seekable output, too.
+    stream = BytesIO()
+    iso.write_fp(stream, blocksize=1000, stream=True)
+    assert(stream.getvalue() == out.getvalue())
+
+    iso.close()
+
+def test_new_layout(fixed_clock):
+    iso = pycdlib.PyCdlib()
+    iso.new(rock_ridge="1.09")
+    for i in range(1, 6):
+        data = ("%d" % (i)).encode() * (1500 * i)
+        iso.add_fp(BytesIO(data), len(data), "/FILE%d.;1" % (i), rr_name="file%d" % (i))
+    _add_isolinux(iso, isohybrid=False)
+
+    out = BytesIO()
+    iso.write_fp(out)
+    expected = out.getvalue()
+
+    regions = iso.layout()
+
+    # The regions cover the whole image, in order, without overlapping.
+    offset = 0
+    for region in regions:
+        assert(region.offset == offset)
+        assert(region.length > 0)
+        offset += region.length
+    assert(offset == len(expected))
+
+    # Building the image from the regions gives what write_fp() does.
+    built = BytesIO()
+    for region in regions:
+        if region.kind == "zero":
+            built.write(b'\x00' * region.length)
+        elif region.kind == "metadata":
+            built.write(region.data)
+        else:
+            assert(region.kind == "file")
+            region.source.seek(region.source_offset)
+            built.write(region.source.read(region.length))
+    assert(built.getvalue() == expected)
+
+    # The boot file is where El Torito says it is, with the boot info table
+    # patched in at offset 8.
+    bootrec = iso.get_record(iso_path="/ISOLINUX.BIN;1")
+    boot_regions = [region for region in regions if region.record is bootrec]
+    assert(boot_regions[0].offset == bootrec.extent_location() * 2048)
+    assert(boot_regions[0].length == 8)
+    assert(boot_regions[1].offset == bootrec.extent_location() * 2048 + 64)
+
+    iso.close()
+
+def test_new_copy_data_counters(tmpdir):
+    indir = tmpdir.mkdir("copy")
+    infile = str(indir.join("in"))
+    data = b'\x01' * 2048 * 3 + b'\x02' * 100
+    with open(infile, 'wb') as outfp:
+        outfp.write(data)
+
+    pycdlib.utils.reset_copy_data_counters()
+    counters = pycdlib.utils.copy_data_counters()
+    assert(sum(counters.values()) == 0)
+
+    # A file object with no descriptor can only be copied in a loop.
+    out = BytesIO()
+    with open(infile, 'rb') as infp:
+        pycdlib.utils.copy_data(len(data), 2048, infp, out)
+    with open(infile, 'rb') as infp:
+        pycdlib.utils.copy_data(len(data), 2048, BytesIO(infp.read()), out)
+    assert(out.getvalue() == data * 2)
+    counters = pycdlib.utils.copy_data_counters()
+    assert(counters['loop'] == 2)
+
+    # Between two real files one of the kernel copies is used, and the file
+    # positions end up where a loop would have left them.
+    outfile = str(indir.join("out"))
+    with open(infile, 'rb') as infp:
+        with open(outfile, 'wb') as outfp:
+            outfp.write(b'\x00' * 10)
+            infp.seek(2048)
+            pycdlib.utils.copy_data(len(data) - 2048, 2048, infp, outfp)
+            assert(infp.tell() == len(data))
+            assert(outfp.tell() == 10 + len(data) - 2048)
+    with open(outfile, 'rb') as infp:
+        assert(infp.read() == b'\x00' * 10 + data[2048:])
+    counters = pycdlib.utils.copy_data_counters()
+    assert(sum(counters.values()) == 3)
+
+    pycdlib.utils.reset_copy_data_counters()
+    assert(sum(pycdlib.utils.copy_data_counters().values()) == 0)
+
+def test_new_write_sparse(tmpdir, fixed_clock):
+    iso = pycdlib.PyCdlib()
+    iso.new(rock_ridge="1.09")
+    zeros = tmpdir.join("zeros")
+    zeros.write(b"z" * 100 + b"\x00" * (1024 * 1024) + b"z" * 100, mode='wb')
+    iso.add_file(str(zeros), "/ZEROS.;1", rr_name="zeros")
+    for i in range(1, 11):
+        data = ("%d" % (i % 10)).encode() * (1500 * i)
+        iso.add_fp(BytesIO(data), len(data), "/FILE%d.;1" % (i), rr_name="file%d" % (i))
+    _add_isolinux(iso)
+
+    out = BytesIO()
+    iso.write_fp(out)
+
+    sparse = tmpdir.join("sparse.iso")
+    iso.write(str(sparse), sparse=True)
+    assert(sparse.read(mode='rb') == out.getvalue())
+
+    sparse_data = tmpdir.join("sparse_data.iso")
+    iso.write(str(sparse_data), sparse=True, sparse_data=True)
+    assert(sparse_data.read(mode='rb') == out.getvalue())
+
+    # Check that holes were really made, if the filesystem supports them.
+    probe = tmpdir.join("probe")
+    with open(str(probe), 'wb') as fp:
+        fp.truncate(1024 * 1024)
+    if getattr(os.stat(str(probe)), 'st_blocks', None) == 0:
+        for path in [sparse, sparse_data]:
+            st = os.stat(str(path))
+            assert(st.st_blocks * 512 < st.st_size)
+        # Most of the megabyte of zeros in the file data is a hole too.
+        assert(os.stat(str(sparse_data)).st_blocks * 512 < os.stat(str(sparse)).st_blocks * 512 - 512 * 1024)
+
+    # Writing over a file that is already there still reads back the same.
+    with open(str(sparse_data), 'r+b') as outfp:
+        outfp.write(b'\xff' * len(out.getvalue()))
+        iso.write_fp(outfp, sparse=True, sparse_data=True, workers=4)
+    assert(sparse_data.read(mode='rb') == out.getvalue())
+
+    # The sparse option is ignored for outputs that are not regular files.
+    bio = BytesIO()
+    iso.write_fp(bio, sparse=True, sparse_data=True)
+    assert(bio.getvalue() == out.getvalue())
+
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.write(str(sparse), sparse_data=True)
+
+    iso.close()
+
+def test_new_io_policy(tmpdir, monkeypatch, fixed_clock):
+    # Use a small window so that the page cache hints are given several
+    # times per file.
+    monkeypatch.setattr(pycdlib.utils, '_CACHE_WINDOW', 4096)
+
+    iso = pycdlib.PyCdlib()
+    iso.new(rock_ridge="1.09")
+    for i in range(1, 11):
+        src = tmpdir.join("file%d" % (i))
+        src.write(("%d" % (i % 10)).encode() * (3000 * i), mode='wb')
+        iso.add_file(str(src), "/FILE%d.;1" % (i), rr_name="file%d" % (i))
+    _add_isolinux(iso)
+
+    out = BytesIO()
+    iso.write_fp(out)
+
+    for policy in ['preallocate', 'nocache', 'all']:
+        outfile = tmpdir.join("%s.iso" % (policy))
+        iso.write(str(outfile), io_policy=policy)
+        assert(outfile.read(mode='rb') == out.getvalue())
+        iso.write(str(outfile), workers=4, io_policy=policy)
+        assert(outfile.read(mode='rb') == out.getvalue())
+
+        # The policy does nothing for file objects without a descriptor.
+        bio = BytesIO()
+        iso.write_fp(bio, io_policy=policy)
+        assert(bio.getvalue() == out.getvalue())
+
+        fetched = tmpdir.join("%s.out" % (policy))
+        iso.get_and_write("/FILE10.;1", str(fetched), io_policy=policy)
+        assert(fetched.read(mode='rb') == b"0" * 30000)
+        with open(str(fetched), 'wb') as outfp:
+            iso.get_file_from_iso_fp(outfp, rr_path="/file9", io_policy=policy)
+        assert(fetched.read(mode='rb') == b"9" * 27000)
+
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.write_fp(BytesIO(), io_policy='bogus')
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.get_and_write_fp("/FILE1.;1", BytesIO(), io_policy='bogus')
+
+    iso.close()
+
+def test_new_extract_tree(tmpdir):
+    iso = pycdlib.PyCdlib()
+    iso.new(rock_ridge="1.09", joliet=True)
+    iso.add_directory("/DIR1", rr_name="dir1", joliet_path="/dir1")
+    for i in range(1, 6):
+        data = ("%d" % (i)).encode() * (1000 * i)
+        iso.add_fp(BytesIO(data), len(data), "/DIR1/FILE%d.;1" % (i), rr_name="file%d" % (i),
+                   joliet_path="/dir1/file%d" % (i), file_mode=0o100600 + i)
+    iso.add_fp(BytesIO(b"foo\n"), 4, "/FOO.;1", rr_name="foo", joliet_path="/foo")
+    iso.add_symlink("/SYM.;1", "sym", "dir1/file1")
+    # Deep enough to be relocated to rr_moved.
+    path = ""
+    for i in range(1, 9):
+        path += "/DIR%d" % (i)
+        if i > 1:
+            iso.add_directory(path, rr_name="dir%d" % (i))
+    iso.add_fp(BytesIO(b"deep\n"), 5, path + "/DEEP.;1", rr_name="deep")
+
+    out = BytesIO()
+    iso.write_fp(out)
+    iso.close()
+
+    iso = pycdlib.PyCdlib()
+    iso.open_fp(out)
+
+    for workers in (1, 4):
+        rrdir = tmpdir.join("rr%d" % (workers))
+        iso.extract_tree("/", str(rrdir), workers=workers)
+        assert(rrdir.join("foo").read(mode='rb') == b"foo\n")
+        for i in range(1, 6):
+            extracted = rrdir.join("dir1").join("file%d" % (i))
+            assert(extracted.read(mode='rb') == ("%d" % (i)).encode() * (1000 * i))
+            assert(extracted.stat().mode & 0o777 == 0o600 + i)
+        assert(os.readlink(str(rrdir.join("sym"))) == "dir1/file1")
+        deep = rrdir.join("dir1/dir2/dir3/dir4/dir5/dir6/dir7/dir8/deep")
+        assert(deep.read(mode='rb') == b"deep\n")
+
+        jolietdir = tmpdir.join("joliet%d" % (workers))
+        iso.extract_tree("/dir1", str(jolietdir), namespace='joliet', workers=workers)
+        assert(sorted(os.listdir(str(jolietdir))) == ["file%d" % (i) for i in range(1, 6)])
+        assert(jolietdir.join("file3").read(mode='rb') == b"3" * 3000)
+
+    isodir = tmpdir.join("iso")
+    iso.extract_tree("/DIR1", str(isodir), namespace='iso')
+    assert(isodir.join("FILE2").read(mode='rb') == b"2" * 2000)
+
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.extract_tree("/FOO.;1", str(isodir), namespace='iso')
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.extract_tree("/", str(isodir), namespace='udf')
+
+    iso.close()
+
+def test_new_extract_tree_duplicate_names(tmpdir):
+    outside = tmpdir.join("outside")
+
+    # The Rock Ridge name of the file is the same as that of the symlink
+    # before it, which points outside of the directory being extracted.
+    iso = pycdlib.PyCdlib()
+    iso.new(rock_ridge="1.09")
+    iso.add_symlink("/A.;1", "evil", str(outside))
+    iso.add_fp(BytesIO(b"evil\n"), 5, "/B.;1", rr_name="evil")
+
+    out = BytesIO()
+    iso.write_fp(out)
+    iso.close()
+
+    iso = pycdlib.PyCdlib()
+    iso.open_fp(out)
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidISO):
+        iso.extract_tree("/", str(tmpdir.join("rr")))
+    assert(not outside.check())
+
+    # Symlinks that are already in the destination are not followed either.
+    isodir = tmpdir.join("iso")
+    isodir.mkdir()
+    isodir.join("B").mksymlinkto(outside)
+    with pytest.raises(OSError):
+        iso.extract_tree("/", str(isodir), namespace='iso')
+    assert(not outside.check())
+
+    iso.close()
+
+def test_new_concurrent_reads(tmpdir):
+    import threading
+
+    iso = pycdlib.PyCdlib()
+    iso.new(joliet=3)
+    for i in range(1, 9):
+        iso.add_directory("/DIR%d" % (i), joliet_path="/dir%d" % (i))
+        data = ("%d" % (i)).encode() * (5000 * i)
+        iso.add_fp(BytesIO(data), len(data), "/DIR%d/FILE.;1" % (i), joliet_path="/dir%d/file" % (i))
+
+    outfile = str(tmpdir.join("concurrent.iso"))
+    iso.write(outfile)
+    iso.close()
+
+    with open(outfile, 'rb') as infp:
+        for fp in (infp, BytesIO(infp.read())):
+            iso = pycdlib.PyCdlib()
+            iso.open_fp(fp, lazy=True)
+            fp.seek(1234)
+
+            errors = []
+
+            def reader(i):
+                try:
+                    for unused in range(10):
+                        out = BytesIO()
+                        iso.get_file_from_iso_fp(out, joliet_path="/dir%d/file" % (i))
+                        assert(out.getvalue() == ("%d" % (i)).encode() * (5000 * i))
+                except Exception as e:  # pylint: disable=broad-except
+                    errors.append(e)
+
+            threads = [threading.Thread(target=reader, args=(i,)) for i in range(1, 9)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+            assert(errors == [])
+            # None of the reads moved the file object the ISO was opened from.
+            assert(fp.tell() == 1234)
+
+            iso.close()
+
+def test_new_positional_reader_compressed(tmpdir):
+    bz2 = pytest.importorskip("bz2")
+    import io
+
+    data = b"".join(struct.pack("=L", i) for i in range(4096))
+    outfile = str(tmpdir.join("reader.bz2"))
+    with bz2.BZ2File(outfile, "wb") as outfp:
+        outfp.write(data)
+
+    # The descriptor of a BZ2File is that of the compressed file, so the
+    # reader has to go through the file object.
+    with bz2.BZ2File(outfile, "rb") as infp:
+        reader = pycdlib.utils.PositionalReader(infp, 100)
+        assert(reader.read(50) == data[100:150])
+        assert(infp.tell() == 0)
+        with pytest.raises(io.UnsupportedOperation):
+            reader.fileno()
+
+        out = BytesIO()
+        pycdlib.utils.copy_data(200, 64, reader, out)
+        assert(out.getvalue() == data[150:350])
+
+def test_new_open_file_from_iso():
+    import tarfile
+
+    iso = pycdlib.PyCdlib()
+    iso.new(rock_ridge="1.09", joliet=3)
+
+    tarout = BytesIO()
+    tar = tarfile.open(fileobj=tarout, mode='w')
+    for i in range(1, 4):
+        data = ("%d" % (i)).encode() * (3000 * i)
+        info = tarfile.TarInfo("member%d" % (i))
+        info.size = len(data)
+        tar.addfile(info, BytesIO(data))
+    tar.close()
+    tarstr = tarout.getvalue()
+    iso.add_fp(BytesIO(tarstr), len(tarstr), "/ARCHIVE.TAR;1", rr_name="archive.tar", joliet_path="/archive.tar")
+
+    _add_isolinux(iso, isohybrid=False, padding=b'\x01' * 2000)
+    iso.add_directory("/DIR1", rr_name="dir1", joliet_path="/dir1")
+    iso.add_symlink("/SYM.;1", "sym", "archive.tar")
+
+    out = BytesIO()
+    iso.write_fp(out)
+    iso.close()
+
+    iso = pycdlib.PyCdlib()
+    iso.open_fp(out)
+
+    fp = iso.open_file_from_iso(joliet_path="/archive.tar")
+    assert(fp.readable())
+    assert(fp.seekable())
+    assert(fp.seek(0, os.SEEK_END) == len(tarstr))
+    fp.seek(512)
+    assert(fp.read(100) == tarstr[512:612])
+    with pytest.raises(ValueError):
+        fp.seek(-1)
+    with pytest.raises(ValueError):
+        fp.seek(0, 3)
+    assert(fp.tell() == 612)
+    fp.seek(0)
+    tar = tarfile.open(fileobj=fp, mode='r')
+    assert(tar.extractfile("member2").read() == b"2" * 6000)
+    tar.close()
+    fp.close()
+
+    # The boot info table is patched in, just as get_file_from_iso_fp does.
+    bootout = BytesIO()
+    iso.get_file_from_iso_fp(bootout, iso_path="/ISOLINUX.BIN;1")
+    fp = iso.open_file_from_iso(rr_path="/isolinux.bin")
+    assert(fp.read() == bootout.getvalue())
+    fp.seek(10)
+    assert(fp.read(20) == bootout.getvalue()[10:30])
+    fp.close()
+
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.open_file_from_iso(iso_path="/DIR1")
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.open_file_from_iso(rr_path="/sym")
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.open_file_from_iso(iso_path="/ARCHIVE.TAR;1", joliet_path="/archive.tar")
+
+    iso.close()
+
+def test_new_open_file_from_iso_multi_extent():
+    import copy
+
+    iso = pycdlib.PyCdlib()
+    iso.new()
+    iso.add_fp(BytesIO(b"a"), 1, "/BIG.;1")
+
+    out = BytesIO()
+    iso.write_fp(out)
+    iso.close()
+
+    iso = pycdlib.PyCdlib()
+    iso.open_fp(out)
+    rec = iso.get_record(iso_path="/BIG.;1")
+    # Give the file a second extent, with the same data as the first.
+    second = copy.copy(rec)
+    rec.data_continuation = second
+
+    fp = iso.open_file_from_iso(iso_path="/BIG.;1")
+    assert(fp.read() == b"aa")
+    fp.seek(1)
+    assert(fp.read(5) == b"a")
+    fp.close()
+
+    iso.close()
+
+def test_new_open_offset(tmpdir, fixed_clock):
+    iso = pycdlib.PyCdlib()
+    iso.new(rock_ridge="1.09", joliet=3)
+    iso.add_directory("/DIR1", rr_name="dir1", joliet_path="/dir1")
+    foostr = b"foo\n" * 1000
+    iso.add_fp(BytesIO(foostr), len(foostr), "/DIR1/FOO.;1", rr_name="foo", joliet_path="/dir1/foo")
+    barstr = b"bar\n"
+    iso.add_fp(BytesIO(barstr), len(barstr), "/BAR.;1", rr_name="bar", joliet_path="/bar")
+
+    out = BytesIO()
+    iso.write_fp(out)
+    iso.close()
+    isostr = out.getvalue()
+
+    prefix = b"\xaa" * 12345
+    suffix = b"\x55" * 1000
+    outfile = str(tmpdir.join("embedded.img"))
+    with open(outfile, 'wb') as outfp:
+        outfp.write(prefix + isostr + suffix)
+
+    for lazy in (False, True):
+        iso = pycdlib.PyCdlib()
+        iso.open_fp(BytesIO(prefix + isostr + suffix), lazy=lazy, offset=len(prefix))
+        fooout = BytesIO()
+        iso.get_file_from_iso_fp(fooout, rr_path="/dir1/foo")
+        assert(fooout.getvalue() == foostr)
+        assert(iso.open_file_from_iso(joliet_path="/bar").read() == barstr)
+        names = [c.file_identifier() for c in iso.list_children(iso_path="/DIR1")]
+        assert(names == [b'.', b'..', b'FOO.;1'])
+        iso.close()
+
+    iso = pycdlib.PyCdlib()
+    iso.open(outfile, offset=len(prefix))
+
+    # Writing the embedded ISO back out reproduces it exactly.
+    out = BytesIO()
+    iso.write_fp(out)
+    assert(out.getvalue() == isostr)
+
+    extractdir = tmpdir.join("extract")
+    iso.extract_tree("/", str(extractdir), workers=2)
+    assert(extractdir.join("dir1").join("foo").read(mode='rb') == foostr)
+
+    iso.modify_file_in_place(BytesIO(b"baz\n"), 4, "/BAR.;1", rr_name="bar", joliet_path="/bar")
+    iso.close()
+
+    with open(outfile, 'rb') as infp:
+        data = infp.read()
+    assert(data[:len(prefix)] == prefix)
+    assert(data[-len(suffix):] == suffix)
+
+    iso = pycdlib.PyCdlib()
+    iso.open(outfile, offset=len(prefix))
+    barout = BytesIO()
+    iso.get_file_from_iso_fp(barout, iso_path="/BAR.;1")
+    assert(barout.getvalue() == b"baz\n")
+    # The memory map of the file is unmapped on close, even though only a
+    # slice of it was used.
+    mapped = iso._cdmap.obj
+    iso.close()
+    assert(mapped.closed)
+
+    iso = pycdlib.PyCdlib()
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.open_fp(BytesIO(isostr), offset=-1)
+
+def test_new_write_offset(tmpdir, fixed_clock):
+    iso = pycdlib.PyCdlib()
+    iso.new(rock_ridge="1.09", joliet=3)
+    foostr = b"foo\n" * 1000
+    iso.add_fp(BytesIO(foostr), len(foostr), "/FOO.;1", rr_name="foo", joliet_path="/foo")
+    _add_isolinux(iso)
+
+    out = BytesIO()
+    iso.write_fp(out)
+    isostr = out.getvalue()
+
+    # Whatever was in the file where the ISO goes is overwritten, including
+    # in the gaps between its pieces, while everything around it is kept.
+    prefix = b"\xaa" * 12345
+    suffix = b"\x55" * 1000
+    outfile = tmpdir.join("embedded.img")
+    outfile.write(prefix + b"\xff" * len(isostr) + suffix, mode='wb')
+    iso.write(str(outfile), offset=len(prefix))
+    assert(outfile.read(mode='rb') == prefix + isostr + suffix)
+
+    embedded = BytesIO(prefix)
+    embedded.seek(0, os.SEEK_END)
+    iso.write_fp(embedded, offset=len(prefix))
+    assert(embedded.getvalue() == prefix + isostr)
+
+    # Options that need the ISO at the start of the file are refused.
+    for kwargs in [{'workers': 4}, {'sparse': True}, {'io_policy': 'nocache'}]:
+        with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+            iso.write_fp(embedded, offset=len(prefix), **kwargs)
+        with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+            iso.write(str(tmpdir.join("refused.img")), offset=2048, **kwargs)
+        assert(not tmpdir.join("refused.img").check())
+    assert(embedded.getvalue() == prefix + isostr)
+
+    # A file that does not exist yet reads as zeros before the ISO.
+    newfile = tmpdir.join("new.img")
+    iso.write(str(newfile), offset=2048)
+    assert(newfile.read(mode='rb') == b"\x00" * 2048 + isostr)
+    iso.close()
+
+    iso = pycdlib.PyCdlib()
+    iso.open(str(outfile), offset=len(prefix))
+    fooout = BytesIO()
+    iso.get_file_from_iso_fp(fooout, rr_path="/foo")
+    assert(fooout.getvalue() == foostr)
+
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.write_fp(BytesIO(), offset=-1)
+
+    class NonSeekable(object):
+        def __init__(self):
+            self.data = BytesIO()
+        def write(self, data):
+            return self.data.write(data)
+        def seekable(self):
+            return False
+
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.write_fp(NonSeekable(), offset=len(prefix))
+    iso.close()
+
+def test_new_save_index(tmpdir, fixed_clock):
+    iso = pycdlib.PyCdlib()
+    iso.new(rock_ridge="1.09", joliet=3)
+    path = ""
+    for i in range(1, 9):
+        path += "/DIR%d" % (i)
+        iso.add_directory(path, rr_name="dir%d" % (i), joliet_path=path.lower())
+    foostr = b"foo\n"
+    iso.add_fp(BytesIO(foostr), len(foostr), "/DIR1/FOO.;1", rr_name="foo", joliet_path="/dir1/foo")
+    iso.add_symlink("/SYM.;1", "sym", "dir1/foo")
+    _add_isolinux(iso, isohybrid=False)
+
+    isofile = str(tmpdir.join("index.iso"))
+    iso.write(isofile)
+    iso.close()
+
+    indexfile = str(tmpdir.join("index.iso.idx"))
+    iso = pycdlib.PyCdlib()
+    iso.open(isofile, lazy=True)
+    iso.save_index(indexfile)
+    out = BytesIO()
+    iso.write_fp(out)
+    expected = out.getvalue()
+    iso.close()
+
+    iso = pycdlib.PyCdlib()
+    iso.open(isofile, index=indexfile)
+    fooout = BytesIO()
+    iso.get_file_from_iso_fp(fooout, rr_path="/dir1/foo")
+    assert(fooout.getvalue() == foostr)
+    deep = iso.get_record(rr_path="/dir1/dir2/dir3/dir4/dir5/dir6/dir7/dir8")
+    assert(deep.is_dir())
+    assert(iso.get_record(rr_path="/sym").rock_ridge.symlink_path() == b"dir1/foo")
+    assert(iso.eltorito_boot_catalog is not None)
+    out = BytesIO()
+    iso.write_fp(out)
+    assert(out.getvalue() == expected)
+
+    # An ISO loaded from an index can still be modified.
+    iso.add_fp(BytesIO(foostr), len(foostr), "/BAR.;1", rr_name="bar", joliet_path="/bar")
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.save_index(indexfile)
+    iso.close()
+
+    # A stale index is ignored, and the ISO is parsed instead.
+    with open(isofile, 'r+b') as fp:
+        fp.seek(0, os.SEEK_END)
+        fp.write(b'\x00' * 2048)
+    iso = pycdlib.PyCdlib()
+    iso.open(isofile, index=indexfile)
+    assert(iso.get_record(rr_path="/dir1/foo").data_length == len(foostr))
+    iso.close()
+
+    # An index can only create PyCdlib's own objects.
+    import pickle
+    import zlib
+
+    class Evil(object):
+        def __reduce__(self):
+            return (os.getpid, ())
+
+    iso = pycdlib.PyCdlib()
+    iso.open(isofile)
+    key = iso._index_key()
+    iso.close()
+    with open(indexfile, 'wb') as fp:
+        fp.write(key + zlib.compress(pickle.dumps(Evil(), 2)))
+    iso = pycdlib.PyCdlib()
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.open(isofile, index=indexfile)
+
+    # Bodies that unpickle fine but aren't the state of an ISO, or that
+    # don't unpickle at all, are refused the same way.
+    for body in [pickle.dumps([1, 2], 2), pickle.dumps({'pvds': []}, 2),
+                 pickle.dumps([1, 2], 2)[:-3], b"\x80\x02garbage"]:
+        with open(indexfile, 'wb') as fp:
+            fp.write(key + zlib.compress(body))
+        iso = pycdlib.PyCdlib()
+        with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+            iso.open(isofile, index=indexfile)
+
+    with open(indexfile, 'wb') as fp:
+        fp.write(b"not an index")
+    iso = pycdlib.PyCdlib()
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.open(isofile, index=indexfile)
+
+    iso = pycdlib.PyCdlib()
+    iso.new()
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.save_index(indexfile)
+    iso.close()
+
+def test_new_open_headers_only():
+    iso = pycdlib.PyCdlib()
+    iso.new(rock_ridge="1.09", joliet=3, vol_ident="HEADERS")
+    iso.add_directory("/DIR1", rr_name="dir1", joliet_path="/dir1")
+    _add_isolinux(iso, joliet_path="/isolinux.bin", boot_info_table=False)
+
+    out = BytesIO()
+    iso.write_fp(out)
+    iso.close()
+
+    iso = pycdlib.PyCdlib()
+    iso.open_fp(out, headers_only=True)
+    assert(iso.pvd.volume_identifier.rstrip() == b"HEADERS")
+    assert(iso.joliet_vd is not None)
+    assert(iso.rock_ridge == "1.09")
+    assert(iso.eltorito_boot_catalog is not None)
+    assert(iso.isohybrid_mbr is not None)
+    assert(len(iso.pvd.root_directory_record().children) == 0)
+
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.get_record(iso_path="/DIR1")
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        list(iso.list_children(iso_path="/"))
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.add_directory("/DIR2", rr_name="dir2", joliet_path="/dir2")
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.write_fp(BytesIO())
+
+    iso.close()
+
+    # Once closed, the object can be used to open the whole ISO.
+    iso.open_fp(out)
+    assert(iso.get_record(rr_path="/dir1").is_dir())
+    iso.close()
+
+def test_new_open_parse_joliet(fixed_clock):
+    iso = pycdlib.PyCdlib()
+    iso.new(rock_ridge="1.09", joliet=3)
+    iso.add_directory("/DIR1", rr_name="dir1", joliet_path="/dir1")
+    iso.add_fp(BytesIO(b"foo\n"), 4, "/DIR1/FOO.;1", rr_name="foo", joliet_path="/dir1/foo")
+    iso.add_fp(BytesIO(b"bar\n"), 4, "/BAR.;1", rr_name="bar", joliet_path="/bar")
+
+    out = BytesIO()
+    iso.write_fp(out)
+    iso.close()
+
+    for lazy in [False, True]:
+        iso = pycdlib.PyCdlib()
+        iso.open_fp(out, lazy=lazy, parse_joliet=False)
+        assert(iso.joliet_vd is not None)
+        assert(len(iso.joliet_vd.root_directory_record().children) == 0)
+        assert(iso.get_record(rr_path="/dir1/foo").data_length == 4)
+
+        # The Joliet tree is walked the first time it is needed.
+        rec = iso.get_record(joliet_path="/dir1/foo")
+        assert(rec.data_length == 4)
+        foo = BytesIO()
+        iso.get_file_from_iso_fp(foo, joliet_path="/dir1/foo")
+        assert(foo.getvalue() == b"foo\n")
+
+        written = BytesIO()
+        iso.write_fp(written)
+        iso.close()
+        assert(written.getvalue() == out.getvalue())
+
+    # Modifying the ISO without ever looking at Joliet still keeps it intact.
+    iso = pycdlib.PyCdlib()
+    iso.open_fp(out, parse_joliet=False)
+    iso.rm_file("/BAR.;1", rr_name="bar", joliet_path="/bar")
+    written = BytesIO()
+    iso.write_fp(written)
+    iso.close()
+
+    iso = pycdlib.PyCdlib()
+    iso.open_fp(written)
+    assert(iso.get_record(joliet_path="/dir1/foo").data_length == 4)
+    with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
+        iso.get_record(joliet_path="/bar")
+    iso.close()
+
+def test_new_open_coalesced_reads(tmpdir, fixed_clock):
+    class CountingFile(object):
+        def __init__(self, data):
+            self._fp = BytesIO(data)
+            self.mode = 'rb'
+            self.reads = 0
+
+        def seek(self, *args):
+            return self._fp.seek(*args)
+
+        def tell(self):
+            return self._fp.tell()
+
+        def read(self, *args):
+            self.reads += 1
+            return self._fp.read(*args)
+
+    iso = pycdlib.PyCdlib()
+    iso.new(rock_ridge="1.09", joliet=3)
+    for i in range(30):
+        # Long Rock Ridge names, so that most records need a continuation
+        # entry.
+        iso.add_directory("/DIR%d" % (i), rr_name="dir%d" % (i) + "x" * 200, joliet_path="/dir%d" % (i))
+        iso.add_fp(BytesIO(b"foo\n"), 4, "/DIR%d/FOO.;1" % (i), rr_name="foo" + "x" * 200, joliet_path="/dir%d/foo" % (i))
+
+    outfile = str(tmpdir.join("coalesced.iso"))
+    iso.write(outfile)
+    iso.close()
+
+    # A file on disk is memory mapped, so it is parsed without the cache.
+    iso = pycdlib.PyCdlib()
+    iso.open(outfile)
+    expected = BytesIO()
+    iso.write_fp(expected)
+    iso.close()
+
+    with open(outfile, 'rb') as infp:
+        fp = CountingFile(infp.read())
+    iso = pycdlib.PyCdlib()
+    iso.open_fp(fp)
+    # The 62 directories and their continuation blocks are read with a
+    # handful of large reads, rather than one or more reads each.
+    assert(fp.reads < 20)
+    assert(iso.get_record(rr_path="/dir29" + "x" * 200 + "/foo" + "x" * 200).data_length == 4)
+
+    written = BytesIO()
+    iso.write_fp(written)
+    iso.close()
+    assert(written.getvalue() == expected.getvalue())
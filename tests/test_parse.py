@@ -1005,7 +1005,7 @@ def test_parse_write_not_initialized(tmpdir):
     iso = pycdlib.PyCdlib()
 
     with pytest.raises(pycdlib.pycdlibexception.PyCdlibInvalidInput):
-        iso.write('out.iso')
+        iso.write(str(tmpdir.join('out.iso')))
 
 def test_parse_write_with_progress(tmpdir):
     test_parse_write_with_progress.num_progress_calls = 0